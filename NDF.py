@@ -1,234 +1,288 @@
 # By Arthur Péraud
 import os
-import calendar
+import hashlib
 import openpyxl
 import typing
-from datetime import datetime, timedelta, date
 from openpyxl.workbook import Workbook
-
-MONTH_FR = [
-    "Janvier", "Février", "Mars", "Avril", "Mai", "Juin",
-    "Juillet", "Août", "Septembre", "Octobre", "Novembre", "Décembre"
-]
-
-def Is_file_locked(filepath: str) -> bool:
-    """Vérifie si un fichier est ouvert ou verrouillé (ex: par Excel)."""
-    if not os.path.exists(filepath):
-        return False
-    try:
-        with open(filepath, "a"):
-            return False
-    except IOError:
-        return True
-
-def Get_unique_filename(path : str) -> str:
-    """Génère un nom de fichier unique en ajoutant (1), (2), etc. s'il existe déjà."""
-    base, ext = os.path.splitext(path)
-    i = 1
-    new_path = path
-    while os.path.exists(new_path):
-        new_path = f"{base}({i}){ext}"
-        i += 1
-    return new_path
-
-def Save_workbook_safely(wb: Workbook, output_file: str) -> None:
-    """Sauvegarde fichier Excel, confirmation si existence sinon préfixe est ajouté (Get_unique_filename).
-    Crée le dossier si le chemin n'existe pas.
+from openpyxl.worksheet.worksheet import Worksheet
+from openpyxl.packaging.custom import StringProperty
+from ndf.calendar import Week, Get_calendar_plan
+from ndf.summary import Add_summary_sheet
+from ndf.io import Is_file_locked, Workbook_lock, Save_workbook_safely, Save_workbook_atomic
+from ndf.publish import Publisher, Save_workbook_staged, Stage_path, Publish_file
+from ndf.template import Compiled_template, Compiled_workbook, Load_compiled_workbook
+from ndf.styles import Registry_for, Compact_styles
+from ndf.trace import Span, Count, Setup_from_argv
+
+def Week_overrides(week : Week, km_rate : typing.Optional[float], meal_price : typing.Optional[float], loyer : typing.Optional[float]) -> typing.Tuple[dict, dict]:
+    """Calcule les cellules propres à une semaine du plan : ({coordonnée: valeur}, {coordonnée: police nommée}).
+    Les polices nommées sont définies dans ndf.styles.NAMED_FONTS.
+    km_rate, meal_price et loyer à None laissent les cellules vides (année suivante).
     """
-
-    # Vérifie et crée le dossier si nécessaire
-    folder = os.path.dirname(output_file)
-    if folder and not os.path.exists(folder):
-        os.makedirs(folder, exist_ok=True)
-        print(f"📂 Dossier créé : {folder}")
-
-    if os.path.exists(output_file):
-        confirm = input(f"\n⚠️  Le fichier '{output_file}' existe déjà. Voulez-vous l’écraser ? (o/n) : ").strip().lower()
-        
-        if confirm in ['o', 'y']:
-            wb.save(output_file)
-            print(f"✅ Fichier écrasé et sauvegardé sous {output_file}")
-        elif confirm == 'n':
-            new_file = Get_unique_filename(output_file)
-            wb.save(new_file)
-            print(f"📁 Fichier sauvegardé sous un nouveau nom : {new_file}")
-        else:
-            print("Réponse non reconnue, fichier non sauvegardé.")
-    else:
-        wb.save(output_file)
-        print(f"\n✅ Fichier sauvegardé sous {output_file}")
-
-def Get_number_of_weeks(year : int) -> int:
-    """Calcule le nombre de semaines ISO pour une année donnée (52 ou 53 semaines)."""
-    # Vérifie le numéro de semaine du dernier jour de l'année
-    last_day_of_year = datetime(year, 12, 31)
-    last_week = last_day_of_year.isocalendar()[1]
-
-    # S'il y a 53 semaines ISO dans l'année, sinon il y en a 52
-    return 53 if last_week == 53 else 52
-
-def Get_start_of_week(year : int, week : int) -> int:
-    """Calcule la date de début (lundi) pour une semaine ISO donnée d'une année donnée."""
-    # Le 4 janvier est toujours dans la première semaine ISO
-    first_day_of_year = datetime(year, 1, 4)
-    # Trouve le lundi de la première semaine ISO
-    first_week_start = first_day_of_year - timedelta(days=first_day_of_year.weekday())
-
-    # Calcule le début de la semaine demandée
-    week_start = first_week_start + timedelta(weeks=week - 1)
-    return week_start
-
-def Get_last_day_in_week_range(week_start: datetime, week_end: datetime) -> typing.Tuple[int, int]:
+    values = {
+        "K1": week.week_num,                             # Numéro de la semaine
+        "O5": week.week_start.strftime("%d/%m/%Y"),      # Date de début
+        "O6": week.week_end.strftime("%d/%m/%Y"),        # Date de fin
+    }
+    fonts = {}
+
+    # Affichage Total et Mois
+    pos = week.eom_pos
+    if pos:
+        # Total Péage fin du mois
+        values[f"E{pos}"] = "Pe"
+        fonts[f"F{pos}"] = "tolls_total"  # Rouge, taille 8
+        values[f"F{pos+1}"] = "Total Mois"
+        # Loyer
+        values[f"L{pos+1}"] = "Loyer_ES"
+        values[f"L{pos}"] = loyer
+
+    values["O3"] = week.month_label
+    fonts["O3"] = "month_label"  # Texte en Gras et Vert
+
+    for i, day in zip(range(12, 26, 2), week.days):
+        values[f"B{i}"] = day  # Dates
+        values[f"I{i}"] = meal_price  # Prix du repas
+    values["F26"] = km_rate  # Taux kilométrique
+
+    return values, fonts
+
+FINGERPRINT_PREFIX = "NDF:"  # Propriétés personnalisées du document : "NDF:Sem 18_2025" -> empreinte de la feuille
+
+def Week_rates(week : Week, km_rate : float, meal_price : float, loyer : float) -> typing.Tuple[typing.Optional[float], ...]:
+    """Taux appliqués à la feuille : ceux saisis pour 20XX, aucun pour 20XX+1 (remplis plus tard par NDF_fill)."""
+    if week.next_year:
+        return None, None, None
+    return km_rate, meal_price, loyer
+
+def Week_fingerprint(template_hash : str, week : Week, km_rate : typing.Optional[float], meal_price : typing.Optional[float], loyer : typing.Optional[float]) -> str:
+    """Empreinte "mise_en_page:taux" d'une feuille : la première partie dépend du modèle (Compiled_template.Layout_hash,
+    pas du fichier : réenregistrer le modèle ne change rien) et du calendrier, la seconde des taux.
     """
-    Vérifie si la période [week_start, week_end] inclut le dernier jour du mois de week_start.
-    Retourne (jour_du_dernier_jour, mois_en_francais) si trouvé,
-    sinon (0, mois_en_francais).
+    layout = (template_hash, week.title, week.week_start.isoformat(), week.days, week.month, week.eom_pos)
+    rates = (km_rate, meal_price, loyer)
+    return f"{hashlib.sha256(repr(layout).encode()).hexdigest()[:16]}:{hashlib.sha256(repr(rates).encode()).hexdigest()[:16]}"
+
+def Entered_cells(ws : Worksheet, template : Compiled_template, values : typing.Dict[str, typing.Any]) -> typing.Tuple[typing.Dict[str, typing.Any], typing.List[str]]:
+    """Saisies d'une feuille à reconstruire, comparée au modèle : ({coordonnée: valeur} des valeurs saisies à la main,
+    à reporter dans la nouvelle feuille), [coordonnées des formules qui seront remplacées par celles du modèle]).
+    Une valeur différente du modèle est une saisie (y compris à la place d'une valeur d'exemple du modèle), sauf si
+    la cellule du modèle ou de la feuille contient une formule : la formule du modèle l'emporte et la cellule est signalée.
+    Les cellules écrites par le programme (values : dates, taux...) ne sont pas des saisies.
     """
-    last_day = calendar.monthrange(week_start.year, week_start.month)[1]
-    last_day_date = date(week_start.year, week_start.month, last_day)
-    month = last_day_date.month
-
-    if week_start.date() <= last_day_date <= week_end.date():
-        return last_day_date.day, month
-    return 0, month
-
-def Last_week_contains_4_days_of_month(year : int, month : int = 4) -> (bool, int):
-    """Retourne un tuple (True/False, numéro de la semaine) si la dernière semaine du mois contient au moins 4 jours du mois."""
-    
-    # Gérer le cas où le mois est décembre (12)
-    if month == 12:
-        next_month = 1
-        year += 1  # Passage à l'année suivante
+    template_values = {(row, col): value for row, col, value, _, _ in template.cells}
+    kept, replaced = {}, []
+    for (row, col), cell in sorted(ws._cells.items()):
+        value = cell.value
+        expected = template_values.get((row, col))
+        if value is None or value == expected or cell.coordinate in values:
+            continue
+        if cell.data_type == "f" or isinstance(expected, str) and expected.startswith("="):
+            replaced.append(cell.coordinate)
+        else:
+            kept[cell.coordinate] = value
+    return kept, replaced
+
+def Read_fingerprints(wb : Workbook) -> typing.Dict[str, str]:
+    """Empreintes enregistrées dans les propriétés personnalisées du classeur : {titre de feuille: empreinte}."""
+    return {p.name[len(FINGERPRINT_PREFIX):]: p.value for p in wb.custom_doc_props.props if p.name.startswith(FINGERPRINT_PREFIX)}
+
+def Store_fingerprints(wb : Workbook, fingerprints : typing.Dict[str, str]) -> None:
+    """Remplace les empreintes NDF des propriétés personnalisées, les autres propriétés sont conservées."""
+    props = [p for p in wb.custom_doc_props.props if not p.name.startswith(FINGERPRINT_PREFIX)]
+    props += [StringProperty(name=f"{FINGERPRINT_PREFIX}{title}", value=fp) for title, fp in fingerprints.items()]
+    wb.custom_doc_props.props = props
+
+def Create_weekly_sheets(input_file : str, year : int, km_rate : float, meal_price : float, loyer : float, verbose : bool = True, compiled : bool = True,
+                         workbook_template : typing.Optional[Compiled_workbook] = None, write_only : bool = False) -> Workbook:
+    """Crée une feuille par semaine de l'exercice (1er Mai 20XX -> 30 Avril 20XX+1) à partir de la feuille modèle.
+    verbose=False supprime l'affichage semaine par semaine (mode lot).
+    compiled=False utilise l'ancien chemin wb.copy_worksheet (comparaison / benchmark).
+    workbook_template : modèle déjà compilé (cache du service NDF_server), input_file n'est alors pas relu ;
+    sinon le modèle compilé est relu depuis le cache disque s'il existe (ndf.template.Load_compiled_workbook).
+    write_only=True : classeur en écriture seule, chaque feuille est écrite sur disque dès sa création
+    (mémoire d'une seule feuille, quel que soit le nombre de semaines). Le classeur retourné ne peut
+    qu'être sauvegardé, une seule fois (Save_workbook_safely).
+    La feuille masquée "Synthèse" (ndf.summary) est ajoutée après les semaines : totaux de chaque période lus par le rapport.
+    """
+    if write_only and not compiled:
+        raise ValueError("Le mode write_only nécessite le modèle compilé (compiled=True).")
+
+    if workbook_template is None and compiled:
+        workbook_template = Load_compiled_workbook(input_file)
+
+    if workbook_template is not None:
+        # Le modèle reste dans son propre classeur : le classeur des semaines ne reçoit que les styles
+        # réellement utilisés, sans doublons (tables de styles du fichier modèle non recopiées)
+        wb = workbook_template.New_workbook(with_sheets=False, write_only=write_only)
+        ws_template = None
+        template = workbook_template.active_sheet  # Feuille modèle par défaut
+        template_hash = template.Layout_hash()
     else:
-        next_month = month + 1
-    
-    # Dernier jour du mois
-    last_day_of_month = datetime(year, next_month, 1) - timedelta(days=1)
-    
-    # Le premier jour de la semaine (lundi) pour le dernier jour du mois
-    last_week_start = last_day_of_month - timedelta(days=last_day_of_month.weekday())
-    
-    # Calcul du nombre de jours du mois dans la dernière semaine
-    days_in_last_week = 0
-    for i in range(7):  
-        current_day = last_week_start + timedelta(days=i)
-        if current_day.month == month:
-            days_in_last_week += 1
-    
-    # Le numéro de la semaine ISO de la dernière semaine du mois
-    last_week_number = last_week_start.isocalendar()[1]
-    
-    # Si la dernière semaine contient 4 jours ou plus du mois
-    contains_4_days = days_in_last_week >= 4
-    
-    return contains_4_days, last_week_number
-
-
-def Create_weekly_sheets(input_file : str, year : int, km_rate : float, meal_price : float, loyer : float) -> Workbook:
-    wb = openpyxl.load_workbook(input_file)
-    ws_template = wb.active  # Feuille modèle par défaut
-
-    num_weeks = Get_number_of_weeks(year)
-    flag, start_week = Last_week_contains_4_days_of_month(year)
-    if flag : start_week += 1
-    flag, end_week_next_year = Last_week_contains_4_days_of_month(year+1)
-    print("")
-
-    # 20XX
-    for week_num in range(start_week, num_weeks + 1):
-        # Calcule les dates de début (lundi) et de fin (dimanche) pour chaque semaine
-        week_start = Get_start_of_week(year, week_num)
-        week_end = week_start + timedelta(days=6)
-
-        # Crée une nouvelle feuille pour chaque semaine
-        ws = wb.copy_worksheet(ws_template)
-        ws.title = f"Sem {week_num}_{year}"
-
-        print(f"Création de la feuille pour la semaine {week_num}, du {week_start.strftime('%d/%m/%Y')} au {week_end.strftime('%d/%m/%Y')}.")
-
-        ws["K1"].value = week_num  # Numéro de la semaine
-        ws["O5"].value = week_start.strftime("%d/%m/%Y")  # Date de début
-        ws["O6"].value = week_end.strftime("%d/%m/%Y")    # Date de fin
-
-        # Affichage Total et Mois
-        lastday, month = Get_last_day_in_week_range(week_start, week_end)
-        if lastday:
-            flag2, _ = Last_week_contains_4_days_of_month(year, month)
-            if not flag2: month = (month + 1) % 12
-
-            # Total Péage fin du mois
-            pos = 12 + (lastday - week_start.day)*2
-            ws[f"E{pos}"].value = "Pe"
-            ws[f"F{pos}"].font = openpyxl.styles.Font(color="FF0000", size = 8)            
-            ws[f"F{pos+1}"].value = "Total Mois"
-            # Loyer
-            ws[f"L{pos+1}"].value = "Loyer_ES"
-            ws[f"L{pos}"].value = loyer
-
-        ws["O3"].value = MONTH_FR[month-1]
-        ws["O3"].font = openpyxl.styles.Font(bold=True, color="008000", size = 9) # Texte en Gras et Vert
-
-        k = 0
-        for i in range(12, 26, 2):
-            ws[f"B{i}"].value = (week_start + timedelta(days=(k))).day  # Dates
-            k = k + 1
-
-        for i in range(12, 26, 2):
-            ws[f"I{i}"].value = meal_price  # Prix du repas 
-        ws["F26"].value = km_rate  # Taux kilométrique     
-
-    # 20XX +1
-    if not flag : end_week_next_year -= 1
-    for week_num in range(1, end_week_next_year + 1):
-        # Calcule les dates de début (lundi) et de fin (dimanche) pour chaque semaine
-        week_start = Get_start_of_week(year+1, week_num)
-        week_end = week_start + timedelta(days=6)
-
-        # Crée une nouvelle feuille pour chaque semaine
-        ws = wb.copy_worksheet(ws_template)
-        ws.title = f"Sem {week_num}_{year + 1}"
-
-        print(f"Création de la feuille pour la semaine {week_num}, du {week_start.strftime('%d/%m/%Y')} au {week_end.strftime('%d/%m/%Y')}.")
-
-        ws["K1"].value = week_num  # Numéro de la semaine
-        ws["O5"].value = week_start.strftime("%d/%m/%Y")  # Date de début
-        ws["O6"].value = week_end.strftime("%d/%m/%Y")    # Date de fin
-
-        # Affichage Total et Mois
-        lastday, month = Get_last_day_in_week_range(week_start, week_end)
-        if lastday:
-            flag2, _ = Last_week_contains_4_days_of_month(year + 1, month)
-            if not flag2: month = (month + 1) % 12
-
-            # Total Péage fin du mois
-            pos = 12 + (lastday - week_start.day)*2
-            ws[f"E{pos}"].value = "Pe"
-            ws[f"F{pos}"].font = openpyxl.styles.Font(color="FF0000", size = 8)
-            ws[f"F{pos+1}"].value = "Total Mois"
-            # Loyer
-            ws[f"L{pos+1}"].value = "Loyer_ES"
-            ws[f"L{pos}"].value = None
-         
-        ws["O3"].value = MONTH_FR[month-1]
-        ws["O3"].font = openpyxl.styles.Font(bold=True, color="008000", size = 9) # Texte en Gras et Vert
-
-        k = 0
-        for i in range(12, 26, 2):
-            ws[f"B{i}"].value = (week_start + timedelta(days=(k))).day  # Dates
-            k = k + 1
-
-        ### On ne remplit pas pour l'année suivante, on modifiera plus tard les valeurs, mises à NONE    
-        for i in range(12, 26, 2):
-            ws[f"I{i}"].value = None  # Prix du repas 
-        ws["F26"].value = None  # Taux kilométrique   
-
-    wb.remove(ws_template)
-    print(f"{num_weeks - start_week + 1 + end_week_next_year} feuilles de semaine créées.")
+        with Span("load_workbook", file=os.path.basename(input_file)):
+            wb = openpyxl.load_workbook(input_file)
+        ws_template = wb.active  # Feuille modèle par défaut
+        template = None
+        template_hash = Compiled_template(ws_template).Layout_hash()
+
+    plan = Get_calendar_plan(year)
+    if verbose: print("")
+
+    fingerprints = {}
+
+    written = 0
+    phase = "stream_sheets" if write_only else "emit_sheets" if template is not None else "copy_worksheet"
+    with Span(phase, year=year) as span:
+        for week in plan.weeks:
+            # 20XX : taux remplis / 20XX + 1 : on ne remplit pas, on modifiera plus tard les valeurs (NDF_fill), mises à NONE
+            rates = Week_rates(week, km_rate, meal_price, loyer)
+            values, fonts = Week_overrides(week, *rates)
+            fingerprints[week.title] = Week_fingerprint(template_hash, week, *rates)
+
+            if verbose:
+                print(f"Création de la feuille pour la semaine {week.week_num}, du {values['O5']} au {values['O6']}.")
+
+            # Crée une nouvelle feuille pour chaque semaine
+            if write_only:
+                template.Stream(wb, week.title, values, fonts)
+            elif template is not None:
+                template.Emit(wb, week.title, values, fonts)
+            else:
+                registry = Registry_for(wb)
+                ws = wb.copy_worksheet(ws_template)
+                ws.title = week.title
+                for coord, value in values.items():
+                    ws[coord].value = value
+                for coord, name in fonts.items():
+                    registry.Apply_font(ws[coord], name)
+            written += len(values)
+
+        # Cellules recopiées du modèle + cellules propres à chaque semaine
+        copied = (len(template.cells) if template is not None else len(ws_template._cells)) * len(plan.weeks)
+        span.Set(sheets=len(plan.weeks), cells_copied=copied, cells_written=written)
+    Count("sheets", len(plan.weeks))
+    Count("cells_copied", copied)
+    Count("cells_written", written)
+
+    # Totaux par période dans le classeur même (feuille masquée), lus par le rapport
+    Add_summary_sheet(wb, plan)
+
+    if ws_template is not None:
+        wb.remove(ws_template)
+        # copy_worksheet : les tables de styles viennent du fichier modèle, on ne garde que celles des feuilles semaine
+        with Span("compact_styles") as span:
+            span.Set(removed=Compact_styles(wb))
+    Store_fingerprints(wb, fingerprints)
+    if verbose:
+        print(f"{len(plan.weeks)} feuilles de semaine créées.")
 
     return wb
 
+def Update_weekly_sheets(input_file : str, output_file : str, year : int, km_rate : float, meal_price : float, loyer : float, verbose : bool = True) -> typing.Tuple[Workbook, typing.List[str]]:
+    """Mise à jour incrémentale d'un classeur existant d'après les empreintes enregistrées par Create_weekly_sheets.
+
+    - empreinte identique : la feuille est conservée telle quelle (dépenses saisies comprises) ;
+    - seuls les taux ont changé : seules les cellules de taux (I12..I24, F26, L{pos}) sont réécrites ;
+    - modèle ou calendrier changé, feuille absente, ou feuille sans empreinte (classeur antérieur : modèle et taux
+      inconnus) : la feuille est reconstruite depuis le modèle.
+    Une feuille reconstruite garde les valeurs saisies (Entered_cells) ; les formules modifiées à la main sont signalées.
+    Retourne (classeur, titres des feuilles modifiées).
+    """
+    plan = Get_calendar_plan(year)
+    if not os.path.exists(output_file):
+        return Create_weekly_sheets(input_file, year, km_rate, meal_price, loyer, verbose), [week.title for week in plan.weeks]
+
+    template = Load_compiled_workbook(input_file).active_sheet
+    template_hash = template.Layout_hash()
+    with Span("load_workbook", file=os.path.basename(output_file)):
+        wb = openpyxl.load_workbook(output_file)
+    stored = Read_fingerprints(wb)
+    fingerprints = {}
+    changed = []
+
+    for week in plan.weeks:
+        rates = Week_rates(week, km_rate, meal_price, loyer)
+        fingerprint = fingerprints[week.title] = Week_fingerprint(template_hash, week, *rates)
+        old = stored.get(week.title)
+        exists = week.title in wb.sheetnames
+
+        if exists and old == fingerprint:
+            continue
+
+        values, fonts = Week_overrides(week, *rates)
+        if exists and old is not None and old.split(":")[0] == fingerprint.split(":")[0]:
+            # Seuls les taux ont changé : les dépenses saisies sont conservées
+            ws = wb[week.title]
+            rate_cells = [f"I{i}" for i in range(12, 26, 2)] + ["F26"] + ([f"L{week.eom_pos}"] if week.eom_pos else [])
+            for coord in rate_cells:
+                ws[coord].value = values[coord]
+            Count("cells_written", len(rate_cells))
+            action = "taux mis à jour"
+        else:
+            index = None
+            kept, replaced = {}, []
+            if exists:
+                index = wb.sheetnames.index(week.title)
+                kept, replaced = Entered_cells(wb[week.title], template, values)
+                wb.remove(wb[week.title])
+            ws = template.Emit(wb, week.title, values, fonts, index)
+            for coord, value in kept.items():
+                ws[coord].value = value
+            Count("sheets")
+            action = "reconstruite" if old is not None or not exists else "reconstruite (sans empreinte)"
+            if kept:
+                action += f", {len(kept)} saisie(s) conservée(s)"
+            if replaced:
+                print(f"⚠️  Feuille {week.title} : formule(s) modifiée(s) à la main remplacée(s) par celles du modèle : {', '.join(replaced)}")
+
+        changed.append(week.title)
+        if verbose:
+            print(f"Feuille {week.title} : {action}.")
+
+    # Synthèse reconstruite : ses formules suivent les feuilles semaine du plan
+    Add_summary_sheet(wb, plan)
+
+    # Feuilles semaine dans l'ordre du plan, les autres feuilles à la suite
+    order = {week.title: i for i, week in enumerate(plan.weeks)}
+    wb._sheets.sort(key=lambda ws: order.get(ws.title, len(order)))
+
+    Store_fingerprints(wb, fingerprints)
+    if verbose:
+        print(f"{len(changed)} feuille(s) modifiée(s) sur {len(plan.weeks)}.")
+    return wb, changed
+
+def File_state(path : str) -> typing.Optional[typing.Tuple[int, int]]:
+    """(date de modification en ns, taille) du fichier, None s'il n'existe pas."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+def Update_weekly_file(input_file : str, output_file : str, year : int, km_rate : float, meal_price : float, loyer : float, verbose : bool = True) -> typing.List[str]:
+    """Update_weekly_sheets puis remplacement de output_file, verrou tenu de la lecture au remplacement :
+    aucun programme NDF ne peut enregistrer le classeur entre-temps. Le classeur est préparé en local puis
+    publié (ndf.publish) ; s'il a quand même changé depuis sa lecture (enregistré depuis Excel), rien n'est
+    remplacé et IOError est levée. Retourne les feuilles modifiées.
+    """
+    with Workbook_lock(output_file):
+        state = File_state(output_file)
+        wb, changed = Update_weekly_sheets(input_file, output_file, year, km_rate, meal_price, loyer, verbose)
+        staged = Stage_path(output_file)
+        try:
+            Save_workbook_atomic(wb, staged)
+            if File_state(output_file) != state:
+                raise IOError(f"'{output_file}' a été modifié pendant la mise à jour : relancez-la (fichier non remplacé).")
+        except BaseException:
+            os.remove(staged)
+            raise
+        # Même thread : Publish_file reprend le verrou déjà tenu (réentrant)
+        print(f"\n✅ Fichier sauvegardé sous {Publish_file(staged, output_file)}")
+    return changed
+
 ### Main Program
 if __name__ == "__main__":
+    Setup_from_argv()  # --profile : trace des phases (voir ndf.trace)
     print("Bienvenue dans le programme Cal Info Mesure de fraude fiscal.")
     
     try:
@@ -251,7 +305,17 @@ if __name__ == "__main__":
         meal_price = float(input("Entrez le prix du repas : "))
         loyer = float(input("Entrez le prix du loyer : "))
 
-        wb = Create_weekly_sheets(input_file, year, km_rate, meal_price, loyer)
-        Save_workbook_safely(wb , output_file)
+        choice = ""
+        if os.path.exists(output_file):
+            choice = input("Le fichier existe déjà : mise à jour incrémentale (m) ou génération complète (g) ? ").strip().lower()
+
+        if choice == 'm':
+            # Mise à jour sous verrou, du chargement au remplacement du fichier
+            Update_weekly_file(input_file, output_file, year, km_rate, meal_price, loyer)
+        else:
+            # Sauvegarde dans un dossier local puis copie vers le partage en arrière-plan (ndf.publish)
+            with Publisher() as publisher:
+                wb = Create_weekly_sheets(input_file, year, km_rate, meal_price, loyer)
+                Save_workbook_staged(wb , output_file, publisher)
     except Exception as e:
         print(f"Une erreur s'est produite : {e}")
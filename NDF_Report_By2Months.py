@@ -1,95 +1,17 @@
 # By Arthur Péraud
 import os
-import openpyxl
-from datetime import datetime, timedelta
+import typing
 from openpyxl.workbook import Workbook
-
-def Is_file_locked(filepath: str) -> bool:
-    """Vérifie si un fichier est ouvert ou verrouillé (ex: par Excel)."""
-    if not os.path.exists(filepath):
-        return False
-    try:
-        with open(filepath, "a"):
-            return False
-    except IOError:
-        return True
-
-def Get_unique_filename(path : str) -> str:
-    """Génère un nom de fichier unique en ajoutant (1), (2), etc. s'il existe déjà."""
-    base, ext = os.path.splitext(path)
-    i = 1
-    new_path = path
-    while os.path.exists(new_path):
-        new_path = f"{base}({i}){ext}"
-        i += 1
-    return new_path
-
-def Save_workbook_safely(wb: Workbook, output_file: str) -> None:
-    """Sauvegarde fichier Excel, confirmation si existence sinon préfixe est ajouté (Get_unique_filename).
-    Crée le dossier si le chemin n'existe pas.
-    """
-
-    # Vérifie et crée le dossier si nécessaire
-    folder = os.path.dirname(output_file)
-    if folder and not os.path.exists(folder):
-        os.makedirs(folder, exist_ok=True)
-        print(f"📂 Dossier créé : {folder}")
-
-    if os.path.exists(output_file):
-        confirm = input(f"\n⚠️  Le fichier '{output_file}' existe déjà. Voulez-vous l’écraser ? (o/n) : ").strip().lower()
-        
-        if confirm in ['o', 'y']:
-            wb.save(output_file)
-            print(f"✅ Fichier écrasé et sauvegardé sous {output_file}")
-        elif confirm == 'n':
-            new_file = Get_unique_filename(output_file)
-            wb.save(new_file)
-            print(f"📁 Fichier sauvegardé sous un nouveau nom : {new_file}")
-        else:
-            print("Réponse non reconnue, fichier non sauvegardé.")
-    else:
-        wb.save(output_file)
-        print(f"\n✅ Fichier sauvegardé sous {output_file}")
-
-def Get_number_of_weeks(year : int) -> int:
-    """Calcule le nombre de semaines ISO pour une année donnée (52 ou 53 semaines)."""
-    # Vérifie le numéro de semaine du dernier jour de l'année
-    last_day_of_year = datetime(year, 12, 31)
-    last_week = last_day_of_year.isocalendar()[1]
-
-    # S'il y a 53 semaines ISO dans l'année, sinon il y en a 52
-    return 53 if last_week == 53 else 52
-
-def Last_week_contains_4_days_of_month(year : int, month : int = 4) -> (bool, int):
-    """Retourne un tuple (True/False, numéro de la semaine) si la dernière semaine du mois contient au moins 4 jours du mois."""
-    
-    # Gérer le cas où le mois est décembre (12)
-    if month == 12:
-        next_month = 1
-        year += 1  # Passage à l'année suivante
-    else:
-        next_month = month + 1
-    
-    # Dernier jour du mois
-    last_day_of_month = datetime(year, next_month, 1) - timedelta(days=1)
-    
-    # Le premier jour de la semaine (lundi) pour le dernier jour du mois
-    last_week_start = last_day_of_month - timedelta(days=last_day_of_month.weekday())
-    
-    # Calcul du nombre de jours du mois dans la dernière semaine
-    days_in_last_week = 0
-    for i in range(7):  # Vérifier les 7 jours de la semaine
-        current_day = last_week_start + timedelta(days=i)
-        if current_day.month == month:
-            days_in_last_week += 1
-    
-    # Le numéro de la semaine ISO de la dernière semaine du mois
-    last_week_number = last_week_start.isocalendar()[1]
-    
-    # Si la dernière semaine contient 4 jours ou plus du mois
-    contains_4_days = days_in_last_week >= 4
-    
-    return contains_4_days, last_week_number
+from ndf.calendar import Week, Period_index, Period_of, Get_calendar_plan
+from ndf.diff import Compare_sheets
+from ndf.formula import Workbook_evaluator, Excel_error
+from ndf.layout import REPORT_METRICS, METRIC_ROW_STEP, SUMMARY_FIRST_ROW
+from ndf.summary import SUMMARY_SHEET, Summary_cell
+from ndf.xlsx import Sheet_names, Patch_workbook_cells
+from ndf.io import Is_file_locked, Save_workbook_safely
+from ndf.publish import Publisher, Save_workbook_staged
+from ndf.template import Compiled_workbook, Load_compiled_workbook
+from ndf.trace import Span, Count, Setup_from_argv
 
 def Add_brackets_to_filename(path : str) -> str:
     """Rajoute les [] au niveau du nom de fichier"""
@@ -106,101 +28,129 @@ def Add_brackets_to_filename(path : str) -> str:
         return corrected
     return f"[{path}]"
 
-def Create_report_sheet(example_file : str, input_file : str, year : int) -> Workbook:
-    periods = [
-        "Mai/Juin",
-        "Juillet/Août",
-        "Septembre/Octobre",
-        "Novembre/Décembre",
-        "Janvier/Février",
-        "Mars/Avril"
-    ]
+def Report_formula(refs : typing.List[str], cell : str) -> str:
+    """Formule "='[classeur]Sem 18_2025'!M30+..." : somme de `cell` sur les feuilles refs ("'[classeur]Sem 18_2025'!")."""
+    return "=" + "+".join([ref + cell for ref in refs])
 
-    wb = openpyxl.load_workbook(example_file)
-    wb2 = openpyxl.load_workbook(input_file)
+def Report_layout(index : Period_index) -> typing.Iterator[typing.Tuple[int, str, typing.List[Week], int, int]]:
+    """(période, libellé, semaines, ligne du libellé en haut, décalage des lignes de totaux) de chaque période.
+    Le libellé du haut est sur la ligne du premier mois de la période (SUMMARY_FIRST_ROW + un mois par ligne).
+    """
+    for i, label, weeks in index:
+        yield i, label, weeks, SUMMARY_FIRST_ROW + i * index.months_per_period, i * METRIC_ROW_STEP
+
+def Create_report_sheet(example_file : str, input_file : str, year : int, workbook_template : typing.Optional[Compiled_workbook] = None,
+                        granularity : str = "bimonthly") -> Workbook:
+    """Écrit dans la première feuille du modèle les formules de totaux de chaque période
+    (granularity : "monthly", "bimonthly" ou "quarterly", voir ndf.calendar.GRANULARITIES).
+    workbook_template : modèle déjà compilé (cache du service NDF_server), example_file n'est alors pas relu ;
+    sinon le modèle compilé est relu depuis le cache disque s'il existe (ndf.template.Load_compiled_workbook).
+    Si le classeur semaine a sa feuille de synthèse (ndf.summary), chaque total est une seule référence à celle-ci ;
+    sinon (classeur antérieur) la formule additionne la cellule de chaque feuille semaine de la période.
+    """
+    wb = (workbook_template or Load_compiled_workbook(example_file)).New_workbook()
+    # Seuls les noms de feuilles du classeur semaine sont nécessaires : lus dans xl/workbook.xml, sans charger les feuilles
+    sheet_names = Sheet_names(input_file)
+    index = Period_index(Get_calendar_plan(year), sheet_names, granularity)
+    summary = SUMMARY_SHEET in sheet_names
 
     # Feuille modèle par défaut
     ws_template = wb.worksheets[0] 
-    ws2 = wb2.worksheets[0]  
-
-    sheet_titles = wb2.sheetnames
-    start_week = ws2["K1"].value
-
-    start_month = 4 # On commence par le couple Mai/Juin
-    nb_weeks = Get_number_of_weeks(year)
     bracket_input_file = Add_brackets_to_filename(input_file)
 
-    # 20XX
-    k = 0
-    for i in range(6):
-        if start_month == 12 : #20XX + 1
-            year += 1
-            start_month = 0   
-
-        start_month += 2;
-        flag, end_week = Last_week_contains_4_days_of_month(year, start_month)
-
-        if not flag : end_week -= 1
-
-        if i not in [4, 5]:
-            if end_week == 0: end_week = nb_weeks
-            if end_week == 1: end_week = nb_weeks + 1
-        else: # 20XX + 1
-            end_week += nb_weeks 
-
-        end = end_week - start_week + 1 
-        if i == 5 : end = len(sheet_titles) # 20XX + 1
-
-        start_sheet = sheet_titles[k]
-        end_sheet = sheet_titles[end - 1]
-
-        formula1 = f"='{bracket_input_file}{start_sheet}'!M30"    
-        formula2a = f"='{bracket_input_file}{start_sheet}'!M28"    
-        formula2b = f"='{bracket_input_file}{start_sheet}'!M25"    
-        formula3 = f"='{bracket_input_file}{start_sheet}'!I30"    
-        formula4 = f"='{bracket_input_file}{start_sheet}'!I29"    
-        formula5 = f"='{bracket_input_file}{start_sheet}'!M27"  
-
-
-        # Création des formules de sommes
-        for isheet in range(k+1, end):
-            sheet = sheet_titles[isheet]
-
-            formula1 += "+" + f"'{bracket_input_file}{sheet}'!M30"    
-            formula2a += "+" + f"'{bracket_input_file}{sheet}'!M28"    
-            formula2b += "+" + f"'{bracket_input_file}{sheet}'!M25"    
-            formula3 += "+" + f"'{bracket_input_file}{sheet}'!I30"    
-            formula4 += "+" + f"'{bracket_input_file}{sheet}'!I29"    
-            formula5 += "+" + f"'{bracket_input_file}{sheet}'!M27"  
-        
-        print(formula1, "\n")    
-
-        # Colonne MOIS
-        number1 = sheet_titles[k][4] + sheet_titles[k][5] if sheet_titles[k][5] != '_' else sheet_titles[k][4]
-        number2 = sheet_titles[end - 1][4] + sheet_titles[end - 1][5] if sheet_titles[end - 1][5] != '_' else sheet_titles[end - 1][4]
-        
-        ws_template[f"A{27 + i*2}"].value = periods[i] + " (Sem " + number1 + "-" + number2 + ")" 
-        ws_template[f"A{5 + i*2}"].value = periods[i] + " (Sem " + number1 + "-" + number2 + ")" 
-        
-        # Formules Excel
-        ws_template[f"B{27 + i*2}"].value = formula1
-        ws_template[f"C{27 + i*2}"].value = formula2a
-        ws_template[f"C{28 + i*2}"].value = formula2b
-        ws_template[f"G{27 + i*2}"].value = formula3
-        ws_template[f"H{27 + i*2}"].value = formula4
-        ws_template[f"K{27 + i*2}"].value = formula5
-
-        k = end
+    formula_chars = 0
+    with Span("build_formulas", year=year, granularity=granularity) as span:
+        for i, label, weeks, summary_row, offset in Report_layout(index):
+            if not weeks:
+                print(f"ERREUR aucune feuille pour la période {label}.")
+                continue
+
+            if summary:
+                ref = f"'{bracket_input_file}{SUMMARY_SHEET}'!"
+                formulas = {f"{column}{row + offset}": Report_formula([ref], Summary_cell(granularity, i, cell)) for column, row, cell in REPORT_METRICS}
+            else:
+                # Préfixe de chaque feuille construit une fois, puis une formule par total (un seul join)
+                refs = [f"'{bracket_input_file}{week.title}'!" for week in weeks]
+                formulas = {f"{column}{row + offset}": Report_formula(refs, cell) for column, row, cell in REPORT_METRICS}
+            print(next(iter(formulas.values())), "\n")  # Total de la période (M30)
+
+            # Colonne MOIS
+            label = f"{label} (Sem {weeks[0].week_num}-{weeks[-1].week_num})"
+            ws_template[f"A{27 + offset}"].value = label
+            ws_template[f"A{summary_row}"].value = label
+
+            # Formules Excel
+            for coord, formula in formulas.items():
+                ws_template[coord].value = formula
+                formula_chars += len(formula)
+        span.Set(formula_chars=formula_chars)
+    Count("formula_chars", formula_chars)
 
     # Années 7CV
-    ws_template["H21"].value = year - 1   
-    ws_template["I21"].value = year   
+    ws_template["H21"].value = year
+    ws_template["I21"].value = year + 1
 
     print("")
     return wb
 
+def Evaluate_report_values(input_file : str, year : int, granularity : str = "bimonthly",
+                           periods : typing.Optional[typing.Iterable[int]] = None) -> typing.Dict[str, float]:
+    """Calcule sans Excel (ndf.formula) les totaux de chaque période à partir du classeur semaine.
+    Retourne {coordonnée dans le rapport: valeur} pour les cellules de REPORT_METRICS.
+    periods : numéros des périodes à calculer (défaut : toutes) ; seules leurs feuilles sont lues.
+    """
+    plan = Get_calendar_plan(year)
+    sheets = plan.by_title
+    if periods is not None:
+        periods = set(periods)
+        sheets = [week.title for week in plan.weeks if Period_of(week.month, granularity) in periods]
+    with Span("load_values", file=os.path.basename(input_file)):
+        evaluator = Workbook_evaluator(input_file, sheets=sheets)
+    index = Period_index(plan, evaluator.cells, granularity)
+    values = {}
+
+    for i, label, weeks, _, offset in Report_layout(index):
+        if not weeks or periods is not None and i not in periods:
+            continue
+        for column, row, metric in REPORT_METRICS:
+            coord = f"{column}{row + offset}"
+            try:
+                values[coord] = evaluator.Sum((week.title, metric) for week in weeks)
+            except Excel_error as e:
+                print(f"⚠️  {coord} ({label}) non calculé : {e}")
+
+    return values
+
+def Changed_periods(previous_file : str, input_file : str, year : int, granularity : str = "bimonthly") -> typing.Set[int]:
+    """Périodes dont au moins une feuille semaine a été ajoutée, supprimée ou modifiée depuis previous_file
+    (comparaison des parties XML du zip, ndf.diff : sans charger les classeurs).
+    """
+    plan = Get_calendar_plan(year)
+    weeks = [plan.Get_week(title) for title in Compare_sheets(previous_file, input_file).touched]
+    return {Period_of(week.month, granularity) for week in weeks if week is not None}
+
+def Cache_report_values(report_file : str, input_file : str, year : int, granularity : str = "bimonthly",
+                        previous_file : typing.Optional[str] = None) -> None:
+    """Écrit dans le rapport sauvegardé la valeur calculée de chaque formule (valeur en cache) :
+    le rapport s'ouvre avec les bons totaux sans qu'Excel ait à ouvrir le classeur semaine.
+    granularity doit être celle utilisée par Create_report_sheet.
+    previous_file : version du classeur semaine dont les valeurs sont déjà en cache dans le rapport ;
+    seules les périodes dont une feuille a changé depuis sont recalculées (Changed_periods).
+    """
+    periods = None
+    if previous_file is not None:
+        periods = Changed_periods(previous_file, input_file, year, granularity)
+        if not periods:
+            print(f"Aucune feuille semaine modifiée : totaux de {report_file} inchangés")
+            return
+    with Span("evaluate_formulas"):
+        values = Evaluate_report_values(input_file, year, granularity, periods)
+    Patch_workbook_cells(report_file, {Sheet_names(report_file)[0]: values}, keep_formulas=True)
+    print(f"{len(values)} totaux calculés et enregistrés dans {report_file}")
+
 ### Main Program
 if __name__ == "__main__":
+    Setup_from_argv()  # --profile : trace des phases (voir ndf.trace)
     print("Bienvenue dans le Programme Cal Info Mesure du Rapport des Notes de Frais.")
     print("Ecriture des formules : ")
     print("")
@@ -223,7 +173,9 @@ if __name__ == "__main__":
             exit(1)
         
         wb = Create_report_sheet(example_file, input_file, year)
-        Save_workbook_safely(wb , output_file)
+        # Rapport sauvegardé et complété en local, puis copié vers le partage en arrière-plan (ndf.publish)
+        with Publisher() as publisher:
+            Save_workbook_staged(wb , output_file, publisher, prepare=lambda staged: Cache_report_values(staged, input_file, year))
     except Exception as e:
         print(f"Une erreur s'est produite : {e}")
 
@@ -0,0 +1,160 @@
+# Génération en lot des classeurs "Frais Sem" pour tous les salariés (mode sans saisie)
+import os
+import csv
+import sys
+import time
+import typing
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from NDF import Create_weekly_sheets, Save_workbook_safely
+from ndf.io import Save_workbook_atomic
+from ndf.publish import Publisher, Stage_path, Staging_dir
+from ndf.trace import Span, Enable, Flush
+
+DEFAULT_INPUT_FILE = "Frais Sem_Modele.xlsx"
+
+class Job(typing.NamedTuple):
+    """Un classeur à générer : un salarié, une année et ses taux."""
+    employee: str
+    year: int
+    km_rate: float
+    meal_price: float
+    loyer: float
+    output_dir: str
+    input_file: str = DEFAULT_INPUT_FILE
+
+    @property
+    def output_file(self) -> str:
+        return os.path.join(self.output_dir, f"Frais Sem_{self.year}-{self.year + 1}.xlsx")
+
+def _Job_from_dict(row: typing.Dict[str, typing.Any], year: typing.Optional[int]) -> Job:
+    """Construit un Job à partir d'une ligne du manifeste (CSV ou TOML)."""
+    row_year = row.get("year") or year
+    if not row_year:
+        raise ValueError(f"Année manquante pour '{row.get('employee')}' (colonne 'year' ou option --year).")
+    return Job(
+        employee=str(row["employee"]).strip(),
+        year=int(row_year),
+        km_rate=float(row["km_rate"]),
+        meal_price=float(row["meal_price"]),
+        loyer=float(row["loyer"]),
+        output_dir=str(row["output_dir"]),
+        input_file=str(row.get("input_file") or DEFAULT_INPUT_FILE),
+    )
+
+def Read_manifest(path: str, year: typing.Optional[int] = None) -> typing.List[Job]:
+    """Lit le manifeste des salariés.
+
+    CSV : une ligne par salarié, colonnes employee, km_rate, meal_price, loyer, output_dir
+    (+ year et input_file facultatives).
+    TOML : une table [defaults] facultative et une liste [[employee]] avec les mêmes clés
+    ("name" est accepté à la place de "employee").
+    """
+    ext = os.path.splitext(path)[1].lower()
+    rows = []
+
+    if ext == ".toml":
+        import tomllib  # Python 3.11+
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+        defaults = data.get("defaults", {})
+        for entry in data.get("employee", []):
+            row = {**defaults, **entry}
+            row.setdefault("employee", row.get("name"))
+            rows.append(row)
+    else:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            sample = f.read(2048)
+            f.seek(0)
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;")  # Excel FR exporte avec ';'
+            rows = [row for row in csv.DictReader(f, dialect=dialect) if any(row.values())]
+
+    return [_Job_from_dict(row, year) for row in rows]
+
+def Run_job(job: Job, overwrite: bool = False, write_only: bool = False, staging_dir: typing.Optional[str] = None) -> str:
+    """Génère et sauvegarde le classeur d'un salarié. Retourne le chemin écrit.
+    write_only=True : génération en écriture seule (mémoire d'une feuille par processus).
+    staging_dir : sauvegarde dans ce dossier local, la publication vers job.output_file est faite par Run_batch.
+    """
+    try:
+        with Span("job", employee=job.employee, year=job.year):
+            wb = Create_weekly_sheets(job.input_file, job.year, job.km_rate, job.meal_price, job.loyer, verbose=False, write_only=write_only)
+            if staging_dir:
+                saved = Save_workbook_atomic(wb, Stage_path(job.output_file, staging_dir))
+            else:
+                saved = Save_workbook_safely(wb, job.output_file, overwrite=overwrite)
+    finally:
+        Flush(verbose=False)  # Processus de travail : pas d'atexit, la trace est réécrite après chaque job
+    if saved is None:
+        raise IOError(f"Fichier non sauvegardé : {job.output_file}")
+    return saved
+
+def Run_batch(jobs: typing.List[Job], workers: typing.Optional[int] = None, overwrite: bool = False, write_only: bool = False,
+              staging_dir: typing.Optional[str] = None) -> typing.Dict[str, str]:
+    """Exécute les jobs dans un pool de processus (un processus par cœur par défaut).
+    staging_dir : les classeurs sont sauvegardés dans ce dossier local et publiés vers leur destination
+    (partage réseau) par les threads d'un Publisher pendant que les jobs suivants tournent.
+    Affiche la progression job par job et retourne les échecs {classeur de destination: erreur}
+    (un même salarié peut avoir plusieurs années dans le manifeste).
+    """
+    failures = {}
+    start = time.perf_counter()
+    publisher = Publisher(staging_dir=staging_dir) if staging_dir else None
+    employees = {job.output_file: job.employee for job in jobs}
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(Run_job, job, overwrite, write_only, staging_dir): job for job in jobs}
+            for done, future in enumerate(as_completed(futures), 1):
+                job = futures[future]
+                elapsed = time.perf_counter() - start
+                try:
+                    saved = future.result()
+                    if publisher is not None:
+                        publisher.Publish(saved, job.output_file, overwrite)
+                        saved = f"{saved} (publication vers {job.output_file})"
+                    print(f"[{done}/{len(jobs)}] ✅ {job.employee} -> {saved} ({elapsed:.1f} s)")
+                except Exception as e:
+                    failures[job.output_file] = f"{type(e).__name__}: {e}"
+                    print(f"[{done}/{len(jobs)}] ❌ {job.employee} : {e} ({elapsed:.1f} s)")
+
+        if publisher is not None:
+            print("")
+            for destination, error in publisher.Wait().items():
+                failures[destination] = error
+    finally:
+        if publisher is not None:
+            publisher.Close()
+
+    print(f"\n{len(jobs) - len(failures)}/{len(jobs)} classeurs générés en {time.perf_counter() - start:.1f} s.")
+    for output_file, error in failures.items():
+        print(f"  - {employees[output_file]} ({output_file}) : {error}")
+    return failures
+
+### Main Program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génération en lot des classeurs Frais Sem à partir d'un manifeste (CSV/TOML).")
+    parser.add_argument("manifest", help="Fichier manifeste des salariés (.csv ou .toml)")
+    parser.add_argument("--year", type=int, help="Année du 1er Mai 20XX si absente du manifeste")
+    parser.add_argument("--workers", type=int, help="Nombre de processus (défaut : nombre de cœurs)")
+    parser.add_argument("--overwrite", action="store_true", help="Écrase les fichiers existants au lieu de créer (1), (2)...")
+    parser.add_argument("--write-only", action="store_true", help="Génération en écriture seule : mémoire d'une feuille par processus")
+    parser.add_argument("--staging", nargs="?", const="", metavar="DOSSIER",
+                        help="Sauvegarde dans un dossier local (défaut : NDF_STAGING_DIR ou dossier temporaire) puis publication en arrière-plan")
+    parser.add_argument("--profile", nargs="?", const=".", metavar="DOSSIER",
+                        help="Trace JSON des phases (une par processus) dans DOSSIER, voir ndf.trace")
+    parser.add_argument("--profile-cprofile", action="store_true", help="Avec --profile : profil cProfile en plus")
+    args = parser.parse_args()
+    if args.profile or args.profile_cprofile:
+        Enable(args.profile, args.profile_cprofile)
+
+    try:
+        jobs = Read_manifest(args.manifest, args.year)
+    except Exception as e:
+        print(f"Manifeste invalide : {e}")
+        sys.exit(2)
+
+    staging_dir = (args.staging or Staging_dir()) if args.staging is not None else None
+    failures = Run_batch(jobs, args.workers, args.overwrite, args.write_only, staging_dir)
+    sys.exit(1 if failures else 0)
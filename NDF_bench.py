@@ -0,0 +1,333 @@
+# Mesures de performance des programmes NDF (modèles synthétiques, aucune donnée réelle nécessaire)
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import typing
+import argparse
+import platform
+import datetime
+import tempfile
+import subprocess
+import contextlib
+import tracemalloc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import openpyxl
+from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
+
+try:
+    import resource  # Pic RSS (POSIX uniquement)
+except ImportError:
+    resource = None
+
+from NDF import Create_weekly_sheets, Save_workbook_safely
+from NDF_fill import Fill_next_year_workbook
+from NDF_Report_By2Months import Create_report_sheet, Cache_report_values, Evaluate_report_values
+from ndf.calendar import FIRST_DAY_ROW, Period_index, Get_calendar_plan
+from ndf.layout import DAY_COLUMNS, KM_RATE_CELL, TOLLS_COLUMN, LAST_ROW, REPORT_METRICS, Split_coordinate
+from ndf.xlsx import Sheet_names
+from ndf.template import CACHE_ENV
+
+HISTORY_FILE = "NDF_bench_history.jsonl"
+
+# Tailles de modèle synthétique : (lignes, colonnes, plages fusionnées supplémentaires)
+TEMPLATE_SIZES = {
+    "petit": (30, 15, 2),
+    "moyen": (60, 30, 20),
+    "grand": (150, 40, 100),
+}
+
+# Points d'entrée mesurés, dans l'ordre d'exécution
+CASES = ["weekly", "weekly_write_only", "fill", "report", "report_values"]
+
+def Make_synthetic_template(path : str, rows : int = 30, cols : int = 15, merges : int = 2) -> str:
+    """Crée un modèle "Frais Sem" synthétique : rows x cols cellules stylées, `merges` plages fusionnées
+    et les formules de totaux (M25, M27, M28, M30, I29, I30) utilisées par le rapport.
+    Les formules suivent les colonnes de ndf.layout : aucune ne somme la colonne E où NDF écrit le texte "Pe".
+    """
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Modele"
+    thin = Side(style="thin")
+
+    for r in range(1, rows + 1):
+        for c in range(1, cols + 1):
+            cell = ws.cell(row=r, column=c)
+            cell.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+            cell.font = Font(size=8 + (r + c) % 4)
+            cell.alignment = Alignment(horizontal="center")
+            if r < 10:
+                cell.fill = PatternFill("solid", fgColor="DDDDDD")
+
+    # Plages fusionnées hors de la zone des jours (lignes 12 à 30)
+    for m in range(merges):
+        row = 31 + 2*m
+        ws.merge_cells(start_row=row, start_column=1, end_row=row + 1, end_column=4)
+    ws.merge_cells("A1:J1")
+    ws["A1"] = "Note de frais"
+
+    km, meals, meal_price, loyer, total = (DAY_COLUMNS[name] for name in ("km", "meals", "meal_price", "loyer", "total"))
+    rate_column, rate_row = Split_coordinate(KM_RATE_CELL)
+    rate = f"${rate_column}${rate_row}"
+    for i in range(FIRST_DAY_ROW, LAST_ROW, 2):
+        ws[f"{km}{i}"] = 0     # Kilomètres
+        ws[f"{meals}{i}"] = 1  # Nombre de repas
+        ws[f"{total}{i}"] = f"={km}{i}*{rate}+{meals}{i}*{meal_price}{i}+{loyer}{i}"
+    last = LAST_ROW - 2
+    ws["M25"] = f"=SUM({TOLLS_COLUMN}{FIRST_DAY_ROW}:{TOLLS_COLUMN}{last})"  # Péages : ligne du dernier jour du mois
+    ws["M27"] = f"=SUM({loyer}{FIRST_DAY_ROW}:{loyer}{last})"
+    ws["M28"] = f"=SUM({km}{FIRST_DAY_ROW}:{km}{last})*{KM_RATE_CELL}"
+    ws["I29"] = f"=SUM({meals}{FIRST_DAY_ROW}:{meals}{last})"
+    ws["I30"] = f"=SUMPRODUCT({meals}{FIRST_DAY_ROW}:{meals}{last},{meal_price}{FIRST_DAY_ROW}:{meal_price}{last})"
+    ws["M30"] = f"=SUM({total}{FIRST_DAY_ROW}:{total}{last})+M25"  # Le loyer est déjà dans le total de chaque jour
+
+    ws.column_dimensions["A"].width = 20
+    ws.row_dimensions[1].height = 30
+    wb.save(path)
+    return path
+
+def Make_synthetic_report(path : str) -> str:
+    """Crée un modèle "Note de Frais Report" synthétique (en-têtes stylés, zone des périodes lignes 5 à 38)."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Report"
+    ws["A1"] = "Note de frais - Rapport"
+    ws["A1"].font = Font(bold=True, size=14)
+    ws.merge_cells("A1:K1")
+    for r in range(5, 39):
+        for c in range(1, 12):
+            ws.cell(row=r, column=c).border = Border(bottom=Side(style="hair"))
+    wb.save(path)
+    return path
+
+def Measure(func : typing.Callable, *args, **kwargs) -> typing.Tuple[typing.Any, float, int]:
+    """Exécute func et retourne (résultat, durée en s, pic mémoire tracemalloc en octets)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def Bench_template(input_file : str, year : int, repeat : int = 3) -> None:
+    """Compare la génération par modèle compilé avec l'ancien chemin wb.copy_worksheet.
+    Les durées incluent le chargement du modèle, mesuré à part pour référence.
+    """
+    load_times = [Measure(openpyxl.load_workbook, input_file)[1] for _ in range(repeat)]
+    print(f"load_workbook  : {min(load_times)*1000:8.1f} ms (inclus ci-dessous)")
+    for compiled in (False, True):
+        label = "modèle compilé " if compiled else "copy_worksheet"
+        times, peaks = [], []
+        for _ in range(repeat):
+            _, elapsed, peak = Measure(Create_weekly_sheets, input_file, year, 0.6, 20.0, 500.0, verbose=False, compiled=compiled)
+            times.append(elapsed)
+            peaks.append(peak)
+        print(f"{label} : {min(times)*1000:8.1f} ms (meilleur de {repeat}), pic mémoire {max(peaks)/1e6:6.1f} Mo")
+
+### Suite complète : chaque cas dans un processus neuf (pic RSS propre au cas)
+
+def _Peak_rss() -> typing.Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # ko sous Linux, octets sous macOS
+
+def _Run_case(case : str, work_dir : str, year : int, output_file : str) -> None:
+    """Exécute une fois le point d'entrée `case` ; les fichiers d'entrée sont préparés par _Prepare_inputs."""
+    template = os.path.join(work_dir, "Frais Sem_Modele.xlsx")
+    weekly = os.path.join(work_dir, f"Frais Sem_{year}.xlsx")
+    report_template = os.path.join(work_dir, "Note de Frais Report_Modele.xlsx")
+
+    if case in ("weekly", "weekly_write_only"):
+        wb = Create_weekly_sheets(template, year, 0.6, 20.0, 500.0, verbose=False, write_only=case == "weekly_write_only")
+        Save_workbook_safely(wb, output_file, overwrite=True)
+    elif case == "fill":
+        shutil.copyfile(weekly, output_file)
+        Fill_next_year_workbook(output_file, 0.6, 20.0, year, 500.0)  # Lève en cas d'échec : rien n'est mesuré
+    elif case == "report":
+        wb = Create_report_sheet(report_template, weekly, year)
+        Save_workbook_safely(wb, output_file, overwrite=True)
+    elif case == "report_values":
+        shutil.copyfile(os.path.join(work_dir, f"Report_{year}.xlsx"), output_file)
+        Cache_report_values(output_file, weekly, year)
+    else:
+        raise ValueError(f"Cas inconnu : {case}")
+
+def _Case_worker(case : str, work_dir : str, year : int, repeat : int) -> typing.Dict[str, typing.Any]:
+    """Lancé dans un processus neuf : `repeat` exécutions chronométrées sans tracemalloc, puis une avec."""
+    output_file = os.path.join(work_dir, f"out_{case}_{year}.xlsx")
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            _Run_case(case, work_dir, year, output_file)
+            times.append(time.perf_counter() - start)
+        _, _, traced = Measure(_Run_case, case, work_dir, year, output_file)
+    return {
+        "wall_s": min(times),
+        "wall_s_all": times,
+        "tracemalloc_peak": traced,
+        "rss_peak": _Peak_rss(),
+        "output_bytes": os.path.getsize(output_file),
+    }
+
+def _Prepare_inputs(work_dir : str, size : typing.Tuple[int, int, int], years : typing.Iterable[int]) -> None:
+    """Modèles synthétiques et classeurs semaine / rapport de référence (non mesurés)."""
+    template = Make_synthetic_template(os.path.join(work_dir, "Frais Sem_Modele.xlsx"), *size)
+    report_template = Make_synthetic_report(os.path.join(work_dir, "Note de Frais Report_Modele.xlsx"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        for year in years:
+            weekly = os.path.join(work_dir, f"Frais Sem_{year}.xlsx")
+            Create_weekly_sheets(template, year, 0.6, 20.0, 500.0, verbose=False).save(weekly)
+            Check_report_values(weekly, year)
+            Create_report_sheet(report_template, weekly, year).save(os.path.join(work_dir, f"Report_{year}.xlsx"))
+
+def Check_report_values(weekly : str, year : int) -> None:
+    """Vérifie que chaque total du rapport se calcule en nombre sur le classeur de référence : sinon le cas
+    report_values mesurerait le chemin d'erreur (#VALUE!) et non la somme des feuilles.
+    """
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        values = Evaluate_report_values(weekly, year)
+    periods = sum(1 for _, _, weeks in Period_index(Get_calendar_plan(year), Sheet_names(weekly)) if weeks)
+    expected = periods * len(REPORT_METRICS)
+    numbers = [value for value in values.values() if isinstance(value, (int, float)) and not isinstance(value, bool)]
+    if len(numbers) != expected:
+        raise RuntimeError(f"Totaux du rapport non numériques ({len(numbers)}/{expected}) sur {weekly} :\n{output.getvalue()}")
+
+def Default_years(start : int = 2024) -> typing.List[int]:
+    """Premier exercice à 52 semaines et premier à 53 semaines à partir de `start`."""
+    found = {}
+    year = start
+    while len(found) < 2:
+        found.setdefault(len(Get_calendar_plan(year).weeks), year)
+        year += 1
+    return sorted(found.values())
+
+def Git_revision() -> typing.Optional[str]:
+    """Commit courant (avec "+" si l'arbre de travail est modifié), None hors dépôt git."""
+    folder = os.path.dirname(os.path.abspath(__file__))
+    try:
+        head = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=folder, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=folder, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return head + ("+" if dirty else "")
+
+def Run_suite(sizes : typing.Iterable[str], years : typing.Iterable[int], cases : typing.Iterable[str] = CASES,
+              repeat : int = 3) -> typing.Dict[str, typing.Any]:
+    """Lance tous les cas (taille de modèle x exercice x point d'entrée) et retourne l'enregistrement d'historique."""
+    years = list(years)
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for size_name in sizes:
+        size = TEMPLATE_SIZES[size_name]
+        with tempfile.TemporaryDirectory() as work_dir:
+            # Cache disque des modèles compilés propre au dossier de travail (hérité par les processus de mesure) :
+            # rempli par _Prepare_inputs, les cas sont donc mesurés cache chaud
+            os.environ[CACHE_ENV] = os.path.join(work_dir, "cache")
+            _Prepare_inputs(work_dir, size, years)
+            for year in years:
+                weeks = len(Get_calendar_plan(year).weeks)
+                for case in cases:
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                        measures = pool.submit(_Case_worker, case, work_dir, year, repeat).result()
+                    result = {"case": case, "size": size_name, "rows": size[0], "cols": size[1], "merges": size[2],
+                              "year": year, "weeks": weeks, **measures}
+                    results.append(result)
+                    print(Format_result(result))
+
+    return {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "revision": Git_revision(),
+        "python": platform.python_version(),
+        "openpyxl": openpyxl.__version__,
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+def Result_key(result : typing.Dict[str, typing.Any]) -> typing.Tuple[str, str, int]:
+    return result["case"], result["size"], result["year"]
+
+def Format_result(result : typing.Dict[str, typing.Any]) -> str:
+    rss = f"{result['rss_peak']/1e6:7.1f} Mo" if result.get("rss_peak") else "      - "
+    return (f"{result['case']:<14} {result['size']:<6} {result['year']} ({result['weeks']} sem) : "
+            f"{result['wall_s']*1000:8.1f} ms, tracemalloc {result['tracemalloc_peak']/1e6:6.1f} Mo, "
+            f"RSS {rss}, fichier {result['output_bytes']/1e3:7.1f} ko")
+
+def Append_history(record : typing.Dict[str, typing.Any], path : str = HISTORY_FILE) -> None:
+    """Ajoute une ligne JSON à l'historique (une exécution de la suite par ligne)."""
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def Load_history(path : str = HISTORY_FILE) -> typing.List[typing.Dict[str, typing.Any]]:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def Compare_records(old : typing.Dict[str, typing.Any], new : typing.Dict[str, typing.Any], threshold : float = 0.10) -> int:
+    """Affiche l'évolution de chaque cas commun aux deux exécutions ; retourne le nombre de régressions
+    (durée ou pic tracemalloc en hausse de plus de `threshold`).
+    """
+    print(f"Comparaison {old.get('revision')} ({old['date']}) -> {new.get('revision')} ({new['date']})")
+    previous = {Result_key(r): r for r in old["results"]}
+    regressions = 0
+    for result in new["results"]:
+        before = previous.get(Result_key(result))
+        if before is None:
+            continue
+        line = []
+        for metric in ("wall_s", "tracemalloc_peak", "output_bytes"):
+            ratio = result[metric] / before[metric] if before[metric] else 1.0
+            flag = ""
+            if metric != "output_bytes" and ratio > 1 + threshold:
+                flag = " ⚠️"
+                regressions += 1
+            line.append(f"{metric} x{ratio:.2f}{flag}")
+        print(f"{result['case']:<14} {result['size']:<6} {result['year']} : " + ", ".join(line))
+    return regressions
+
+### Main Program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark des programmes NDF (génération, remplissage, rapport).")
+    parser.add_argument("--sizes", nargs="+", choices=list(TEMPLATE_SIZES), default=list(TEMPLATE_SIZES),
+                        help="Tailles de modèle synthétique")
+    parser.add_argument("--years", nargs="+", type=int, help="Exercices (défaut : un à 52 et un à 53 semaines)")
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=CASES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--history", default=HISTORY_FILE, help="Historique JSON Lines des exécutions")
+    parser.add_argument("--no-save", action="store_true", help="Ne pas ajouter l'exécution à l'historique")
+    parser.add_argument("--compare", action="store_true",
+                        help="Sans lancer la suite : compare les deux dernières exécutions de l'historique")
+    parser.add_argument("--copy-worksheet", action="store_true",
+                        help="Ancien benchmark : modèle compilé / copy_worksheet sur un modèle synthétique")
+    parser.add_argument("--rows", type=int, default=30, help="Lignes stylées (--copy-worksheet)")
+    parser.add_argument("--cols", type=int, default=15, help="Colonnes stylées (--copy-worksheet)")
+    parser.add_argument("--merges", type=int, default=2, help="Plages fusionnées supplémentaires (--copy-worksheet)")
+    args = parser.parse_args()
+
+    if args.copy_worksheet:
+        with tempfile.TemporaryDirectory() as tmp:
+            template = Make_synthetic_template(os.path.join(tmp, "Frais Sem_Modele.xlsx"), args.rows, args.cols, args.merges)
+            Bench_template(template, (args.years or [2025])[0], args.repeat)
+        sys.exit(0)
+
+    if args.compare:
+        history = Load_history(args.history)
+        if len(history) < 2:
+            print(f"Historique {args.history} : il faut au moins deux exécutions.")
+            sys.exit(1)
+        sys.exit(1 if Compare_records(history[-2], history[-1]) else 0)
+
+    record = Run_suite(args.sizes, args.years or Default_years(), args.cases, args.repeat)
+    history = Load_history(args.history)
+    if history:
+        Compare_records(history[-1], record)
+    if not args.no_save:
+        Append_history(record, args.history)
+        print(f"Résultats ajoutés à {args.history}")
@@ -0,0 +1,55 @@
+# Différences entre deux versions d'un classeur "Frais Sem" (après NDF_fill ou une saisie) : feuilles et cellules modifiées
+import sys
+import typing
+import argparse
+
+from ndf.diff import Compare_sheets, Iter_cell_changes
+from ndf.trace import Enable
+
+_KIND_LABELS = {"added": "+", "removed": "-", "changed": "~"}
+
+def _Titles(titles: typing.List[str], limit: int = 8) -> str:
+    shown = ", ".join(titles[:limit])
+    return shown + (f", ... (+{len(titles) - limit})" if len(titles) > limit else "")
+
+def Print_diff(old_file: str, new_file: str, sheets_only: bool = False) -> int:
+    """Affiche les feuilles ajoutées / supprimées / modifiées puis, sauf sheets_only, le détail des cellules.
+    Retourne le nombre de différences (feuilles ajoutées ou supprimées + cellules modifiées).
+    """
+    comparison = Compare_sheets(old_file, new_file)
+    if comparison.added:
+        print(f"Feuilles ajoutées ({len(comparison.added)}) : {_Titles(comparison.added)}")
+    if comparison.removed:
+        print(f"Feuilles supprimées ({len(comparison.removed)}) : {_Titles(comparison.removed)}")
+    print(f"{len(comparison.unchanged)} feuille(s) identique(s), {len(comparison.changed)} modifiée(s)")
+
+    differences = len(comparison.added) + len(comparison.removed)
+    if sheets_only or not comparison.changed:
+        return differences + len(comparison.changed)
+
+    sheet = None
+    for change in Iter_cell_changes(old_file, new_file, comparison.changed):
+        if change.sheet != sheet:
+            sheet = change.sheet
+            print(f"\n{sheet}")
+        print(f"  {_KIND_LABELS[change.kind]} {change.coord:<6} {change.old!r} -> {change.new!r}")
+        differences += 1
+    return differences
+
+### Main Program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Différences cellule par cellule entre deux versions d'un classeur Frais Sem.")
+    parser.add_argument("old", help="Ancienne version du classeur")
+    parser.add_argument("new", help="Nouvelle version du classeur")
+    parser.add_argument("--sheets-only", action="store_true", help="Feuilles modifiées seulement, sans lire les cellules")
+    parser.add_argument("--profile", nargs="?", const=".", metavar="DOSSIER", help="Trace JSON des phases, voir ndf.trace")
+    args = parser.parse_args()
+    if args.profile:
+        Enable(args.profile)
+
+    try:
+        differences = Print_diff(args.old, args.new, args.sheets_only)
+    except (OSError, KeyError) as e:
+        print(f"❌ Comparaison impossible : {e}")
+        sys.exit(2)
+    sys.exit(1 if differences else 0)  # Comme diff : 0 identiques, 1 différents
@@ -0,0 +1,191 @@
+# Export des lignes de dépenses journalières des feuilles "Sem N_AAAA" vers SQLite ou Parquet (analyses Finance)
+import os
+import sys
+import sqlite3
+import typing
+import argparse
+import itertools
+from datetime import date, timedelta
+
+from ndf.calendar import FIRST_DAY_ROW, Get_calendar_plan
+from ndf.layout import DAY_COLUMNS, KM_RATE_CELL, TOLLS_COLUMN, LAST_ROW, Column_index, Number_value, Fiscal_year_of
+from ndf.trace import Span, Count, Enable
+
+class Expense_line(typing.NamedTuple):
+    """Une ligne jour d'une feuille semaine."""
+    sheet: str
+    fiscal_year: int        # Année du 1er Mai de l'exercice
+    week_num: int
+    day_date: date
+    day: typing.Optional[int]
+    km: typing.Optional[float]
+    km_rate: typing.Optional[float]
+    meals: typing.Optional[float]
+    meal_price: typing.Optional[float]
+    tolls: typing.Optional[float]       # Total Péage du mois (dernier jour du mois uniquement)
+    loyer: typing.Optional[float]       # Loyer_ES (dernier jour du mois uniquement)
+    total: typing.Optional[float]
+
+# Types SQLite / Parquet des champs, dans l'ordre de Expense_line
+FIELD_TYPES = [
+    ("sheet", "TEXT"), ("fiscal_year", "INTEGER"), ("week_num", "INTEGER"), ("day_date", "TEXT"),
+    ("day", "INTEGER"), ("km", "REAL"), ("km_rate", "REAL"), ("meals", "REAL"), ("meal_price", "REAL"),
+    ("tolls", "REAL"), ("loyer", "REAL"), ("total", "REAL"),
+]
+
+def Iter_expense_lines(file_path: str, year: typing.Optional[int] = None) -> typing.Iterator[Expense_line]:
+    """Parcourt en flux (read_only, iter_rows) les feuilles semaine et produit 7 Expense_line par feuille.
+
+    Seules les lignes 12 à 26 de chaque feuille sont lues ; la mémoire ne dépend pas du nombre de feuilles.
+    Les dates viennent du plan de l'exercice (ndf.calendar), pas de la colonne B (numéro du jour seul).
+    Les formules sont lues par leur valeur en cache (data_only) : None si Excel n'a jamais recalculé le fichier.
+    """
+    import openpyxl  # Chargé à la première ligne lue : le module s'importe sans openpyxl
+
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        year = year if year is not None else Fiscal_year_of(wb.sheetnames)
+        if year is None:
+            return
+        plan = Get_calendar_plan(year)
+        # Index 0 dans les tuples de iter_rows
+        columns = {name: Column_index(letter) - 1 for name, letter in DAY_COLUMNS.items()}
+        km_rate_column, km_rate_row = Column_index(KM_RATE_CELL[0]) - 1, int(KM_RATE_CELL[1:])
+        tolls_column = Column_index(TOLLS_COLUMN) - 1
+        max_col = max(list(columns.values()) + [km_rate_column, tolls_column]) + 1
+
+        for title in wb.sheetnames:
+            week = plan.Get_week(title)
+            if week is None:
+                continue  # Feuilles hors exercice ou feuilles annexes
+            ws = wb[title]
+            rows = {}
+            for r, row in enumerate(ws.iter_rows(min_row=FIRST_DAY_ROW, max_row=LAST_ROW, max_col=max_col, values_only=True), FIRST_DAY_ROW):
+                rows[r] = row
+            empty = (None,) * max_col
+            km_rate = Number_value(rows.get(km_rate_row, empty)[km_rate_column])
+
+            for k in range(7):
+                r = FIRST_DAY_ROW + 2 * k
+                row = rows.get(r, empty)
+                eom = r == week.eom_pos
+                yield Expense_line(
+                    sheet=title,
+                    fiscal_year=year,
+                    week_num=week.week_num,
+                    day_date=week.week_start + timedelta(days=k),
+                    day=week.days[k],
+                    km=Number_value(row[columns["km"]]),
+                    km_rate=km_rate,
+                    meals=Number_value(row[columns["meals"]]),
+                    meal_price=Number_value(row[columns["meal_price"]]),
+                    tolls=Number_value(row[tolls_column]) if eom else None,
+                    loyer=Number_value(row[columns["loyer"]]) if eom else None,
+                    total=Number_value(row[columns["total"]]),
+                )
+            Count("sheets_exported")
+    finally:
+        wb.close()
+
+def _Batches(lines: typing.Iterable[Expense_line], batch_size: int) -> typing.Iterator[typing.List[Expense_line]]:
+    iterator = iter(lines)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def Source_of(file_path: str) -> typing.Tuple[str, str]:
+    """(source, salarié) d'un classeur : chemin absolu (tous les classeurs s'appellent "Frais Sem_20XX-20XX+1.xlsx")
+    et dossier parent, comme NDF_index.
+    """
+    path = os.path.abspath(file_path)
+    return path, os.path.basename(os.path.dirname(path))
+
+def Write_sqlite(lines: typing.Iterable[Expense_line], db_path: str, source: str, employee: typing.Optional[str] = None,
+                 batch_size: int = 1000, table: str = "expense_lines") -> int:
+    """Écrit les lignes par lots dans une table SQLite (créée si besoin), clé (source, day_date).
+    Les lignes déjà exportées depuis le même fichier source sont remplacées : l'export peut être relancé.
+    Une table d'avant la colonne employee la reçoit ; ses lignes, identifiées par le seul nom du fichier,
+    sont remplacées au premier export d'un classeur de ce nom.
+    """
+    names = ["source", "employee"] + [name for name, _ in FIELD_TYPES]
+    columns = ", ".join(f"{name} {sql_type}" for name, sql_type in FIELD_TYPES)
+    placeholders = ", ".join("?" for _ in names)
+    count = 0
+    db = sqlite3.connect(db_path)
+    try:
+        with db:  # Une seule transaction : la base n'est jamais à moitié remplie
+            db.execute(f"CREATE TABLE IF NOT EXISTS {table} (source TEXT NOT NULL, employee TEXT, {columns}, UNIQUE (source, day_date))")
+            if "employee" not in {row[1] for row in db.execute(f"PRAGMA table_info({table})")}:
+                db.execute(f"ALTER TABLE {table} ADD COLUMN employee TEXT")
+            db.execute(f"CREATE INDEX IF NOT EXISTS {table}_date ON {table} (day_date)")
+            db.execute(f"DELETE FROM {table} WHERE source = ? OR (employee IS NULL AND source = ?)", (source, os.path.basename(source)))
+            for batch in _Batches(lines, batch_size):
+                db.executemany(f"INSERT OR REPLACE INTO {table} ({', '.join(names)}) VALUES ({placeholders})",
+                               [(source, employee, *line[:3], line.day_date.isoformat(), *line[4:]) for line in batch])
+                count += len(batch)
+    finally:
+        db.close()
+    return count
+
+def Write_parquet(lines: typing.Iterable[Expense_line], parquet_path: str, source: str, employee: typing.Optional[str] = None,
+                  batch_size: int = 1000) -> int:
+    """Écrit les lignes par lots (un row group par lot) dans un fichier Parquet. Nécessite pyarrow."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("L'export Parquet nécessite pyarrow (pip install pyarrow).") from None
+
+    arrow_types = {"TEXT": pa.string(), "INTEGER": pa.int32(), "REAL": pa.float64()}
+    schema = pa.schema([("source", pa.string()), ("employee", pa.string())] + [
+        (name, pa.date32() if name == "day_date" else arrow_types[sql_type]) for name, sql_type in FIELD_TYPES
+    ])
+    count = 0
+    with pq.ParquetWriter(parquet_path, schema) as writer:
+        for batch in _Batches(lines, batch_size):
+            data = {"source": [source] * len(batch), "employee": [employee] * len(batch)}
+            for i, (name, _) in enumerate(FIELD_TYPES):
+                data[name] = [line[i] for line in batch]
+            writer.write_table(pa.Table.from_pydict(data, schema=schema))
+            count += len(batch)
+    return count
+
+def Export_expense_lines(file_path: str, output_file: str, year: typing.Optional[int] = None, batch_size: int = 1000,
+                         output_format: typing.Optional[str] = None) -> int:
+    """Exporte les lignes jour du classeur semaine vers output_file (.db/.sqlite/.sqlite3 ou .parquet).
+    Retourne le nombre de lignes écrites.
+    """
+    output_format = output_format or ("parquet" if output_file.lower().endswith(".parquet") else "sqlite")
+    source, employee = Source_of(file_path)
+    with Span("export", format=output_format) as span:
+        lines = Iter_expense_lines(file_path, year)
+        if output_format == "parquet":
+            count = Write_parquet(lines, output_file, source, employee, batch_size)
+        elif output_format == "sqlite":
+            count = Write_sqlite(lines, output_file, source, employee, batch_size)
+        else:
+            raise ValueError(f"Format d'export inconnu : {output_format}")
+        span.Set(lines=count)
+    return count
+
+### Main Program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export des lignes de dépenses journalières (Sem N_AAAA) vers SQLite ou Parquet.")
+    parser.add_argument("workbook", help="Classeur Frais Sem_20XX-20XX+1.xlsx")
+    parser.add_argument("output", help="Base SQLite (.db, .sqlite) ou fichier .parquet")
+    parser.add_argument("--year", type=int, help="Année du 1er Mai 20XX (défaut : d'après la première feuille)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--format", choices=["sqlite", "parquet"], help="Défaut : d'après l'extension du fichier de sortie")
+    parser.add_argument("--profile", nargs="?", const=".", metavar="DOSSIER", help="Trace JSON des phases, voir ndf.trace")
+    args = parser.parse_args()
+    if args.profile:
+        Enable(args.profile)
+
+    try:
+        count = Export_expense_lines(args.workbook, args.output, args.year, args.batch_size, args.format)
+    except (OSError, ImportError, ValueError) as e:
+        print(f"❌ Export impossible : {e}")
+        sys.exit(1)
+    print(f"✅ {count} lignes exportées vers {args.output}")
@@ -1,88 +1,164 @@
-import openpyxl
-import calendar
-import typing
 import os
-from datetime import datetime, timedelta, date
-
-def Is_file_locked(filepath: str) -> bool:
-    """Vérifie si un fichier est ouvert ou verrouillé (ex: par Excel)."""
-    if not os.path.exists(filepath):
-        return False
-    try:
-        with open(filepath, "a"):
-            return False
-    except IOError:
-        return True
-
-def Get_last_day_in_week_range(week_start: datetime, week_end: datetime) -> typing.Tuple[int, int]:
-    """
-    Vérifie si la période [week_start, week_end] inclut le dernier jour du mois de week_start.
-    Retourne (jour_du_dernier_jour, mois_en_francais) si trouvé,
-    sinon (0, mois_en_francais).
+import typing
+from datetime import date, datetime, timedelta
+from ndf.calendar import FIRST_DAY_ROW, Week, Get_calendar_plan
+from ndf.layout import DAY_COLUMNS, KM_RATE_CELL
+from ndf.xlsx import Sheet_names, Patch_workbook_cells
+from ndf.io import Is_file_locked, Workbook_lock, Save_workbook_atomic
+from ndf.trace import Span, Setup_from_argv
+
+def Next_year_patches(year : int, km_rate : float, meal_price : float, loyer : float) -> typing.Dict[str, typing.Dict[str, float]]:
+    """Cellules à remplir pour chaque feuille de l'année suivante : {"Sem N_20XX+1": {"I12": ..., "F26": ..., "L{pos}": ...}}."""
+    patches = {}
+    for week in Get_calendar_plan(year).weeks:
+        if not week.next_year:
+            continue
+        cells = {f"I{i}": meal_price for i in range(12, 26, 2)}  # Prix du repas
+        cells["F26"] = km_rate  # Taux kilométrique
+        if week.eom_pos:
+            cells[f"L{week.eom_pos}"] = loyer  # Loyer
+        patches[week.title] = cells
+    return patches
+
+class Missing_sheet_error(LookupError):
+    """Feuille attendue absente du classeur (ex : "Sem 1_20XX+1" pour remplir l'année suivante)."""
+
+def Fill_next_year_workbook(file_path : str, km_rate : float, meal_price : float, year : int, loyer : float, fast : bool = True) -> typing.List[str]:
+    """ Remplit les feuilles de l'année suivante à partir de "Sem 1_20XX + 1" jusqu'à la dernière.
+    fast=True modifie directement les feuilles concernées dans le zip (ndf.xlsx) sans charger tout le classeur ;
+    en cas de structure XML non reconnue, on repasse par openpyxl.
+    Lève Missing_sheet_error si "Sem 1_20XX+1" n'existe pas ; les autres erreurs (fichier absent, verrou...) sont propagées.
+    Retourne les feuilles remplies.
     """
-    last_day = calendar.monthrange(week_start.year, week_start.month)[1]
-    last_day_date = date(week_start.year, week_start.month, last_day)
-    month = last_day_date.month
-
-    if week_start.date() <= last_day_date <= week_end.date():
-        return last_day_date.day, month
-    return 0, month
-
-def Get_start_of_week(year : int, week : int) -> int:
-    """Calcule la date de début (lundi) pour une semaine ISO donnée d'une année donnée."""
-    # Le 4 janvier est toujours dans la première semaine ISO
-    first_day_of_year = datetime(year, 1, 4)
-    # Trouve le lundi de la première semaine ISO
-    first_week_start = first_day_of_year - timedelta(days=first_day_of_year.weekday())
-
-    # Calcule le début de la semaine demandée
-    week_start = first_week_start + timedelta(weeks=week - 1)
-    return week_start
-
-def Fill_next_year_sheets(file_path : str, km_rate : float, meal_price : float, year : int, loyer : int) -> None:
-    """ Remplit les feuilles de l'année suivante à partir de "Sem 1_20XX + 1" jusqu'à la dernière."""
-    try:
-        wb = openpyxl.load_workbook(file_path)
+    first = f"Sem 1_{year + 1}"
+    if fast:
+        try:
+            if first not in Sheet_names(file_path):
+                raise Missing_sheet_error(f"{first} n'a pas été trouvée.")
+            return Patch_workbook_cells(file_path, Next_year_patches(year, km_rate, meal_price, loyer))
+        except ValueError as e:
+            print(f"Modification directe impossible ({e}), passage par openpyxl.")
+
+    import openpyxl  # Chemin de secours seulement : le chemin rapide n'importe pas openpyxl
+
+    # Verrou tenu du chargement à l'enregistrement
+    with Workbook_lock(file_path):
+        with Span("load_workbook", file=os.path.basename(file_path)):
+            wb = openpyxl.load_workbook(file_path)
+        plan = Get_calendar_plan(year)
 
-        week_num = 1
-        next_year = year + 1
         start_found = False
+        filled = []
 
         # Parcour des feuilles
         for ws in wb.worksheets:
             # On cherche la sheet "Sem 1_20XX + 1"
-            if not start_found and ws.title == f"Sem 1_{next_year}":
+            if not start_found and ws.title == first:
                 start_found = True
 
-            if start_found:
-                print(f"Remplissage des données pour la feuille : {ws.title}")
-
+            week = plan.Get_week(ws.title)
+            if start_found and week is not None and week.next_year:
                 for i in range(12, 26, 2):
                     ws[f"I{i}"].value = meal_price # Prix du repas 
                 ws["F26"].value = km_rate # Taux kilométrique  
 
-                week_start = Get_start_of_week(year+1, week_num)
-                week_end = week_start + timedelta(days=6)
-
-                lastday, month = Get_last_day_in_week_range(week_start, week_end)
-                if lastday:
-                    pos = 12 + (lastday - week_start.day)*2
-                    ws[f"L{pos}"].value = loyer
-
-                week_num += 1
+                if week.eom_pos:
+                    ws[f"L{week.eom_pos}"].value = loyer
+                filled.append(ws.title)
 
         if not start_found:
-            print(f"ERREUR Sem 1_{next_year} n'a pas été trouvée.")
-            return
+            raise Missing_sheet_error(f"{first} n'a pas été trouvée.")
 
-        wb.save(file_path)
-        print(f"Fichier mis à jour et sauvegardé : {file_path}")
+        Save_workbook_atomic(wb, file_path)
+    return filled
 
+def Fill_next_year_sheets(file_path : str, km_rate : float, meal_price : float, year : int, loyer : int, fast : bool = True) -> typing.Optional[typing.List[str]]:
+    """Fill_next_year_workbook pour le programme interactif : les erreurs sont affichées, pas levées.
+    Retourne les feuilles remplies, None en cas d'échec.
+    """
+    try:
+        filled = Fill_next_year_workbook(file_path, km_rate, meal_price, year, loyer, fast)
+    except Missing_sheet_error as e:
+        print(f"ERREUR {e}")
+        return None
     except Exception as e:
         print(f"Une erreur s'est produite : {e}")
+        return None
+    for title in filled:
+        print(f"Remplissage des données pour la feuille : {title}")
+    print(f"Fichier mis à jour et sauvegardé : {file_path}")
+    return filled
+
+def Week_rate_cells(week : Week, start : date, end : date, km_rate : typing.Optional[float] = None,
+                    meal_price : typing.Optional[float] = None, loyer : typing.Optional[float] = None) -> typing.Dict[str, float]:
+    """Cellules de taux de la semaine touchées par un changement du start au end inclus (taux à None : inchangé).
+    Prix du repas : chaque jour de la période. Loyer (L{pos}) : si le dernier jour du mois est dans la période.
+    Taux kilométrique (un seul par feuille) : si le jeudi est dans la période, comme le mois de la semaine.
+    """
+    cells = {}
+    for k in range(7):
+        if not start <= week.week_start + timedelta(days=k) <= end:
+            continue
+        row = FIRST_DAY_ROW + 2 * k
+        if meal_price is not None:
+            cells[f"{DAY_COLUMNS['meal_price']}{row}"] = meal_price
+        if loyer is not None and row == week.eom_pos:
+            cells[f"{DAY_COLUMNS['loyer']}{row}"] = loyer
+    if km_rate is not None and start <= week.week_start + timedelta(days=3) <= end:
+        cells[KM_RATE_CELL] = km_rate
+    return cells
+
+def Rate_patches(year : int, start : date, end : date, km_rate : typing.Optional[float] = None,
+                 meal_price : typing.Optional[float] = None, loyer : typing.Optional[float] = None) -> typing.Dict[str, typing.Dict[str, float]]:
+    """{"Sem N_AAAA": {coordonnée: taux}} des seules semaines de l'exercice qui chevauchent la période."""
+    patches = {}
+    for week in Get_calendar_plan(year).Weeks_between(start, end):
+        cells = Week_rate_cells(week, start, end, km_rate, meal_price, loyer)
+        if cells:
+            patches[week.title] = cells
+    return patches
+
+def Update_rates(file_path : str, year : int, start : date, end : date, km_rate : typing.Optional[float] = None,
+                 meal_price : typing.Optional[float] = None, loyer : typing.Optional[float] = None) -> typing.List[str]:
+    """Change les taux du start au end inclus (changement de barème en cours d'exercice) sans toucher aux autres feuilles.
+    Les feuilles concernées viennent du plan de l'exercice (Rate_patches), pas de l'ordre des feuilles du classeur ;
+    seules leurs parties XML sont réécrites (ndf.xlsx). Retourne les feuilles modifiées.
+    """
+    if km_rate is None and meal_price is None and loyer is None:
+        raise ValueError("Aucun taux à modifier.")
+    if end < start:
+        raise ValueError(f"Période invalide : {start} > {end}")
+
+    titles = set(Sheet_names(file_path))
+    patches = {title: cells for title, cells in Rate_patches(year, start, end, km_rate, meal_price, loyer).items() if title in titles}
+    if not patches:
+        print(f"Aucune feuille du {start:%d/%m/%Y} au {end:%d/%m/%Y} dans {file_path}.")
+        return []
+
+    with Span("update_rates", sheets=len(patches)):
+        try:
+            updated = Patch_workbook_cells(file_path, patches)
+        except ValueError as e:
+            print(f"Modification directe impossible ({e}), passage par openpyxl.")
+            import openpyxl
+
+            with Workbook_lock(file_path):
+                wb = openpyxl.load_workbook(file_path)
+                for title, cells in patches.items():
+                    for coord, value in cells.items():
+                        wb[title][coord].value = value
+                Save_workbook_atomic(wb, file_path)
+            updated = list(patches)
+    for title in updated:
+        print(f"Taux mis à jour pour la feuille : {title}")
+    return updated
+
+def Parse_date(text : str) -> date:
+    return datetime.strptime(text.strip(), "%d/%m/%Y").date()
 
 ### Main Program
 if __name__ == "__main__":
+    Setup_from_argv()  # --profile : trace des phases (voir ndf.trace)
     print("Bienvenue dans le programme Cal Info Mesure de fraude fiscal qui COMPLETE l'année 20XX+1")
     try:
         year = int(input("Entrez l'année : "))
@@ -97,10 +173,18 @@ if __name__ == "__main__":
             print("Fermez-le puis relancez le programme.")
             exit(1)
         
-        km_rate = float(input("Entrez le taux kilométrique : "))
-        meal_price = float(input("Entrez le prix du repas : "))
-        loyer = float(input("Entrez le prix du loyer : "))
-
-        Fill_next_year_sheets(file_path, km_rate, meal_price, year, loyer)
+        # Changement de barème en cours d'exercice : seules les semaines de la période sont modifiées
+        period = input("Période du changement de taux (JJ/MM/AAAA-JJ/MM/AAAA), Entrée pour remplir l'année 20XX+1 : ").strip()
+        if period:
+            start, end = (Parse_date(part) for part in period.split("-"))
+            rates = [input(f"Entrez {label} (Entrée : inchangé) : ").strip() for label in ("le taux kilométrique", "le prix du repas", "le prix du loyer")]
+            km_rate, meal_price, loyer = (float(rate) if rate else None for rate in rates)
+            Update_rates(file_path, year, start, end, km_rate, meal_price, loyer)
+        else:
+            km_rate = float(input("Entrez le taux kilométrique : "))
+            meal_price = float(input("Entrez le prix du repas : "))
+            loyer = float(input("Entrez le prix du loyer : "))
+
+            Fill_next_year_sheets(file_path, km_rate, meal_price, year, loyer)
     except Exception as e:
         print(f"Une erreur s'est produite : {e}")
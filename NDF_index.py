@@ -0,0 +1,221 @@
+# Index SQLite multi-années / multi-salariés des classeurs "Frais Sem" : totaux par feuille, rescans incrémentaux
+import os
+import re
+import sys
+import sqlite3
+import typing
+import argparse
+import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from ndf.calendar import FIRST_DAY_ROW, Get_calendar_plan
+from ndf.layout import DAY_COLUMNS, TOLLS_COLUMN, REPORT_METRICS, Number_value, Fiscal_year_of
+from ndf.trace import Span, Count, Enable
+
+if typing.TYPE_CHECKING:
+    from ndf.formula import Workbook_evaluator
+
+DEFAULT_ROOT = "E:\\Cal Info Mesure\\Note de Frais"
+DEFAULT_INDEX = "NDF_index.sqlite"
+
+# Nom exact : les copies "Frais Sem_2025-2026(1).xlsx" de Reserved_name ne sont pas comptées deux fois
+FILE_NAME_RE = re.compile(r"^Frais Sem_(\d{4})-\d{4}\.xlsx$", re.I)
+YEAR_FOLDER_RE = re.compile(r"^Année (\d{4})-\d{4}$", re.I)
+
+# Totaux des lignes jour (somme des lignes 12 à 24) et cellules de totaux reprises par le rapport (M30, M28...)
+ROW_TOTALS = ["km", "meals", "tolls", "loyer"]
+METRIC_CELLS = sorted({metric for _, _, metric in REPORT_METRICS})
+TOTAL_COLUMNS = ROW_TOTALS + [cell.lower() for cell in METRIC_CELLS]
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL,
+    employee TEXT, fiscal_year INTEGER, sheets INTEGER, error TEXT, indexed_at TEXT
+);
+CREATE TABLE IF NOT EXISTS sheet_totals (
+    path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    employee TEXT, fiscal_year INTEGER, sheet TEXT NOT NULL, week_num INTEGER, week_start TEXT,
+    month INTEGER, period INTEGER, {", ".join(f"{c} REAL" for c in TOTAL_COLUMNS)},
+    PRIMARY KEY (path, sheet)
+);
+CREATE INDEX IF NOT EXISTS sheet_totals_employee ON sheet_totals (employee, fiscal_year);
+"""
+
+class Indexed_file(typing.NamedTuple):
+    """Un classeur trouvé lors du parcours : chemin, empreinte (mtime, taille) et métadonnées tirées du chemin."""
+    path: str
+    mtime_ns: int
+    size: int
+    employee: str
+    fiscal_year: typing.Optional[int]
+
+def Find_workbooks(root: str) -> typing.Iterator[Indexed_file]:
+    """Parcourt root\\Année 20XX-20XX+1\\{salarié}\\Frais Sem_*.xlsx (et plus généralement toute l'arborescence).
+    Le salarié est le dossier parent ; l'exercice vient du dossier "Année ..." ou, à défaut, du nom du fichier.
+    """
+    for folder, _, files in os.walk(root):
+        for name in files:
+            match = FILE_NAME_RE.match(name)
+            if match is None:
+                continue  # Autres fichiers, fichiers verrou Excel "~$...", temporaires ".~ndf..."
+            path = os.path.join(folder, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            year_folder = next((YEAR_FOLDER_RE.match(part) for part in reversed(os.path.normpath(folder).split(os.sep))
+                                if YEAR_FOLDER_RE.match(part)), None)
+            fiscal_year = int(year_folder.group(1)) if year_folder else int(match.group(1))
+            yield Indexed_file(os.path.abspath(path), stat.st_mtime_ns, stat.st_size, os.path.basename(folder), fiscal_year)
+
+def _Value(evaluator: "Workbook_evaluator", sheet: str, coord: str) -> typing.Optional[float]:
+    from ndf.formula import Excel_error
+    try:
+        return Number_value(evaluator.Evaluate(sheet, coord))
+    except Excel_error:
+        return None
+
+def Parse_workbook(path: str, fiscal_year: typing.Optional[int] = None) -> typing.List[typing.Dict[str, typing.Any]]:
+    """Totaux de chaque feuille semaine d'un classeur (exécuté dans un processus de travail).
+    Une seule lecture (read_only) : les formules sont calculées par ndf.formula, sans valeurs en cache nécessaires.
+    """
+    from ndf.formula import Workbook_evaluator  # openpyxl : seulement pour "scan", "query" n'en a pas besoin
+
+    evaluator = Workbook_evaluator(path, sheets=None)
+    fiscal_year = fiscal_year or Fiscal_year_of(evaluator.cells)
+    if fiscal_year is None:
+        return []
+    plan = Get_calendar_plan(fiscal_year)
+
+    sheets = []
+    for title in evaluator.cells:
+        week = plan.Get_week(title)
+        if week is None:
+            continue
+        day_rows = range(FIRST_DAY_ROW, FIRST_DAY_ROW + 14, 2)
+        totals = {
+            "km": sum(_Value(evaluator, title, f"{DAY_COLUMNS['km']}{r}") or 0.0 for r in day_rows),
+            "meals": sum(_Value(evaluator, title, f"{DAY_COLUMNS['meals']}{r}") or 0.0 for r in day_rows),
+            "tolls": _Value(evaluator, title, f"{TOLLS_COLUMN}{week.eom_pos}") if week.eom_pos else None,
+            "loyer": _Value(evaluator, title, f"{DAY_COLUMNS['loyer']}{week.eom_pos}") if week.eom_pos else None,
+        }
+        for cell in METRIC_CELLS:
+            totals[cell.lower()] = _Value(evaluator, title, cell)
+        sheets.append({"sheet": title, "week_num": week.week_num, "week_start": week.week_start.isoformat(),
+                       "month": week.month, "period": week.period, **totals})
+    return sheets
+
+def Open_index(db_path: str) -> sqlite3.Connection:
+    db = sqlite3.connect(db_path)
+    db.execute("PRAGMA foreign_keys = ON")
+    db.executescript(_SCHEMA)
+    return db
+
+def Update_index(root: str, db_path: str = DEFAULT_INDEX, workers: typing.Optional[int] = None, verbose: bool = True) -> typing.Dict[str, int]:
+    """Met l'index à jour : seuls les fichiers nouveaux ou modifiés (mtime ou taille) sont relus, en parallèle ;
+    les fichiers disparus sont retirés. Un fichier en erreur au dernier passage est toujours relu
+    (erreur passagère : fichier en cours d'enregistrement, partage indisponible...). Retourne les compteurs {"unchanged", "parsed", "errors", "removed"}.
+    """
+    stats = {"unchanged": 0, "parsed": 0, "errors": 0, "removed": 0}
+    db = Open_index(db_path)
+    try:
+        known = {path: (mtime, size) if error is None else None
+                 for path, mtime, size, error in db.execute("SELECT path, mtime_ns, size, error FROM files")}
+        found = {}
+        todo = []
+        with Span("scan", root=root):
+            for entry in Find_workbooks(root):
+                found[entry.path] = entry
+                if known.get(entry.path) == (entry.mtime_ns, entry.size):
+                    stats["unchanged"] += 1
+                else:
+                    todo.append(entry)
+
+        removed = [path for path in known if path not in found]
+        with db:
+            db.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in removed])
+        stats["removed"] = len(removed)
+
+        with Span("parse", files=len(todo)), ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(Parse_workbook, entry.path, entry.fiscal_year): entry for entry in todo}
+            for done, future in enumerate(as_completed(futures), 1):
+                entry = futures[future]
+                try:
+                    sheets, error = future.result(), None
+                    stats["parsed"] += 1
+                except Exception as e:
+                    sheets, error = [], f"{type(e).__name__}: {e}"
+                    stats["errors"] += 1
+                _Store_file(db, entry, sheets, error)
+                Count("files_indexed")
+                if verbose:
+                    status = f"❌ {error}" if error else f"{len(sheets)} feuilles"
+                    print(f"[{done}/{len(todo)}] {entry.employee} {entry.fiscal_year} : {status}")
+    finally:
+        db.close()
+    return stats
+
+def _Store_file(db: sqlite3.Connection, entry: Indexed_file, sheets: typing.List[typing.Dict[str, typing.Any]], error: typing.Optional[str]) -> None:
+    """Remplace en une transaction l'entrée du fichier et ses totaux par feuille."""
+    columns = ["sheet", "week_num", "week_start", "month", "period"] + TOTAL_COLUMNS
+    with db:
+        db.execute("DELETE FROM files WHERE path = ?", (entry.path,))
+        db.execute("INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                   (entry.path, entry.mtime_ns, entry.size, entry.employee, entry.fiscal_year, len(sheets), error,
+                    datetime.datetime.now().isoformat(timespec="seconds")))
+        db.executemany(f"INSERT INTO sheet_totals (path, employee, fiscal_year, {', '.join(columns)}) "
+                       f"VALUES ({', '.join('?' for _ in range(len(columns) + 3))})",
+                       [(entry.path, entry.employee, entry.fiscal_year, *(sheet[c] for c in columns)) for sheet in sheets])
+
+def Query_totals(db_path: str, metric: str, since: typing.Optional[int] = None, employee: typing.Optional[str] = None) -> typing.List[typing.Tuple[str, int, float]]:
+    """Total de `metric` (km, meals, tolls, loyer, m30...) par salarié et par exercice : [(salarié, exercice, total)]."""
+    if metric not in TOTAL_COLUMNS:
+        raise ValueError(f"Total inconnu : {metric} (possibles : {', '.join(TOTAL_COLUMNS)})")
+    where, params = [], []
+    if since is not None:
+        where.append("fiscal_year >= ?")
+        params.append(since)
+    if employee is not None:
+        where.append("employee = ?")
+        params.append(employee)
+    sql = (f"SELECT employee, fiscal_year, SUM({metric}) FROM sheet_totals "
+           f"{'WHERE ' + ' AND '.join(where) if where else ''} GROUP BY employee, fiscal_year ORDER BY employee, fiscal_year")
+    db = Open_index(db_path)
+    try:
+        return db.execute(sql, params).fetchall()
+    finally:
+        db.close()
+
+### Main Program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index SQLite des classeurs Frais Sem (tous salariés, toutes années).")
+    parser.add_argument("--index", default=DEFAULT_INDEX, help="Base SQLite de l'index")
+    parser.add_argument("--profile", nargs="?", const=".", metavar="DOSSIER", help="Trace JSON des phases, voir ndf.trace")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scan = commands.add_parser("scan", help="Met l'index à jour (fichiers nouveaux ou modifiés seulement)")
+    scan.add_argument("root", nargs="?", default=DEFAULT_ROOT)
+    scan.add_argument("--workers", type=int, help="Nombre de processus (défaut : nombre de cœurs)")
+
+    query = commands.add_parser("query", help="Totaux par salarié et par exercice")
+    query.add_argument("metric", choices=TOTAL_COLUMNS)
+    query.add_argument("--since", type=int, help="Premier exercice (année du 1er Mai)")
+    query.add_argument("--employee")
+    args = parser.parse_args()
+    if args.profile:
+        Enable(args.profile)
+
+    if args.command == "scan":
+        if not os.path.isdir(args.root):
+            print(f"❌ Dossier introuvable : {args.root}")
+            sys.exit(1)
+        stats = Update_index(args.root, args.index, args.workers)
+        print(f"\n{stats['parsed']} fichier(s) indexé(s), {stats['unchanged']} inchangé(s), "
+              f"{stats['removed']} retiré(s), {stats['errors']} erreur(s).")
+    else:
+        rows = Query_totals(args.index, args.metric, args.since, args.employee)
+        grand_total = 0.0
+        for employee, fiscal_year, total in rows:
+            print(f"{employee:<20} {fiscal_year}-{fiscal_year + 1} : {total or 0:12.2f}")
+            grand_total += total or 0
+        print(f"{'Total':<20} {'':9}   {grand_total:12.2f}")
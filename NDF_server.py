@@ -0,0 +1,199 @@
+# Service local de génération (HTTP sur 127.0.0.1) : modèles compilés et calendriers gardés en mémoire
+import os
+import sys
+import json
+import time
+import typing
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from NDF_fill import Missing_sheet_error
+from ndf.template import Template_cache
+from ndf.trace import Span, Enable, Flush
+
+DEFAULT_PORT = 8765
+
+# Cache propre à chaque processus de travail : le modèle reste compilé d'une requête à l'autre
+_TEMPLATES = Template_cache()
+
+def Generate_weekly(params : typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
+    """POST /weekly : {input_file, output_file, year, km_rate, meal_price, loyer, overwrite?}"""
+    from NDF import Create_weekly_sheets, Save_workbook_safely
+
+    template = _TEMPLATES.Get(params["input_file"])
+    wb = Create_weekly_sheets(params["input_file"], int(params["year"]), float(params["km_rate"]), float(params["meal_price"]),
+                              float(params["loyer"]), verbose=False, workbook_template=template)
+    saved = Save_workbook_safely(wb, params["output_file"], overwrite=params.get("overwrite", False))
+    return {"output_file": saved, "sheets": len(wb.sheetnames)}
+
+def Fill_next_year(params : typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
+    """POST /fill : {file_path, year, km_rate, meal_price, loyer}"""
+    from NDF_fill import Fill_next_year_workbook
+
+    filled = Fill_next_year_workbook(params["file_path"], float(params["km_rate"]), float(params["meal_price"]), int(params["year"]), float(params["loyer"]))
+    return {"file_path": params["file_path"], "sheets": filled}
+
+def Change_rates(params : typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
+    """POST /rates : {file_path, year, start, end (JJ/MM/AAAA), km_rate?, meal_price?, loyer?}"""
+    from NDF_fill import Update_rates, Parse_date
+
+    rates = [None if params.get(name) is None else float(params[name]) for name in ("km_rate", "meal_price", "loyer")]
+    updated = Update_rates(params["file_path"], int(params["year"]), Parse_date(params["start"]), Parse_date(params["end"]), *rates)
+    return {"file_path": params["file_path"], "sheets": updated}
+
+def Build_report(params : typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
+    """POST /report : {example_file, input_file, output_file, year, overwrite?, cache_values?, granularity?}"""
+    from NDF_Report_By2Months import Create_report_sheet, Save_workbook_safely, Cache_report_values
+
+    template = _TEMPLATES.Get(params["example_file"])
+    granularity = params.get("granularity", "bimonthly")
+    wb = Create_report_sheet(params["example_file"], params["input_file"], int(params["year"]), workbook_template=template, granularity=granularity)
+    saved = Save_workbook_safely(wb, params["output_file"], overwrite=params.get("overwrite", False))
+    if saved and params.get("cache_values", True):
+        Cache_report_values(saved, params["input_file"], int(params["year"]), granularity)
+    return {"output_file": saved}
+
+def Cache_stats() -> typing.Dict[str, typing.Any]:
+    """Statistiques du cache de modèles du processus de travail courant."""
+    return {"pid": os.getpid(), **_TEMPLATES.Stats()}
+
+def _Traced(func : typing.Callable, params : typing.Dict[str, typing.Any]) -> typing.Tuple[typing.Dict[str, typing.Any], typing.Dict[str, typing.Any]]:
+    """Exécute une requête dans le processus de travail ; avec --profile, la trace du processus est réécrite après chaque requête.
+    Retourne (résultat, Cache_stats du processus) : le serveur garde ainsi les statistiques de chaque processus.
+    """
+    try:
+        with Span(func.__name__):
+            return func(params), Cache_stats()
+    finally:
+        Flush(verbose=False)
+
+def _Warm_up() -> None:
+    """Importe openpyxl et les programmes NDF une fois pour toutes au démarrage du processus de travail."""
+    import NDF, NDF_fill, NDF_Report_By2Months  # noqa: F401
+
+# Route -> (fonction, paramètres obligatoires), vérifiés avant d'envoyer la requête au pool
+ROUTES = {
+    "/weekly": (Generate_weekly, ("input_file", "output_file", "year", "km_rate", "meal_price", "loyer")),
+    "/fill": (Fill_next_year, ("file_path", "year", "km_rate", "meal_price", "loyer")),
+    "/rates": (Change_rates, ("file_path", "year", "start", "end")),
+    "/report": (Build_report, ("example_file", "input_file", "output_file", "year")),
+}
+
+# Paramètres facultatifs qui doivent être de vrais booléens JSON ("false" serait vrai pour Python)
+BOOLEAN_PARAMS = ("overwrite", "cache_values")
+
+# Erreurs levées par les fonctions des routes -> statut HTTP (500 pour toutes les autres)
+ERROR_STATUS = (
+    (Missing_sheet_error, 422),
+    (FileNotFoundError, 404),
+    (TimeoutError, 423),  # Classeur verrouillé par un autre programme
+)
+
+class NDF_server(ThreadingHTTPServer):
+    """Serveur HTTP : chaque connexion est reçue par un thread, le travail est fait par un pool de processus.
+    Au-delà de max_pending requêtes en cours ou en attente, le serveur répond 503.
+    Le cache de modèles est propre à chaque processus de travail : /status donne les statistiques de chacun,
+    relevées à la fin de sa dernière requête (un processus qui n'a encore rien traité n'y figure pas).
+    """
+    daemon_threads = True
+
+    def __init__(self, address : typing.Tuple[str, int], workers : typing.Optional[int] = None, max_pending : int = 32):
+        super().__init__(address, _Handler)
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_Warm_up)
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.stats_lock = threading.Lock()
+        self.worker_stats : typing.Dict[int, typing.Dict[str, typing.Any]] = {}
+
+    def Record_stats(self, stats : typing.Dict[str, typing.Any]) -> None:
+        with self.stats_lock:
+            self.worker_stats[stats["pid"]] = stats
+
+    def Status(self) -> typing.Dict[str, typing.Any]:
+        """Statistiques de chaque processus de travail et totaux."""
+        with self.stats_lock:
+            workers = sorted(self.worker_stats.values(), key=lambda stats: stats["pid"])
+        return {"workers": workers, "hits": sum(stats["hits"] for stats in workers), "misses": sum(stats["misses"] for stats in workers)}
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def _Reply(self, status : int, body : typing.Dict[str, typing.Any]) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _Run(self, func : typing.Callable, params : typing.Dict[str, typing.Any]) -> None:
+        if not self.server.slots.acquire(blocking=False):
+            self._Reply(503, {"error": "Trop de requêtes en attente"})
+            return
+        start = time.perf_counter()
+        try:
+            result, stats = self.server.pool.submit(_Traced, func, params).result()
+            self.server.Record_stats(stats)
+            self._Reply(200, {**result, "ms": round((time.perf_counter() - start) * 1000, 1)})
+        except Exception as e:
+            status = next((status for error, status in ERROR_STATUS if isinstance(e, error)), 500)
+            self._Reply(status, {"error": f"{type(e).__name__}: {e}"})
+        finally:
+            self.server.slots.release()
+
+    def do_GET(self) -> None:
+        if self.path == "/status":
+            self._Reply(200, self.server.Status())
+        else:
+            self._Reply(404, {"error": f"Route inconnue : {self.path}"})
+
+    def do_POST(self) -> None:
+        route = ROUTES.get(self.path)
+        if route is None:
+            self._Reply(404, {"error": f"Route inconnue : {self.path}"})
+            return
+        func, required = route
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            params = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            self._Reply(400, {"error": f"JSON invalide : {e}"})
+            return
+        if not isinstance(params, dict):
+            self._Reply(400, {"error": "Objet JSON attendu"})
+            return
+        missing = [name for name in required if params.get(name) is None]
+        if missing:
+            self._Reply(400, {"error": f"Paramètre(s) manquant(s) : {', '.join(missing)}"})
+            return
+        not_boolean = [name for name in BOOLEAN_PARAMS if name in params and not isinstance(params[name], bool)]
+        if not_boolean:
+            self._Reply(400, {"error": f"Booléen JSON attendu (true/false) : {', '.join(not_boolean)}"})
+            return
+        self._Run(func, params)
+
+### Main Program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Service local NDF : /weekly, /fill, /rates, /report (POST JSON), /status (GET).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, help="Nombre de processus de travail (défaut : nombre de cœurs)")
+    parser.add_argument("--profile", nargs="?", const=".", metavar="DOSSIER",
+                        help="Trace JSON des phases (une par processus de travail) dans DOSSIER, voir ndf.trace")
+    args = parser.parse_args()
+    if args.profile:
+        Enable(args.profile)
+
+    server = NDF_server((args.host, args.port), args.workers)
+    print(f"Service NDF à l'écoute sur http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nArrêt du service.")
+    finally:
+        server.server_close()
+        sys.exit(0)
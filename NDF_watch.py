@@ -0,0 +1,384 @@
+# Surveillance des classeurs "Frais Sem" : le rapport du salarié est reconstruit dès que son classeur semaine change
+import io
+import os
+import re
+import sys
+import time
+import shutil
+import hashlib
+import signal
+import typing
+import argparse
+import threading
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, Future
+
+from NDF_Report_By2Months import Create_report_sheet, Cache_report_values
+from ndf.io import Is_file_locked, Save_workbook_atomic
+from ndf.layout import Fiscal_year_of
+from ndf.publish import Staging_dir, Stage_path, Publish_file, File_digest
+from ndf.xlsx import Sheet_names
+from ndf.trace import Span, Enable, Flush
+
+WEEKLY_RE = re.compile(r"^Frais Sem_(\d{4})-(\d{4})\.xlsx$", re.IGNORECASE)
+REPORT_TEMPLATE = "Note de Frais Report_Modele.xlsx"
+DEBOUNCE = 5.0        # Secondes sans nouvel enregistrement avant de reconstruire (Excel écrit en plusieurs fois)
+BUSY_RETRY = 10.0     # Fichier ouvert ou verrouillé : nouvel essai après ce délai
+POLL_INTERVAL = 2.0   # Surveillance par scrutation (sans watchdog, ou partage réseau sans notifications)
+_WATCHED_EVENTS = {"created", "modified", "moved"}  # Ni "opened" ni "closed" : Is_busy et la reconstruction ouvrent le classeur
+
+class Report_target(typing.NamedTuple):
+    """Un classeur semaine et le rapport qui en est tiré."""
+    weekly_file: str
+    year: int
+    report_file: str
+
+def Report_target_for(weekly_file: str, report_dir: typing.Optional[str] = None) -> typing.Optional[Report_target]:
+    """Rapport d'un classeur "Frais Sem_20XX-20XX+1.xlsx" : à côté du classeur, ou dans report_dir/<dossier du salarié>.
+    None si le nom de fichier n'est pas celui d'un classeur semaine.
+    """
+    name = os.path.basename(weekly_file)
+    match = WEEKLY_RE.match(name)
+    if match is None:
+        return None
+    year = int(match.group(1))
+    folder = os.path.dirname(os.path.abspath(weekly_file))
+    if report_dir:
+        folder = os.path.join(report_dir, os.path.basename(folder))
+    return Report_target(os.path.abspath(weekly_file), year, os.path.join(folder, f"Note de Frais Report_{year}-{year + 1}.xlsx"))
+
+def Find_weekly_workbooks(paths: typing.Iterable[str]) -> typing.List[str]:
+    """Classeurs semaine donnés directement ou trouvés dans les dossiers (sous-dossiers compris)."""
+    found = []
+    for path in paths:
+        if os.path.isfile(path):
+            found.append(os.path.abspath(path))
+            continue
+        for folder, _, files in os.walk(path):
+            found += [os.path.abspath(os.path.join(folder, name)) for name in files if WEEKLY_RE.match(name)]
+    return sorted(set(found))
+
+def Excel_owner_file(path: str) -> str:
+    """Fichier "~$nom.xlsx" créé par Excel à côté d'un classeur ouvert (visible aussi sur un partage réseau)."""
+    folder, name = os.path.split(path)
+    return os.path.join(folder, f"~${name}")
+
+def Is_busy(path: str) -> bool:
+    """Classeur ouvert dans Excel ou verrouillé par un programme NDF (Is_file_locked), ou encore en cours d'écriture."""
+    if Is_file_locked(path) or os.path.exists(Excel_owner_file(path)):
+        return True
+    if not os.path.exists(path):
+        return False
+    try:
+        Sheet_names(path)  # Zip incomplet tant que l'enregistrement n'est pas terminé
+    except Exception:
+        return True
+    return False
+
+def Snapshot_path(weekly_file: str) -> str:
+    """Copie locale du classeur semaine tel qu'il était au dernier rapport publié (dossier de préparation)."""
+    key = hashlib.sha256(os.path.abspath(weekly_file).encode()).hexdigest()[:16]
+    return os.path.join(Staging_dir(), "snapshots", f"{key}.xlsx")
+
+def _Can_refresh(target: Report_target, template: str, snapshot: str, current: str) -> bool:
+    """Le rapport publié peut être gardé et seules ses valeurs recalculées : même liste de feuilles (donc mêmes
+    formules) qu'au dernier rapport, et modèle du rapport pas plus récent que lui.
+    """
+    if not os.path.exists(snapshot) or not os.path.exists(target.report_file):
+        return False
+    if os.path.exists(template) and os.path.getmtime(template) > os.path.getmtime(target.report_file):
+        return False
+    return Sheet_names(snapshot) == Sheet_names(current)
+
+def Rebuild_report(target: Report_target, template: str = REPORT_TEMPLATE) -> str:
+    """Met à jour le rapport dans le dossier local de préparation puis le publie à sa place
+    (ndf.publish.Publish_file : remplacement atomique, somme de contrôle vérifiée).
+    Si la liste des feuilles n'a pas changé depuis le dernier rapport (Snapshot_path), le rapport publié est repris
+    et seules les périodes dont une feuille a changé sont recalculées (Cache_report_values, previous_file) ;
+    sinon il est reconstruit (Create_report_sheet). Exécuté dans un processus de travail ; retourne le chemin publié.
+    """
+    try:
+        with Span("rebuild_report", file=os.path.basename(target.report_file)):
+            snapshot = Snapshot_path(target.weekly_file)
+            os.makedirs(os.path.dirname(snapshot), exist_ok=True)
+            # Calculs faits sur une copie : elle devient l'instantané si le rapport est publié
+            current = Stage_path(snapshot, os.path.dirname(snapshot))
+            staged = None
+            try:
+                shutil.copyfile(target.weekly_file, current)
+                year = Fiscal_year_of(Sheet_names(current)) or target.year  # Nom de fichier renommé à la main
+                staged = Stage_path(target.report_file)
+                with contextlib.redirect_stdout(io.StringIO()):  # Formules et totaux affichés par le mode interactif
+                    if _Can_refresh(target, template, snapshot, current):
+                        shutil.copyfile(target.report_file, staged)
+                        Cache_report_values(staged, current, year, previous_file=snapshot)
+                    else:
+                        wb = Create_report_sheet(template, target.weekly_file, year)
+                        Save_workbook_atomic(wb, staged)
+                        Cache_report_values(staged, current, year)
+            except BaseException:
+                for path in (current, staged):
+                    if path is not None and os.path.exists(path):
+                        os.remove(path)
+                raise
+            try:
+                published = Publish_file(staged, target.report_file)
+            except BaseException:
+                os.remove(current)
+                raise
+            os.replace(current, snapshot)
+            return published
+    finally:
+        Flush(verbose=False)
+
+def _Init_worker() -> None:
+    """Processus de travail : Ctrl+C est traité par le processus principal, qui laisse finir les reconstructions."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+class Rebuild_queue:
+    """File des reconstructions : les notifications d'un même classeur sont regroupées (une reconstruction
+    DEBOUNCE secondes après le dernier enregistrement), un classeur occupé est repoussé, et au plus `workers`
+    rapports sont reconstruits en même temps. Un classeur modifié pendant sa reconstruction est reconstruit
+    une fois de plus à la fin, jamais en double.
+    """
+
+    def __init__(self, template: str = REPORT_TEMPLATE, report_dir: typing.Optional[str] = None, workers: typing.Optional[int] = None,
+                 debounce: float = DEBOUNCE, busy_retry: float = BUSY_RETRY):
+        self.template = template
+        self.report_dir = report_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.debounce = debounce
+        self.busy_retry = busy_retry
+        self.failures: typing.Dict[str, str] = {}
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_Init_worker)
+        self._due: typing.Dict[str, float] = {}           # Classeur -> heure de reconstruction prévue
+        self._running: typing.Dict[str, Future] = {}
+        self._checking: typing.Set[str] = set()            # Retirés de la file, en cours de vérification (_Dispatch)
+        self._dirty: typing.Set[str] = set()               # Modifiés pendant leur vérification ou leur reconstruction
+        self._waiting: typing.Set[str] = set()             # Occupés (message affiché une seule fois)
+        self._digests: typing.Dict[str, str] = {}          # Contenu du classeur au dernier rapport construit
+        self._condition = threading.Condition()
+        self._stopped = False
+
+    def Notify(self, path: str, delay: typing.Optional[float] = None) -> None:
+        """Classeur semaine modifié (appelé par les threads de surveillance) : reconstruction repoussée de `delay`."""
+        path = os.path.abspath(path)
+        if Report_target_for(path, self.report_dir) is None:
+            return
+        with self._condition:
+            if path in self._running or path in self._checking:
+                self._dirty.add(path)
+            else:
+                self._due[path] = time.monotonic() + (self.debounce if delay is None else delay)
+            self._condition.notify()
+
+    def Schedule_outdated(self, weekly_files: typing.Iterable[str]) -> int:
+        """Au démarrage : rapports absents ou plus anciens que leur classeur semaine, reconstruits sans attendre."""
+        count = 0
+        for path in weekly_files:
+            target = Report_target_for(path, self.report_dir)
+            if target is None:
+                continue
+            if not os.path.exists(target.report_file) or os.path.getmtime(target.report_file) < os.path.getmtime(path):
+                self.Notify(path, delay=0.0)
+                count += 1
+        return count
+
+    def _Dispatch(self, path: str) -> None:
+        """Vérifie un classeur arrivé à échéance puis lance sa reconstruction. Les vérifications (fichier ouvert,
+        somme de contrôle : lecture de tout le classeur sur le partage) sont faites hors de self._condition,
+        les notifications et les autres classeurs ne les attendent pas.
+        """
+        target = Report_target_for(path, self.report_dir)
+        digest = None
+        try:
+            if not os.path.exists(path):
+                state = "gone"
+            elif Is_busy(path) or Is_busy(target.report_file):
+                state = "busy"
+            else:
+                digest = File_digest(path)
+                unchanged = self._digests.get(path) == digest and os.path.exists(target.report_file)
+                state = "unchanged" if unchanged else "ready"  # Enregistré sans changement : rapport déjà à jour
+        except OSError as e:  # Classeur supprimé ou partage indisponible entre deux vérifications
+            print(f"⚠️  {path} : {e}")
+            state = "busy"
+
+        with self._condition:
+            self._checking.discard(path)
+            if state == "busy":
+                if path not in self._waiting:
+                    print(f"⏳ {path} ou son rapport est ouvert, nouvel essai toutes les {self.busy_retry:.0f} s")
+                    self._waiting.add(path)
+                self._dirty.discard(path)
+                self._due[path] = max(self._due.get(path, 0.0), time.monotonic() + self.busy_retry)
+            else:
+                self._waiting.discard(path)
+                if state == "ready":
+                    print(f"🔄 Reconstruction de {target.report_file}")
+                    future = self._pool.submit(Rebuild_report, target, self.template)
+                    self._running[path] = future
+                    future.add_done_callback(lambda f: self._Done(path, digest, f))
+                elif path in self._dirty:  # Modifié pendant la vérification
+                    self._dirty.discard(path)
+                    self._due[path] = time.monotonic() + self.debounce
+            self._condition.notify()
+
+    def _Done(self, path: str, digest: str, future: Future) -> None:
+        with self._condition:
+            del self._running[path]
+            try:
+                published = future.result()
+                self._digests[path] = digest
+                self.failures.pop(path, None)
+                print(f"✅ Rapport à jour : {published}")
+            except Exception as e:
+                self.failures[path] = f"{type(e).__name__}: {e}"
+                print(f"❌ Rapport de {path} non reconstruit : {e}")
+            if path in self._dirty:
+                self._dirty.discard(path)
+                self._due[path] = time.monotonic() + self.debounce
+            self._condition.notify()
+
+    def Run(self) -> None:
+        """Boucle de répartition jusqu'à Stop() : lance les reconstructions arrivées à échéance, dans la limite des workers.
+        Les classeurs à vérifier sont retirés de la file sous self._condition, puis vérifiés sans le tenir (_Dispatch).
+        """
+        while True:
+            with self._condition:
+                if self._stopped:
+                    return
+                now = time.monotonic()
+                free = self.workers - len(self._running) - len(self._checking)
+                ready = [path for path, deadline in sorted(self._due.items(), key=lambda item: item[1]) if deadline <= now][:max(0, free)]
+                for path in ready:
+                    del self._due[path]
+                    self._checking.add(path)
+                if not ready:
+                    # Réveil au plus tard chaque seconde : Ctrl+C n'interrompt pas une attente sans délai sous Windows
+                    timeout = min(self._due.values()) - now if self._due and free > 0 else 1.0
+                    self._condition.wait(min(max(0.0, timeout), 1.0))
+                    continue
+            for path in ready:
+                self._Dispatch(path)
+
+    def Idle(self) -> bool:
+        with self._condition:
+            return not self._due and not self._running and not self._checking and not self._dirty
+
+    def Stop(self) -> None:
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def Close(self) -> None:
+        """Attend les reconstructions en cours ; celles qui n'ont pas commencé sont abandonnées."""
+        self.Stop()
+        self._pool.shutdown(wait=True)
+
+class Poll_watcher(threading.Thread):
+    """Surveillance par scrutation : date et taille de chaque classeur semaine, toutes les `interval` secondes
+    (fonctionne partout, y compris sur un partage réseau qui ne transmet pas les notifications).
+    """
+
+    def __init__(self, paths: typing.List[str], callback: typing.Callable[[str], None], interval: float = POLL_INTERVAL):
+        super().__init__(name="ndf-watch-poll", daemon=True)
+        self.paths = paths
+        self.callback = callback
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._snapshot = self._Scan()
+
+    def _Scan(self) -> typing.Dict[str, typing.Tuple[int, int]]:
+        snapshot = {}
+        for path in Find_weekly_workbooks(self.paths):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            snapshot = self._Scan()
+            for path, state in snapshot.items():
+                if self._snapshot.get(path) != state:
+                    self.callback(path)
+            self._snapshot = snapshot
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+def Start_observer(paths: typing.List[str], callback: typing.Callable[[str], None]) -> typing.Optional[typing.Any]:
+    """Surveillance par notifications du système (watchdog : inotify sous Linux, ReadDirectoryChangesW sous Windows).
+    None si watchdog n'est pas installé.
+    """
+    try:
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+    except ImportError:
+        return None
+
+    class _Handler(FileSystemEventHandler):
+        def on_any_event(self, event: typing.Any) -> None:
+            if event.is_directory or event.event_type not in _WATCHED_EVENTS:
+                return
+            for path in (event.src_path, getattr(event, "dest_path", "")):
+                if path and WEEKLY_RE.match(os.path.basename(path)):
+                    callback(path)
+
+    observer = Observer()
+    handler = _Handler()
+    for path in paths:
+        if os.path.isfile(path):
+            observer.schedule(handler, os.path.dirname(os.path.abspath(path)), recursive=False)
+        else:
+            observer.schedule(handler, path, recursive=True)
+    observer.start()
+    return observer
+
+def Watch(paths: typing.List[str], template: str = REPORT_TEMPLATE, report_dir: typing.Optional[str] = None,
+          workers: typing.Optional[int] = None, debounce: float = DEBOUNCE, poll: typing.Optional[float] = None) -> typing.Dict[str, str]:
+    """Surveille les classeurs semaine jusqu'à Ctrl+C et reconstruit le rapport de chaque classeur modifié.
+    poll : intervalle de scrutation en secondes, imposé (sinon seulement si watchdog n'est pas installé).
+    Retourne les échecs restants {classeur: erreur}.
+    """
+    queue = Rebuild_queue(template, report_dir, workers, debounce)
+    weekly_files = Find_weekly_workbooks(paths)
+    print(f"{len(weekly_files)} classeur(s) semaine surveillé(s), {queue.Schedule_outdated(weekly_files)} rapport(s) à reconstruire.")
+
+    watcher = Start_observer(paths, queue.Notify) if poll is None else None
+    if watcher is None:
+        watcher = Poll_watcher(paths, queue.Notify, poll or POLL_INTERVAL)
+        watcher.start()
+        print(f"Surveillance par scrutation toutes les {watcher.interval:g} s (Ctrl+C pour arrêter).")
+    else:
+        print("Surveillance par notifications du système (Ctrl+C pour arrêter).")
+
+    try:
+        queue.Run()
+    except KeyboardInterrupt:
+        print("\nArrêt de la surveillance, reconstructions en cours terminées...")
+    finally:
+        watcher.stop()
+        queue.Close()
+    return queue.failures
+
+### Main Program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstruit le rapport des notes de frais dès qu'un classeur Frais Sem change.")
+    parser.add_argument("paths", nargs="+", help="Classeurs Frais Sem_20XX-20XX+1.xlsx ou dossiers à surveiller (sous-dossiers compris)")
+    parser.add_argument("--template", default=REPORT_TEMPLATE, help=f"Modèle du rapport (défaut : {REPORT_TEMPLATE})")
+    parser.add_argument("--report-dir", help="Dossier des rapports, un sous-dossier par salarié (défaut : à côté du classeur semaine)")
+    parser.add_argument("--workers", type=int, help="Rapports reconstruits en même temps (défaut : nombre de cœurs)")
+    parser.add_argument("--debounce", type=float, default=DEBOUNCE, help=f"Secondes de calme avant reconstruction (défaut : {DEBOUNCE:g})")
+    parser.add_argument("--poll", nargs="?", type=float, const=POLL_INTERVAL, metavar="SECONDES",
+                        help="Scrutation au lieu des notifications du système (partage réseau)")
+    parser.add_argument("--profile", nargs="?", const=".", metavar="DOSSIER", help="Trace JSON des phases, voir ndf.trace")
+    args = parser.parse_args()
+    if args.profile:
+        Enable(args.profile)
+
+    failures = Watch(args.paths, args.template, args.report_dir, args.workers, args.debounce, args.poll)
+    sys.exit(1 if failures else 0)
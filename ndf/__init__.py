@@ -0,0 +1,6 @@
+# Cœur partagé des programmes NDF (NDF.py, NDF_fill.py, NDF_Report_By2Months.py, lots, service, exports)
+#
+# Aucun sous-module n'est importé ici : "from ndf.calendar import Get_calendar_plan" ne charge pas openpyxl.
+#   Sans openpyxl : calendar (plan de l'exercice), layout (disposition des classeurs), io (verrous, écritures
+#                   atomiques, sauvegarde), trace (mesure par phase), xlsx (modification directe du zip)
+#   Avec openpyxl : formula (calcul des formules), styles (styles nommés), template (modèles compilés, cache disque)
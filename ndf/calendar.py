@@ -0,0 +1,243 @@
+# Calendrier de l'exercice (1er Mai 20XX -> 30 Avril 20XX+1) partagé par NDF, NDF_fill et NDF_Report_By2Months
+import calendar
+import typing
+import numpy as np
+from datetime import datetime, timedelta, date
+
+MONTH_FR = [
+    "Janvier", "Février", "Mars", "Avril", "Mai", "Juin",
+    "Juillet", "Août", "Septembre", "Octobre", "Novembre", "Décembre"
+]
+
+# Granularités du rapport : nombre de mois par période, l'exercice commence en Mai
+GRANULARITIES = {
+    "monthly": 1,
+    "bimonthly": 2,
+    "quarterly": 3,
+}
+
+def Period_labels(granularity : str = "bimonthly") -> typing.List[str]:
+    """Libellés des périodes de l'exercice : "Mai", ... / "Mai/Juin", ... / "Mai/Juin/Juillet", ..."""
+    size = GRANULARITIES[granularity]
+    months = [MONTH_FR[(4 + k) % 12] for k in range(12)]
+    return ["/".join(months[i:i + size]) for i in range(0, 12, size)]
+
+def Period_of(month : int, granularity : str = "bimonthly") -> int:
+    """Index de la période (0 = celle qui commence en Mai) contenant le mois `month`."""
+    return (month - 5) % 12 // GRANULARITIES[granularity]
+
+FIRST_DAY_ROW = 12  # Ligne du lundi dans la feuille semaine, un jour toutes les 2 lignes (12, 14, ..., 24)
+
+class Week(typing.NamedTuple):
+    """Une feuille "Sem N_AAAA" de l'exercice."""
+    title: str
+    year: int               # Année ISO de la semaine (celle du titre)
+    week_num: int           # Numéro de semaine ISO
+    week_start: date        # Lundi
+    week_end: date          # Dimanche
+    days: typing.Tuple[int, ...]  # Numéros des 7 jours (colonne B, lignes 12 à 24)
+    month: int              # Mois affiché en O3 : celui qui contient au moins 4 jours de la semaine
+    eom_pos: int            # Ligne du dernier jour du mois dans la semaine (Pe / Total Mois / Loyer), 0 sinon
+    period: int             # Période bimestrielle du rapport (0 = Mai/Juin ... 5 = Mars/Avril), voir Period_index
+    next_year: bool         # Semaine de 20XX+1 (taux remplis plus tard par NDF_fill)
+
+    @property
+    def month_label(self) -> str:
+        return MONTH_FR[self.month - 1]
+
+class Calendar_plan:
+    """Toutes les semaines d'un exercice, dans l'ordre des feuilles du classeur."""
+
+    def __init__(self, year: int, weeks: typing.Tuple[Week, ...]):
+        self.year = year
+        self.weeks = weeks
+        self.by_title = {week.title: week for week in weeks}
+
+    def Get_week(self, title: str) -> typing.Optional[Week]:
+        """Retourne la semaine correspondant au titre de feuille "Sem N_AAAA", None si absente."""
+        return self.by_title.get(title)
+
+    def Weeks_between(self, start: date, end: date) -> typing.Tuple[Week, ...]:
+        """Semaines dont au moins un jour est entre start et end (inclus) : les semaines se suivent de 7 jours
+        en 7 jours, les bornes sont calculées directement sans parcourir le plan.
+        """
+        if not self.weeks or end < start:
+            return ()
+        first_monday = self.weeks[0].week_start
+        first = max(0, (start - first_monday).days // 7)
+        last = min(len(self.weeks) - 1, (end - first_monday).days // 7)
+        return self.weeks[first:last + 1] if last >= 0 else ()
+
+class Period_index:
+    """Index feuille -> semaine -> période d'un classeur, construit une seule fois à partir de ses noms de feuilles.
+
+    Les feuilles absentes du plan (autres exercices, feuilles annexes) sont ignorées ; les semaines de chaque
+    période sont dans l'ordre du plan.
+    """
+
+    def __init__(self, plan: Calendar_plan, sheet_titles: typing.Iterable[str], granularity: str = "bimonthly"):
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Granularité inconnue : {granularity} (possibles : {', '.join(GRANULARITIES)})")
+        self.plan = plan
+        self.granularity = granularity
+        self.labels = Period_labels(granularity)
+        self.periods: typing.List[typing.List[Week]] = [[] for _ in self.labels]
+        self.by_title: typing.Dict[str, typing.Tuple[Week, int]] = {}
+
+        titles = set(sheet_titles)
+        for week in plan.weeks:
+            if week.title in titles:
+                period = Period_of(week.month, granularity)
+                self.by_title[week.title] = (week, period)
+                self.periods[period].append(week)
+
+    @property
+    def months_per_period(self) -> int:
+        return GRANULARITIES[self.granularity]
+
+    def __iter__(self) -> typing.Iterator[typing.Tuple[int, str, typing.List[Week]]]:
+        """(index, libellé, semaines) de chaque période, y compris les périodes sans feuille."""
+        return iter(zip(range(len(self.labels)), self.labels, self.periods))
+
+def _Day_of_month(days: np.ndarray) -> np.ndarray:
+    return (days - days.astype("datetime64[M]").astype("datetime64[D]")).astype(int) + 1
+
+def Build_calendar_plans(years: typing.Iterable[int]) -> typing.Dict[int, Calendar_plan]:
+    """Calcule (vectorisé, NumPy datetime64) les plans de plusieurs exercices d'un coup.
+
+    Une semaine appartient au mois de son jeudi (c'est le mois qui contient au moins 4 de ses jours),
+    l'exercice contient donc toutes les semaines ISO dont le jeudi est entre le 1er Mai 20XX et le 30 Avril 20XX+1.
+    """
+    years = sorted(set(int(y) for y in years))
+    if not years:
+        return {}
+
+    # Premier jeudi >= 1er Mai et dernier jeudi <= 30 Avril suivant, pour chaque exercice
+    may1 = np.array([f"{y}-05-01" for y in years], dtype="datetime64[D]")
+    apr30 = np.array([f"{y + 1}-04-30" for y in years], dtype="datetime64[D]")
+    weekday_may1 = (may1.astype(int) + 3) % 7  # Lundi = 0 (le 01/01/1970 est un jeudi)
+    first_thursday = may1 + (3 - weekday_may1) % 7
+    counts = (apr30 - first_thursday).astype(int) // 7 + 1
+
+    # Tous les jeudis de tous les exercices, à plat
+    fy_index = np.repeat(np.arange(len(years)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    thursdays = first_thursday[fy_index] + 7 * offsets
+
+    mondays = thursdays - 3
+    all_days = mondays[:, None] + np.arange(7)
+    sundays = all_days[:, 6]
+
+    iso_years = thursdays.astype("datetime64[Y]").astype(int) + 1970
+    week_nums = (thursdays - thursdays.astype("datetime64[Y]").astype("datetime64[D]")).astype(int) // 7 + 1
+    months = thursdays.astype("datetime64[M]").astype(int) % 12 + 1
+    periods = (months - 5) % 12 // 2
+    day_numbers = _Day_of_month(all_days)
+
+    # Dernier jour du mois du lundi : dans la semaine -> ligne Pe / Total Mois / Loyer
+    month_ends = (mondays.astype("datetime64[M]") + 1).astype("datetime64[D]") - 1
+    in_week = month_ends <= sundays
+    eom_pos = np.where(in_week, FIRST_DAY_ROW + 2 * (month_ends - mondays).astype(int), 0)
+
+    starts = mondays.astype(object)
+    ends = sundays.astype(object)
+    weeks = [[] for _ in years]
+    for i in range(len(thursdays)):
+        fy = fy_index[i]
+        iso_year, week_num = int(iso_years[i]), int(week_nums[i])
+        weeks[fy].append(Week(
+            title=f"Sem {week_num}_{iso_year}",
+            year=iso_year,
+            week_num=week_num,
+            week_start=starts[i],
+            week_end=ends[i],
+            days=tuple(int(d) for d in day_numbers[i]),
+            month=int(months[i]),
+            eom_pos=int(eom_pos[i]),
+            period=int(periods[i]),
+            next_year=iso_year != years[fy],
+        ))
+
+    return {year: Calendar_plan(year, tuple(w)) for year, w in zip(years, weeks)}
+
+_PLANS: typing.Dict[int, Calendar_plan] = {}  # Plans déjà calculés, par année du 1er Mai
+
+def Get_calendar_plans(years: typing.Iterable[int]) -> typing.Dict[int, Calendar_plan]:
+    """Plans de plusieurs exercices : ceux qui ne sont pas encore en cache sont calculés en un seul passage vectorisé."""
+    years = sorted(set(int(y) for y in years))
+    _PLANS.update(Build_calendar_plans([y for y in years if y not in _PLANS]))
+    return {year: _PLANS[year] for year in years}
+
+def Get_calendar_plan(year: int) -> Calendar_plan:
+    """Plan de l'exercice commençant le 1er Mai `year`, calculé une seule fois (mémoïsé)."""
+    plan = _PLANS.get(year)
+    if plan is None:
+        plan = Get_calendar_plans([year])[year]
+    return plan
+
+### Fonctions unitaires historiques (dates et semaines ISO)
+
+def Get_number_of_weeks(year : int) -> int:
+    """Calcule le nombre de semaines ISO pour une année donnée (52 ou 53 semaines)."""
+    # Vérifie le numéro de semaine du dernier jour de l'année
+    last_day_of_year = datetime(year, 12, 31)
+    last_week = last_day_of_year.isocalendar()[1]
+
+    # S'il y a 53 semaines ISO dans l'année, sinon il y en a 52
+    return 53 if last_week == 53 else 52
+
+def Get_start_of_week(year : int, week : int) -> datetime:
+    """Calcule la date de début (lundi) pour une semaine ISO donnée d'une année donnée."""
+    # Le 4 janvier est toujours dans la première semaine ISO
+    first_day_of_year = datetime(year, 1, 4)
+    # Trouve le lundi de la première semaine ISO
+    first_week_start = first_day_of_year - timedelta(days=first_day_of_year.weekday())
+
+    # Calcule le début de la semaine demandée
+    week_start = first_week_start + timedelta(weeks=week - 1)
+    return week_start
+
+def Get_last_day_in_week_range(week_start: datetime, week_end: datetime) -> typing.Tuple[int, int]:
+    """
+    Vérifie si la période [week_start, week_end] inclut le dernier jour du mois de week_start.
+    Retourne (jour_du_dernier_jour, mois_en_francais) si trouvé,
+    sinon (0, mois_en_francais).
+    """
+    last_day = calendar.monthrange(week_start.year, week_start.month)[1]
+    last_day_date = date(week_start.year, week_start.month, last_day)
+    month = last_day_date.month
+
+    if week_start.date() <= last_day_date <= week_end.date():
+        return last_day_date.day, month
+    return 0, month
+
+def Last_week_contains_4_days_of_month(year : int, month : int = 4) -> typing.Tuple[bool, int]:
+    """Retourne un tuple (True/False, numéro de la semaine) si la dernière semaine du mois contient au moins 4 jours du mois."""
+
+    # Gérer le cas où le mois est décembre (12)
+    if month == 12:
+        next_month = 1
+        year += 1  # Passage à l'année suivante
+    else:
+        next_month = month + 1
+
+    # Dernier jour du mois
+    last_day_of_month = datetime(year, next_month, 1) - timedelta(days=1)
+
+    # Le premier jour de la semaine (lundi) pour le dernier jour du mois
+    last_week_start = last_day_of_month - timedelta(days=last_day_of_month.weekday())
+
+    # Calcul du nombre de jours du mois dans la dernière semaine
+    days_in_last_week = 0
+    for i in range(7):
+        current_day = last_week_start + timedelta(days=i)
+        if current_day.month == month:
+            days_in_last_week += 1
+
+    # Le numéro de la semaine ISO de la dernière semaine du mois
+    last_week_number = last_week_start.isocalendar()[1]
+
+    # Si la dernière semaine contient 4 jours ou plus du mois
+    contains_4_days = days_in_last_week >= 4
+
+    return contains_4_days, last_week_number
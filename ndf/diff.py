@@ -0,0 +1,110 @@
+# Différences cellule par cellule entre deux versions d'un classeur : feuilles appariées par titre, parties XML identiques sautées
+import os
+import typing
+import hashlib
+import zipfile
+from ndf.xlsx import Read_sheet_parts
+from ndf.trace import Span, Count
+
+SHARED_STRINGS = "xl/sharedStrings.xml"
+
+class Sheet_comparison(typing.NamedTuple):
+    """Feuilles des deux versions appariées par titre, dans l'ordre du nouveau classeur (supprimées : ordre de l'ancien)."""
+    added: typing.List[str]
+    removed: typing.List[str]
+    changed: typing.List[str]      # Partie XML différente : les cellules peuvent être identiques (styles, largeurs...)
+    unchanged: typing.List[str]
+
+    @property
+    def touched(self) -> typing.List[str]:
+        """Feuilles ajoutées, supprimées ou modifiées."""
+        return self.added + self.removed + self.changed
+
+class Cell_change(typing.NamedTuple):
+    """Une cellule ajoutée (old None), supprimée (new None) ou modifiée ; les formules sont comparées par leur texte."""
+    sheet: str
+    coord: str
+    old: typing.Any
+    new: typing.Any
+
+    @property
+    def kind(self) -> str:
+        if self.old is None:
+            return "added"
+        if self.new is None:
+            return "removed"
+        return "changed"
+
+def _Digest(archive: zipfile.ZipFile, name: str) -> bytes:
+    return hashlib.blake2b(archive.read(name), digest_size=16).digest()
+
+def _Same_part(old_archive: zipfile.ZipFile, old_name: str, new_archive: zipfile.ZipFile, new_name: str,
+               shared_strings_equal: bool) -> bool:
+    """Vrai si la feuille est identique dans les deux versions. Le CRC et la taille du répertoire du zip
+    écartent sans décompression les parties différentes ; sinon les contenus sont comparés par empreinte.
+    Une feuille qui renvoie à la table des chaînes partagées (t="s", classeurs enregistrés par Excel)
+    n'est identique que si cette table l'est aussi.
+    """
+    old_info, new_info = old_archive.getinfo(old_name), new_archive.getinfo(new_name)
+    if (old_info.CRC, old_info.file_size) != (new_info.CRC, new_info.file_size):
+        return False
+    data = new_archive.read(new_name)
+    if hashlib.blake2b(data, digest_size=16).digest() != _Digest(old_archive, old_name):
+        return False
+    return shared_strings_equal or b't="s"' not in data
+
+def Compare_sheets(old_file: str, new_file: str) -> Sheet_comparison:
+    """Compare les feuilles des deux classeurs sans les charger (zip seul) : quelques millisecondes
+    pour deux fichiers identiques, quelle que soit leur taille.
+    """
+    with Span("compare_sheets", old=os.path.basename(old_file), new=os.path.basename(new_file)), \
+            zipfile.ZipFile(old_file) as old_archive, zipfile.ZipFile(new_file) as new_archive:
+        old_parts, new_parts = Read_sheet_parts(old_archive), Read_sheet_parts(new_archive)
+        old_names, new_names = set(old_archive.namelist()), set(new_archive.namelist())
+        if SHARED_STRINGS in old_names and SHARED_STRINGS in new_names:
+            shared_strings_equal = _Digest(old_archive, SHARED_STRINGS) == _Digest(new_archive, SHARED_STRINGS)
+        else:
+            shared_strings_equal = SHARED_STRINGS not in old_names and SHARED_STRINGS not in new_names
+
+        comparison = Sheet_comparison([], [title for title in old_parts if title not in new_parts], [], [])
+        for title, part in new_parts.items():
+            if title not in old_parts:
+                comparison.added.append(title)
+            elif _Same_part(old_archive, old_parts[title], new_archive, part, shared_strings_equal):
+                comparison.unchanged.append(title)
+            else:
+                comparison.changed.append(title)
+    Count("sheets_skipped_by_hash", len(comparison.unchanged))
+    return comparison
+
+def _Sheet_values(ws: typing.Any) -> typing.Dict[typing.Tuple[int, int], typing.Any]:
+    """{(ligne, colonne): valeur ou "=formule"} des cellules non vides d'une feuille read_only."""
+    values = {}
+    for row in ws.iter_rows():
+        for cell in row:
+            value = cell.value
+            if value is not None:
+                values[(cell.row, cell.column)] = value
+    return values
+
+def Iter_cell_changes(old_file: str, new_file: str, sheets: typing.Iterable[str]) -> typing.Iterator[Cell_change]:
+    """Parcourt en flux (read_only) les feuilles `sheets` présentes dans les deux classeurs et produit les
+    cellules ajoutées, supprimées ou modifiées, feuille par feuille, dans l'ordre des lignes puis des colonnes.
+    La mémoire ne dépend que de la plus grande feuille.
+    """
+    import openpyxl  # Seulement pour les feuilles modifiées : Compare_sheets s'en passe
+    from openpyxl.utils import get_column_letter
+
+    old_wb = openpyxl.load_workbook(old_file, read_only=True)
+    new_wb = openpyxl.load_workbook(new_file, read_only=True)
+    try:
+        for title in sheets:
+            old_values, new_values = _Sheet_values(old_wb[title]), _Sheet_values(new_wb[title])
+            for key in sorted(old_values.keys() | new_values.keys()):
+                old, new = old_values.get(key), new_values.get(key)
+                if old != new or isinstance(old, bool) != isinstance(new, bool):  # 1 == 1.0, mais 1 != VRAI
+                    yield Cell_change(title, f"{get_column_letter(key[1])}{key[0]}", old, new)
+            Count("sheets_diffed")
+    finally:
+        old_wb.close()
+        new_wb.close()
@@ -0,0 +1,355 @@
+# Évaluation des formules des feuilles semaine sans Excel (totaux M30, M28, M25, I30, I29, M27, ...)
+import math
+import typing
+import openpyxl
+from openpyxl.formula.tokenizer import Tokenizer, Token
+from openpyxl.utils.cell import range_boundaries
+
+class Excel_error(Exception):
+    """Erreur Excel (#VALUE!, #DIV/0!, #REF!, #NAME?...) levée pendant l'évaluation."""
+
+    def __init__(self, code: str, message: str = ""):
+        super().__init__(f"{code} {message}".strip())
+        self.code = code
+
+# Priorité des opérateurs infixes (du moins au plus prioritaire), comme dans Excel
+_PRECEDENCE = {
+    "=": 1, "<>": 1, "<": 1, ">": 1, "<=": 1, ">=": 1,
+    "&": 2,
+    "+": 3, "-": 3,
+    "*": 4, "/": 4,
+    "^": 5,
+}
+
+def _Parse_reference(text: str) -> tuple:
+    """'Sem 1_2025'!$M$30 ou A1:B2 -> ('ref', feuille|None, (min_col, min_row, max_col, max_row))."""
+    sheet = None
+    if "!" in text:
+        sheet, text = text.rsplit("!", 1)
+        if sheet.startswith("'") and sheet.endswith("'"):
+            sheet = sheet[1:-1].replace("''", "'")
+        if sheet.startswith("["):
+            raise Excel_error("#REF!", f"référence externe non prise en charge : {sheet}")
+    try:
+        bounds = range_boundaries(text.replace("$", ""))
+    except ValueError:
+        raise Excel_error("#NAME?", text)
+    if None in bounds:
+        raise Excel_error("#REF!", f"plage ouverte non prise en charge : {text}")
+    return ("ref", sheet, bounds)
+
+class _Parser:
+    """Analyse les jetons openpyxl en arbre : ('num', x) ('str', s) ('bool', b) ('ref', ...) ('op', o, a, b)
+    ('neg', a) ('pct', a) ('func', NOM, [args])."""
+
+    def __init__(self, formula: str):
+        self.tokens = [t for t in Tokenizer(formula).items if t.type != Token.WSPACE]
+        self.pos = 0
+
+    def _Peek(self) -> typing.Optional[Token]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _Next(self) -> Token:
+        token = self._Peek()
+        if token is None:
+            raise Excel_error("#VALUE!", "formule incomplète")
+        self.pos += 1
+        return token
+
+    def Parse(self) -> tuple:
+        node = self._Expression(1)
+        if self._Peek() is not None:
+            raise Excel_error("#VALUE!", f"jeton inattendu : {self._Peek().value}")
+        return node
+
+    def _Expression(self, min_precedence: int) -> tuple:
+        left = self._Unary()
+        while True:
+            token = self._Peek()
+            if token is None or token.type != Token.OP_IN or _PRECEDENCE.get(token.value, 0) < min_precedence:
+                return left
+            self.pos += 1
+            right = self._Expression(_PRECEDENCE[token.value] + 1)
+            left = ("op", token.value, left, right)
+
+    def _Unary(self) -> tuple:
+        token = self._Peek()
+        if token is not None and token.type == Token.OP_PRE:
+            self.pos += 1
+            operand = self._Unary()
+            return ("neg", operand) if token.value == "-" else operand
+        node = self._Primary()
+        while self._Peek() is not None and self._Peek().type == Token.OP_POST:
+            self.pos += 1
+            node = ("pct", node)
+        return node
+
+    def _Primary(self) -> tuple:
+        token = self._Next()
+        if token.type == Token.OPERAND:
+            if token.subtype == Token.NUMBER:
+                return ("num", float(token.value))
+            if token.subtype == Token.TEXT:
+                return ("str", token.value[1:-1].replace('""', '"'))
+            if token.subtype == Token.LOGICAL:
+                return ("bool", token.value.upper() == "TRUE")
+            if token.subtype == Token.ERROR:
+                return ("err", token.value)
+            return _Parse_reference(token.value)
+
+        if token.type == Token.PAREN and token.subtype == Token.OPEN:
+            node = self._Expression(1)
+            self._Next()  # ")"
+            return node
+
+        if token.type == Token.FUNC and token.subtype == Token.OPEN:
+            name = token.value[:-1].upper().replace("_XLFN.", "")
+            args = []
+            if self._Peek() is not None and self._Peek().type == Token.FUNC and self._Peek().subtype == Token.CLOSE:
+                self.pos += 1
+                return ("func", name, args)
+            while True:
+                args.append(self._Expression(1))
+                token = self._Next()
+                if token.type == Token.FUNC and token.subtype == Token.CLOSE:
+                    return ("func", name, args)
+                if not (token.type == Token.SEP and token.subtype == Token.ARG):
+                    raise Excel_error("#VALUE!", f"jeton inattendu : {token.value}")
+
+        raise Excel_error("#VALUE!", f"jeton non pris en charge : {token.value}")
+
+def _To_number(value: typing.Any) -> float:
+    if value is None or value == "":
+        return 0.0
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace(",", "."))
+    except ValueError:
+        raise Excel_error("#VALUE!", repr(value))
+
+def _To_text(value: typing.Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def _Numbers(values: typing.Iterable[typing.Any]) -> typing.List[float]:
+    """Nombres d'une plage : le texte, les booléens et les cellules vides sont ignorés (comme SUM/MIN/MAX)."""
+    return [float(v) for v in values if isinstance(v, (int, float)) and not isinstance(v, bool)]
+
+def _Round(value: float, digits: float, mode: str = "half") -> float:
+    factor = 10 ** int(digits)
+    scaled = abs(value) * factor
+    if mode == "up":
+        scaled = math.ceil(scaled - 1e-9)
+    elif mode == "down":
+        scaled = math.floor(scaled + 1e-9)
+    else:
+        scaled = math.floor(scaled + 0.5 + 1e-9)  # Excel arrondit 0,5 en s'éloignant de zéro
+    return math.copysign(scaled / factor, value)
+
+class Workbook_evaluator:
+    """Calcule les valeurs des cellules d'un classeur à partir de ses formules, sans Excel.
+
+    Le classeur est lu une seule fois en lecture seule (read_only=True) ; chaque formule distincte
+    n'est analysée qu'une fois et chaque cellule n'est calculée qu'une fois (mémoïsation).
+    Fonctions prises en charge : SUM, SUMPRODUCT, PRODUCT, MIN, MAX, AVERAGE, COUNT, COUNTA, IF,
+    IFERROR, AND, OR, NOT, ROUND, ROUNDUP, ROUNDDOWN, INT, ABS.
+    """
+
+    def __init__(self, file_path: str, sheets: typing.Optional[typing.Iterable[str]] = None):
+        wanted = set(sheets) if sheets is not None else None
+        self.cells = {}  # {feuille: {(ligne, colonne): valeur ou "=formule"}}
+
+        wb = openpyxl.load_workbook(file_path, read_only=True)
+        try:
+            for ws in wb.worksheets:
+                if wanted is not None and ws.title not in wanted:
+                    continue
+                values = {}
+                for row in ws.iter_rows():
+                    for cell in row:
+                        value = cell.value
+                        if value is not None:
+                            values[(cell.row, cell.column)] = value
+                self.cells[ws.title] = values
+        finally:
+            wb.close()
+
+        self._results = {}
+        self._parsed = {}
+        self._in_progress = set()
+
+    def Evaluate(self, sheet: str, coord: str) -> typing.Any:
+        """Valeur calculée de la cellule (ex: Evaluate("Sem 18_2025", "M30")). Lève Excel_error si incalculable."""
+        min_col, min_row, _, _ = _Parse_reference(coord)[2]
+        return self._Cell(sheet, min_row, min_col)
+
+    def Sum(self, refs: typing.Iterable[typing.Tuple[str, str]]) -> float:
+        """Équivalent de ='Sem 18_2025'!M30+'Sem 19_2025'!M30+... : cellules vides = 0, texte -> #VALUE!."""
+        return sum(_To_number(self.Evaluate(sheet, coord)) for sheet, coord in refs)
+
+    def _Cell(self, sheet: str, row: int, column: int) -> typing.Any:
+        key = (sheet, row, column)
+        if key in self._results:
+            result = self._results[key]
+            if isinstance(result, Excel_error):
+                raise result
+            return result
+
+        if sheet not in self.cells:
+            raise Excel_error("#REF!", f"feuille inconnue : {sheet}")
+        value = self.cells[sheet].get((row, column))
+        if isinstance(value, str) and value.startswith("="):
+            if key in self._in_progress:
+                raise Excel_error("#REF!", f"référence circulaire dans {sheet}")
+            self._in_progress.add(key)
+            try:
+                node = self._parsed.get(value)
+                if node is None:
+                    node = self._parsed[value] = _Parser(value).Parse()
+                value = self._Eval(node, sheet)
+                if isinstance(value, list):  # Plage renvoyée par une formule : première valeur
+                    value = value[0][0] if value and value[0] else None
+            except Excel_error as e:
+                self._results[key] = e
+                raise
+            finally:
+                self._in_progress.discard(key)
+
+        self._results[key] = value
+        return value
+
+    def _Range(self, node: tuple, sheet: str) -> typing.List[typing.List[typing.Any]]:
+        _, ref_sheet, (min_col, min_row, max_col, max_row) = node
+        ref_sheet = ref_sheet or sheet
+        return [[self._Cell(ref_sheet, r, c) for c in range(min_col, max_col + 1)] for r in range(min_row, max_row + 1)]
+
+    def _Flat(self, args: typing.List[tuple], sheet: str) -> typing.List[typing.Any]:
+        """Valeurs de tous les arguments : les plages sont aplaties, les valeurs directes converties en nombre."""
+        values = []
+        for arg in args:
+            if arg[0] == "ref":
+                for row in self._Range(arg, sheet):
+                    values.extend(row)
+            else:
+                values.append(_To_number(self._Eval(arg, sheet)))
+        return values
+
+    def _Eval(self, node: tuple, sheet: str) -> typing.Any:
+        kind = node[0]
+        if kind in ("num", "str", "bool"):
+            return node[1]
+        if kind == "err":
+            raise Excel_error(node[1])
+        if kind == "ref":
+            _, ref_sheet, (min_col, min_row, max_col, max_row) = node
+            if (min_col, min_row) == (max_col, max_row):
+                return self._Cell(ref_sheet or sheet, min_row, min_col)
+            return self._Range(node, sheet)
+        if kind == "neg":
+            return -_To_number(self._Eval(node[1], sheet))
+        if kind == "pct":
+            return _To_number(self._Eval(node[1], sheet)) / 100
+        if kind == "op":
+            return self._Operator(node[1], self._Eval(node[2], sheet), self._Eval(node[3], sheet))
+        if kind == "func":
+            return self._Function(node[1], node[2], sheet)
+        raise Excel_error("#VALUE!", f"noeud inconnu {kind}")
+
+    def _Operator(self, op: str, a: typing.Any, b: typing.Any) -> typing.Any:
+        if isinstance(a, list) or isinstance(b, list):
+            raise Excel_error("#VALUE!", "plage utilisée comme valeur")
+        if op == "&":
+            return _To_text(a) + _To_text(b)
+        if op in ("=", "<>", "<", ">", "<=", ">="):
+            if isinstance(a, str) or isinstance(b, str):
+                a, b = _To_text(a).lower(), _To_text(b).lower()
+            else:
+                a, b = _To_number(a), _To_number(b)
+            return {"=": a == b, "<>": a != b, "<": a < b, ">": a > b, "<=": a <= b, ">=": a >= b}[op]
+
+        a, b = _To_number(a), _To_number(b)
+        if op == "+":
+            return a + b
+        if op == "-":
+            return a - b
+        if op == "*":
+            return a * b
+        if op == "/":
+            if b == 0:
+                raise Excel_error("#DIV/0!")
+            return a / b
+        if op == "^":
+            return a ** b
+        raise Excel_error("#VALUE!", f"opérateur {op}")
+
+    def _Function(self, name: str, args: typing.List[tuple], sheet: str) -> typing.Any:
+        # Fonctions à évaluation paresseuse
+        if name == "IF":
+            condition = self._Eval(args[0], sheet)
+            if isinstance(condition, str):
+                raise Excel_error("#VALUE!", "condition texte")
+            if _To_number(condition):
+                return self._Eval(args[1], sheet) if len(args) > 1 else True
+            return self._Eval(args[2], sheet) if len(args) > 2 else False
+        if name == "IFERROR":
+            try:
+                return self._Eval(args[0], sheet)
+            except Excel_error:
+                return self._Eval(args[1], sheet)
+
+        if name == "SUM":
+            return sum(_Numbers(self._Flat(args, sheet)))
+        if name == "PRODUCT":
+            return math.prod(_Numbers(self._Flat(args, sheet)))
+        if name == "MIN":
+            return min(_Numbers(self._Flat(args, sheet)), default=0.0)
+        if name == "MAX":
+            return max(_Numbers(self._Flat(args, sheet)), default=0.0)
+        if name == "AVERAGE":
+            numbers = _Numbers(self._Flat(args, sheet))
+            if not numbers:
+                raise Excel_error("#DIV/0!")
+            return sum(numbers) / len(numbers)
+        if name == "COUNT":
+            return float(len(_Numbers(self._Flat(args, sheet))))
+        if name == "COUNTA":
+            return float(len([v for v in self._Flat(args, sheet) if v is not None]))
+        if name == "SUMPRODUCT":
+            arrays = []
+            for arg in args:
+                if arg[0] != "ref":
+                    raise Excel_error("#VALUE!", "SUMPRODUCT attend des plages")
+                arrays.append([v for row in self._Range(arg, sheet) for v in row])
+            if len({len(a) for a in arrays}) != 1:
+                raise Excel_error("#VALUE!", "SUMPRODUCT : plages de tailles différentes")
+            total = 0.0
+            for values in zip(*arrays):
+                product = 1.0
+                for v in values:
+                    product *= float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else 0.0
+                total += product
+            return total
+        if name in ("AND", "OR"):
+            values = [bool(_To_number(v)) for v in self._Flat(args, sheet) if v is not None and not isinstance(v, str)]
+            return all(values) if name == "AND" else any(values)
+
+        values = [self._Eval(arg, sheet) for arg in args]
+        if name == "NOT":
+            return not _To_number(values[0])
+        if name in ("ROUND", "ROUNDUP", "ROUNDDOWN"):
+            digits = _To_number(values[1]) if len(values) > 1 else 0
+            mode = {"ROUND": "half", "ROUNDUP": "up", "ROUNDDOWN": "down"}[name]
+            return _Round(_To_number(values[0]), digits, mode)
+        if name == "INT":
+            return float(math.floor(_To_number(values[0])))
+        if name == "ABS":
+            return abs(_To_number(values[0]))
+        raise Excel_error("#NAME?", f"fonction non prise en charge : {name}")
@@ -0,0 +1,250 @@
+# Écritures de classeurs sûres : fichier temporaire + fsync + remplacement atomique, verrous consultatifs entre processus
+import os
+import time
+import shutil
+import socket
+import typing
+import tempfile
+import threading
+import contextlib
+from ndf.trace import Span, Count
+
+LOCK_SUFFIX = ".ndflock"
+LOCK_TIMEOUT = 60.0     # Secondes d'attente maximum d'un verrou tenu par un autre programme
+LOCK_STALE_AFTER = 600.0  # Un verrou plus vieux que ça est considéré comme abandonné
+_POLL = 0.1
+
+_HOST = socket.gethostname()
+_HELD: typing.Dict[typing.Tuple[str, int], int] = {}  # Verrous tenus par ce processus : (chemin, thread) -> profondeur
+_HELD_LOCK = threading.Lock()
+
+def Lock_path(path: str) -> str:
+    """Fichier verrou placé à côté du classeur (visible par tous les postes sur un partage réseau)."""
+    folder, name = os.path.split(os.path.abspath(path))
+    return os.path.join(folder, f"~{name}{LOCK_SUFFIX}")
+
+def _Read_owner(lock_file: str) -> typing.Optional[str]:
+    try:
+        with open(lock_file, encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+def _Process_alive(pid: int) -> bool:
+    if os.name == "nt":
+        return True  # Pas de test fiable sans dépendance : seul l'âge du verrou compte sous Windows
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _Is_stale(lock_file: str, owner: str, stale_after: float) -> bool:
+    """Verrou abandonné : trop ancien, ou posé sur ce poste par un processus qui n'existe plus."""
+    try:
+        age = time.time() - os.path.getmtime(lock_file)
+    except OSError:
+        return False
+    if age > stale_after:
+        return True
+    parts = owner.split()
+    if len(parts) >= 2 and parts[1] == _HOST and parts[0].isdigit():
+        return not _Process_alive(int(parts[0]))
+    return False
+
+def _Remove_stale(lock_file: str, owner: str) -> bool:
+    """Supprime le verrou abandonné dont le contenu est `owner`. Il est d'abord renommé de côté (opération
+    atomique), puis son contenu est vérifié : si un autre programme l'a repris entre la lecture et le renommage,
+    c'est son verrou qui a été déplacé, il est recréé aussitôt. Vrai si le verrou abandonné a été supprimé.
+    """
+    aside = f"{lock_file}.{os.getpid()}.{threading.get_ident()}.stale"
+    try:
+        os.replace(lock_file, aside)
+    except FileNotFoundError:
+        return False  # Déjà supprimé par un autre programme
+    current = _Read_owner(aside)
+    os.remove(aside)
+    if current == owner:
+        return True
+    with contextlib.suppress(FileExistsError):
+        fd = os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(current or "")
+    return False
+
+class Workbook_lock:
+    """Verrou consultatif sur un classeur, partagé par NDF, NDF_fill, NDF_Report_By2Months et les lots.
+
+    Le verrou est un fichier "~nom.xlsx.ndflock" créé en mode exclusif (O_EXCL), ce qui fonctionne aussi
+    sur les partages réseau où flock/fcntl ne sont pas fiables. Il contient "pid poste horodatage".
+    Un verrou abandonné (processus mort sur ce poste, ou plus vieux que stale_after) est supprimé (_Remove_stale).
+    Réentrant pour un même thread : une fonction verrouillée peut en appeler une autre sur le même fichier.
+    Lève TimeoutError si le verrou n'est pas obtenu dans le délai.
+    """
+
+    def __init__(self, path: str, timeout: float = LOCK_TIMEOUT, stale_after: float = LOCK_STALE_AFTER):
+        self.path = os.path.abspath(path)
+        self.lock_file = Lock_path(path)
+        self.timeout = timeout
+        self.stale_after = stale_after
+        self._key = (self.path, threading.get_ident())
+
+    def __enter__(self) -> "Workbook_lock":
+        with _HELD_LOCK:
+            if self._key in _HELD:
+                _HELD[self._key] += 1
+                return self
+
+        folder = os.path.dirname(self.lock_file)
+        os.makedirs(folder, exist_ok=True)
+        owner = f"{os.getpid()} {_HOST} {time.time():.0f}\n"
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fd = os.open(self.lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                current = _Read_owner(self.lock_file)
+                if current is not None and _Is_stale(self.lock_file, current, self.stale_after):
+                    if _Remove_stale(self.lock_file, current):
+                        print(f"🔓 Verrou abandonné supprimé : {self.lock_file}")
+                    continue
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Le fichier '{self.path}' est verrouillé par un autre programme ({(current or '?').strip()}).")
+                time.sleep(_POLL)
+                continue
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(owner)
+            break
+
+        with _HELD_LOCK:
+            _HELD[self._key] = 1
+        return self
+
+    def __exit__(self, *exc) -> None:
+        with _HELD_LOCK:
+            _HELD[self._key] -= 1
+            if _HELD[self._key]:
+                return
+            del _HELD[self._key]
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.lock_file)
+
+def Is_locked_by_other(path: str, stale_after: float = LOCK_STALE_AFTER) -> bool:
+    """Vrai si un autre programme NDF tient le verrou du classeur."""
+    lock_file = Lock_path(path)
+    with _HELD_LOCK:
+        if (os.path.abspath(path), threading.get_ident()) in _HELD:
+            return False
+    owner = _Read_owner(lock_file)
+    return owner is not None and not _Is_stale(lock_file, owner, stale_after)
+
+def Is_file_locked(filepath: str) -> bool:
+    """Vérifie si un fichier est ouvert ou verrouillé (ex: par Excel, ou par un autre programme NDF)."""
+    if Is_locked_by_other(filepath):
+        return True
+    if not os.path.exists(filepath):
+        return False
+    try:
+        with open(filepath, "a"):
+            return False
+    except IOError:
+        return True
+
+def _Fsync_folder(folder: str) -> None:
+    """Rend le renommage durable (POSIX ; sans effet sous Windows où un dossier ne s'ouvre pas)."""
+    if os.name == "nt":
+        return
+    fd = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+@contextlib.contextmanager
+def Atomic_write(path: str, suffix: typing.Optional[str] = None) -> typing.Iterator[str]:
+    """Donne un chemin temporaire dans le même dossier que `path` ; à la sortie sans erreur, le fichier est
+    synchronisé sur disque puis remplace `path` en une seule opération (os.replace). En cas d'erreur,
+    `path` est intact et le temporaire supprimé : aucun lecteur ne voit jamais un classeur à moitié écrit.
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".~ndf", suffix=suffix or os.path.splitext(path)[1], dir=folder)
+    os.close(fd)
+    try:
+        # mkstemp crée le fichier en 0600 : on garde les droits du fichier remplacé, sinon ceux d'un fichier normal
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        else:
+            os.chmod(tmp_path, 0o644)
+        yield tmp_path
+        with open(tmp_path, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+    _Fsync_folder(folder)
+
+@contextlib.contextmanager
+def Reserved_name(path: str, overwrite: bool = False, timeout: float = LOCK_TIMEOUT) -> typing.Iterator[str]:
+    """Nom où écrire : `path` si overwrite ou s'il n'existe pas, sinon le premier "(1)", "(2)"... libre.
+    Le nom est réservé par son verrou (Workbook_lock) pendant le bloc, deux programmes ne peuvent donc pas
+    obtenir le même nom ; le fichier n'est créé que par l'écriture (Atomic_write), jamais vide sur le partage.
+    """
+    base, ext = os.path.splitext(path)
+    i = 0
+    while True:
+        candidate = path if i == 0 else f"{base}({i}){ext}"
+        with Workbook_lock(candidate, timeout):
+            if (overwrite and i == 0) or not os.path.exists(candidate):
+                yield candidate
+                return
+        i += 1
+
+def Save_workbook_atomic(wb: typing.Any, path: str, timeout: float = LOCK_TIMEOUT) -> str:
+    """wb.save(path) sous verrou, par fichier temporaire et remplacement atomique."""
+    with Span("save", file=os.path.basename(path)) as span:
+        with Workbook_lock(path, timeout):
+            with Atomic_write(path) as tmp_path:
+                wb.save(tmp_path)
+                size = os.path.getsize(tmp_path)
+        span.Set(bytes=size)
+        Count("bytes_saved", size)
+    return path
+
+def Save_workbook_safely(wb: typing.Any, output_file: str, overwrite: typing.Optional[bool] = None) -> typing.Optional[str]:
+    """Sauvegarde fichier Excel, confirmation si existence sinon préfixe est ajouté (Reserved_name).
+    Crée le dossier si le chemin n'existe pas.
+    overwrite : None -> demande à l'utilisateur, True -> écrase, False -> nouveau nom (mode sans saisie).
+    Retourne le chemin réellement sauvegardé, None si rien n'a été écrit.
+    """
+
+    # Vérifie et crée le dossier si nécessaire
+    folder = os.path.dirname(output_file)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder, exist_ok=True)
+        print(f"📂 Dossier créé : {folder}")
+
+    if overwrite is None and os.path.exists(output_file):
+        confirm = input(f"\n⚠️  Le fichier '{output_file}' existe déjà. Voulez-vous l’écraser ? (o/n) : ").strip().lower()
+        if confirm not in ['o', 'y', 'n']:
+            print("Réponse non reconnue, fichier non sauvegardé.")
+            return None
+        overwrite = confirm != 'n'
+
+    # Nom réservé par son verrou jusqu'au remplacement : si deux programmes visent le même nouveau fichier,
+    # le second l'écrase (overwrite) ou prend le nom suivant
+    with Reserved_name(output_file, bool(overwrite)) as target:
+        existed = os.path.exists(target)
+        Save_workbook_atomic(wb, target)
+
+    if target != output_file:
+        print(f"📁 Fichier sauvegardé sous un nouveau nom : {target}")
+    elif existed:
+        print(f"✅ Fichier écrasé et sauvegardé sous {target}")
+    else:
+        print(f"\n✅ Fichier sauvegardé sous {target}")
+    return target
@@ -0,0 +1,66 @@
+# Disposition des classeurs "Frais Sem" et du rapport : cellules lues ou écrites par les programmes NDF (sans openpyxl)
+import re
+import typing
+
+SHEET_TITLE_RE = re.compile(r"^Sem (\d{1,2})_(\d{4})$")
+
+# Colonnes d'une ligne jour (lignes paires 12 à 24) du modèle "Frais Sem" : à adapter si le modèle change
+DAY_COLUMNS = {
+    "km": "C",          # Kilomètres
+    "meals": "H",       # Nombre de repas
+    "meal_price": "I",  # Prix du repas (NDF.py / NDF_fill.py)
+    "loyer": "L",       # Loyer (ligne du dernier jour du mois seulement)
+    "total": "M",       # Total de la ligne (formule : valeur en cache si le classeur a été ouvert dans Excel)
+}
+KM_RATE_CELL = "F26"    # Taux kilométrique de la semaine
+TOLLS_COLUMN = "F"      # Total Péage du mois, sur la ligne du dernier jour du mois ("Pe" en colonne E)
+LAST_ROW = 26
+
+# Totaux repris dans le rapport : (colonne, ligne pour Mai/Juin, cellule de la feuille semaine), +2 lignes par période
+REPORT_METRICS = [
+    ("B", 27, "M30"),
+    ("C", 27, "M28"),
+    ("C", 28, "M25"),
+    ("G", 27, "I30"),
+    ("H", 27, "I29"),
+    ("K", 27, "M27"),
+]
+METRIC_ROW_STEP = 2       # Lignes par période dans le bloc des totaux (27, 29, ... ; jusqu'à la ligne 50 en mensuel)
+SUMMARY_FIRST_ROW = 5     # Libellés du bloc du haut : une ligne par mois de l'exercice (lignes 5 à 16)
+
+_COORD_RE = re.compile(r"^\$?([A-Za-z]{1,3})\$?(\d+)$")
+
+def Split_coordinate(coord: str) -> typing.Tuple[str, int]:
+    """"F26" -> ("F", 26), comme openpyxl.utils.cell.coordinate_from_string."""
+    match = _COORD_RE.match(coord)
+    if match is None:
+        raise ValueError(f"Coordonnée de cellule invalide : {coord}")
+    return match.group(1).upper(), int(match.group(2))
+
+def Column_index(letters: str) -> int:
+    """"A" -> 1, "AA" -> 27, comme openpyxl.utils.cell.column_index_from_string."""
+    index = 0
+    for letter in letters.upper():
+        index = index * 26 + ord(letter) - 64
+    return index
+
+def Number_value(value: typing.Any) -> typing.Optional[float]:
+    """Valeur numérique d'une cellule ; texte ("Pe", "Loyer_ES"...), vide ou erreur -> None."""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.replace(",", ".").strip())
+        except ValueError:
+            return None
+    return None
+
+def Fiscal_year_of(titles: typing.Iterable[str]) -> typing.Optional[int]:
+    """Année du 1er Mai d'après la première feuille "Sem N_AAAA" du classeur (l'exercice commence en 20XX)."""
+    for title in titles:
+        match = SHEET_TITLE_RE.match(title)
+        if match:
+            return int(match.group(2))
+    return None
@@ -0,0 +1,150 @@
+# Sorties préparées en local puis publiées vers le partage réseau (copies en arrière-plan, vérifiées, avec reprises)
+import os
+import time
+import shutil
+import typing
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from ndf.io import LOCK_TIMEOUT, Atomic_write, Reserved_name, Save_workbook_atomic
+from ndf.trace import Span, Count
+
+STAGING_ENV = "NDF_STAGING_DIR"  # Dossier local de préparation (défaut : dossier temporaire du poste)
+PUBLISH_WORKERS = 2              # Copies simultanées vers le partage
+PUBLISH_RETRIES = 3
+RETRY_DELAY = 1.0                # Secondes avant la 2e tentative, doublées ensuite
+_CHUNK = 1024 * 1024
+
+def Staging_dir() -> str:
+    folder = os.environ.get(STAGING_ENV) or os.path.join(tempfile.gettempdir(), "ndf_staging")
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+def Stage_path(destination: str, staging_dir: typing.Optional[str] = None) -> str:
+    """Chemin local unique (fichier créé vide) où préparer le fichier destiné à `destination`."""
+    base, ext = os.path.splitext(os.path.basename(destination))
+    folder = staging_dir or Staging_dir()
+    os.makedirs(folder, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=f"{base}.", suffix=ext, dir=folder)
+    os.close(fd)
+    return path
+
+def File_digest(path: str) -> str:
+    """SHA-256 du fichier, lu par blocs de 1 Mo."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def Publish_file(staged: str, destination: str, overwrite: bool = True, retries: int = PUBLISH_RETRIES,
+                 timeout: float = LOCK_TIMEOUT) -> str:
+    """Copie le fichier préparé vers `destination` en une seule copie (shutil.copyfile), sous verrou et par
+    remplacement atomique (ndf.io.Atomic_write) ; la copie est relue et sa somme de contrôle comparée à celle
+    du fichier préparé avant de remplacer la destination. Erreurs réseau et copies altérées sont retentées
+    `retries` fois (attente croissante), un verrou tenu trop longtemps (TimeoutError) ne l'est pas.
+    overwrite=False : nouveau nom "(1)", "(2)"... si la destination existe (comme Save_workbook_safely).
+    Retourne le chemin publié ; le fichier préparé est supprimé, ou conservé en cas d'échec.
+    """
+    digest = File_digest(staged)
+    size = os.path.getsize(staged)
+    target = None
+    with Span("publish", file=os.path.basename(destination), bytes=size):
+        for attempt in range(1, retries + 1):
+            try:
+                with Reserved_name(destination, overwrite, timeout) as target, Atomic_write(target) as tmp_path:
+                    shutil.copyfile(staged, tmp_path)
+                    if File_digest(tmp_path) != digest:
+                        raise IOError(f"copie altérée (somme de contrôle différente de {staged})")
+                break
+            except TimeoutError:
+                raise
+            except OSError as e:
+                if attempt == retries:
+                    raise IOError(f"Publication de {destination} impossible après {retries} tentative(s) : {e} "
+                                  f"(fichier préparé conservé : {staged})") from e
+                print(f"⚠️  Publication de {destination} : {e} (nouvelle tentative {attempt + 1}/{retries})")
+                time.sleep(RETRY_DELAY * 2 ** (attempt - 1))
+    os.remove(staged)
+    Count("bytes_published", size)
+    return target
+
+class Publisher:
+    """Pool borné de threads qui publient en arrière-plan les fichiers préparés en local (Publish_file) :
+    la génération suivante n'attend pas le partage réseau.
+
+        with Publisher() as publisher:
+            Save_workbook_staged(wb, output_file, publisher)
+        # À la sortie : toutes les publications sont terminées (échecs affichés)
+    """
+
+    def __init__(self, workers: int = PUBLISH_WORKERS, retries: int = PUBLISH_RETRIES, staging_dir: typing.Optional[str] = None):
+        self.retries = retries
+        self.staging_dir = staging_dir or Staging_dir()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ndf-publish")
+        self._pending: typing.List[typing.Tuple[str, Future]] = []
+        self._lock = threading.Lock()
+
+    def Stage(self, destination: str) -> str:
+        return Stage_path(destination, self.staging_dir)
+
+    def Publish(self, staged: str, destination: str, overwrite: bool = True) -> Future:
+        """Met la publication en file ; le Future donne le chemin publié."""
+        future = self._pool.submit(Publish_file, staged, destination, overwrite, self.retries)
+        with self._lock:
+            self._pending.append((destination, future))
+        return future
+
+    def Wait(self, verbose: bool = True) -> typing.Dict[str, str]:
+        """Attend les publications en cours. Retourne les échecs {destination: erreur}."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        failures = {}
+        for destination, future in pending:
+            try:
+                published = future.result()
+                if verbose:
+                    print(f"📤 Publié : {published}")
+            except Exception as e:
+                failures[destination] = f"{type(e).__name__}: {e}"
+                if verbose:
+                    print(f"❌ {e}")
+        return failures
+
+    def __enter__(self) -> "Publisher":
+        return self
+
+    def Close(self) -> None:
+        self._pool.shutdown(wait=True)
+
+    def __exit__(self, *exc) -> None:
+        try:
+            self.Wait()
+        finally:
+            self.Close()
+
+def Save_workbook_staged(wb: typing.Any, output_file: str, publisher: Publisher, overwrite: typing.Optional[bool] = None,
+                         prepare: typing.Optional[typing.Callable[[str], None]] = None) -> typing.Optional[Future]:
+    """Variante de Save_workbook_safely pour un partage réseau : le classeur est sauvegardé dans le dossier
+    local de préparation, prepare(chemin local) est appelé s'il est donné (ex : valeurs en cache du rapport),
+    puis la copie vers output_file est confiée au Publisher. overwrite : comme Save_workbook_safely.
+    Retourne le Future de la publication, None si rien n'est publié.
+    """
+    if overwrite is None and os.path.exists(output_file):
+        confirm = input(f"\n⚠️  Le fichier '{output_file}' existe déjà. Voulez-vous l’écraser ? (o/n) : ").strip().lower()
+        if confirm not in ['o', 'y', 'n']:
+            print("Réponse non reconnue, fichier non sauvegardé.")
+            return None
+        overwrite = confirm != 'n'
+
+    staged = publisher.Stage(output_file)
+    try:
+        Save_workbook_atomic(wb, staged)
+        if prepare is not None:
+            prepare(staged)
+    except BaseException:
+        os.remove(staged)
+        raise
+    print(f"\n✅ Fichier préparé sous {staged}, publication vers {output_file}")
+    return publisher.Publish(staged, output_file, bool(overwrite))
@@ -0,0 +1,104 @@
+# Styles nommés des programmes NDF : créés une seule fois, enregistrés une seule fois par classeur
+import typing
+import weakref
+from openpyxl.styles import Font
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.styles.numbers import BUILTIN_FORMATS_MAX_SIZE
+from openpyxl.utils.indexed_list import IndexedList
+from openpyxl.workbook import Workbook
+
+# Polices appliquées par-dessus le style du modèle (Week_overrides -> {coordonnée: nom})
+NAMED_FONTS = {
+    "month_label": Font(bold=True, color="008000", size=9),  # O3 : mois en gras et vert
+    "tolls_total": Font(color="FF0000", size=8),             # F{pos} : Total Péage du mois en rouge
+}
+
+_EMPTY_STYLE = (0,) * 9
+
+class Style_registry:
+    """Styles d'un classeur : chaque police nommée est ajoutée une fois à wb._fonts, et chaque combinaison
+    (style de la cellule, police nommée) est calculée une fois. Une affectation coûte ensuite une recherche
+    dans un dict, sans créer ni hacher de Font (ce que fait cell.font = Font(...) à chaque appel).
+    """
+
+    def __init__(self, wb: Workbook):
+        self.workbook = weakref.proxy(wb)  # Le registre est rangé dans un WeakKeyDictionary indexé par le classeur
+        self._font_ids: typing.Dict[str, int] = {}
+        self._styles: typing.Dict[typing.Tuple[typing.Optional[tuple], str], tuple] = {}
+
+    def Font_id(self, name: str) -> int:
+        font_id = self._font_ids.get(name)
+        if font_id is None:
+            font_id = self._font_ids[name] = self.workbook._fonts.add(NAMED_FONTS[name])
+        return font_id
+
+    def With_font(self, style: typing.Optional[tuple], name: str) -> tuple:
+        """Style `style` (tuple d'un StyleArray, None = style par défaut) avec la police nommée `name`."""
+        key = (style, name)
+        result = self._styles.get(key)
+        if result is None:
+            result = list(style or _EMPTY_STYLE)
+            result[0] = self.Font_id(name)  # fontId
+            result = self._styles[key] = tuple(result)
+        return result
+
+    def Apply_font(self, cell, name: str) -> None:
+        cell._style = StyleArray(self.With_font(tuple(cell._style) if cell.has_style else None, name))
+
+_REGISTRIES: "weakref.WeakKeyDictionary[Workbook, Style_registry]" = weakref.WeakKeyDictionary()
+
+def Registry_for(wb: Workbook) -> Style_registry:
+    """Registre de styles du classeur, créé à la première utilisation."""
+    registry = _REGISTRIES.get(wb)
+    if registry is None:
+        registry = _REGISTRIES[wb] = Style_registry(wb)
+    return registry
+
+def Compact_styles(wb: Workbook) -> int:
+    """Reconstruit les tables de styles du classeur avec les seuls styles utilisés par ses feuilles, sans doublons.
+
+    Un modèle enregistré par Excel apporte souvent des polices, bordures et formats de cellule en double
+    ou inutilisés : openpyxl les recopie tels quels dans styles.xml. Retourne le nombre de formats de cellule retirés.
+    Les styles nommés (cellStyleXfs) et les formats conditionnels ne sont pas modifiés.
+    """
+    tables = ("_fonts", "_fills", "_borders", "_protections", "_alignments")
+    old = {name: getattr(wb, name) for name in tables}
+    # Les premiers éléments (style par défaut, et les deux remplissages imposés par Excel) gardent leur index
+    new = {name: IndexedList(list(old[name][:2 if name == "_fills" else 1])) for name in tables}
+    old_formats, new_formats = wb._number_formats, IndexedList()
+    before = len(wb._cell_styles)
+    mapping: typing.Dict[tuple, tuple] = {}
+
+    def Remap(style: StyleArray) -> StyleArray:
+        key = tuple(style)
+        result = mapping.get(key)
+        if result is None:
+            font, fill, border, num_fmt, protection, alignment, pivot, quote, xf_id = key
+            if num_fmt >= BUILTIN_FORMATS_MAX_SIZE:
+                num_fmt = new_formats.add(old_formats[num_fmt - BUILTIN_FORMATS_MAX_SIZE]) + BUILTIN_FORMATS_MAX_SIZE
+            result = mapping[key] = (
+                new["_fonts"].add(old["_fonts"][font]),
+                new["_fills"].add(old["_fills"][fill]),
+                new["_borders"].add(old["_borders"][border]),
+                num_fmt,
+                new["_protections"].add(old["_protections"][protection]),
+                new["_alignments"].add(old["_alignments"][alignment]),
+                pivot, quote, xf_id,
+            )
+        return StyleArray(result)
+
+    for ws in wb.worksheets:
+        for cell in ws._cells.values():
+            if cell.has_style:
+                cell._style = Remap(cell._style)
+        for dims in (ws.row_dimensions, ws.column_dimensions):
+            for dim in dims.values():
+                if dim.has_style:
+                    dim._style = Remap(dim._style)
+
+    for name in tables:
+        setattr(wb, name, new[name])
+    wb._number_formats = new_formats
+    wb._cell_styles = IndexedList([StyleArray()] + [StyleArray(style) for style in dict.fromkeys(mapping.values()) if style != _EMPTY_STYLE])
+    _REGISTRIES.pop(wb, None)  # Index de polices périmés
+    return before - len(wb._cell_styles)
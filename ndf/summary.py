@@ -0,0 +1,64 @@
+# Feuille de synthèse masquée du classeur "Frais Sem" : totaux de chaque période calculés dans le classeur même,
+# le rapport n'y lit qu'une cellule par total et par période au lieu d'une référence externe par semaine
+import typing
+from openpyxl.workbook import Workbook
+from ndf.calendar import GRANULARITIES, Calendar_plan, Period_labels, Period_of
+from ndf.layout import REPORT_METRICS
+
+SUMMARY_SHEET = "Synthèse"
+_BLOCK_TITLES = {"monthly": "Mensuel", "bimonthly": "Bimestriel", "quarterly": "Trimestriel"}
+
+# Une colonne par total repris dans le rapport (B = M30, C = M28, ...), dans l'ordre de REPORT_METRICS
+SUMMARY_COLUMNS = {metric: chr(ord("B") + k) for k, (_, _, metric) in enumerate(REPORT_METRICS)}
+
+def _Block_rows() -> typing.Dict[str, int]:
+    """Première ligne de chaque bloc de périodes : ligne 1 en-têtes, puis pour chaque granularité
+    une ligne de titre, une ligne par période et une ligne vide (mensuel : lignes 3 à 14, bimestriel : 17 à 22...).
+    """
+    rows, row = {}, 2
+    for granularity in GRANULARITIES:
+        rows[granularity] = row + 1
+        row += len(Period_labels(granularity)) + 2
+    return rows
+
+SUMMARY_BLOCKS = _Block_rows()
+
+def Summary_cell(granularity : str, period : int, metric : str) -> str:
+    """Cellule de la feuille de synthèse du total `metric` ("M30"...) de la période (0 = celle qui commence en Mai)."""
+    return f"{SUMMARY_COLUMNS[metric]}{SUMMARY_BLOCKS[granularity] + period}"
+
+def Summary_rows(plan : Calendar_plan) -> typing.List[typing.List[typing.Any]]:
+    """Lignes de la feuille de synthèse (à partir de la ligne 1) :
+    mois = SUM des feuilles semaine du mois, bimestres et trimestres = SUM des lignes de mois (formules locales).
+    """
+    months: typing.List[typing.List[str]] = [[] for _ in range(12)]
+    for week in plan.weeks:
+        months[Period_of(week.month, "monthly")].append(week.title)
+
+    rows = [["Période"] + list(SUMMARY_COLUMNS)]
+    first_month = SUMMARY_BLOCKS["monthly"]
+    for granularity, size in GRANULARITIES.items():
+        rows.append([_BLOCK_TITLES.get(granularity, granularity)])
+        for i, label in enumerate(Period_labels(granularity)):
+            row = [label]
+            for metric, column in SUMMARY_COLUMNS.items():
+                if granularity == "monthly":
+                    titles = months[i]
+                    row.append("=SUM(" + ",".join(f"'{title}'!{metric}" for title in titles) + ")" if titles else 0)
+                else:
+                    start = first_month + i * size
+                    row.append(f"=SUM({column}{start}:{column}{start + size - 1})")
+            rows.append(row)
+        rows.append([])
+    return rows
+
+def Add_summary_sheet(wb : Workbook, plan : Calendar_plan) -> None:
+    """Ajoute en dernière position la feuille de synthèse masquée (remplace celle qui existe déjà).
+    Fonctionne aussi pour un classeur en écriture seule (Workbook(write_only=True)), ligne par ligne.
+    """
+    if not wb.write_only and SUMMARY_SHEET in wb.sheetnames:
+        wb.remove(wb[SUMMARY_SHEET])
+    ws = wb.create_sheet(SUMMARY_SHEET)
+    ws.sheet_state = "hidden"
+    for row in Summary_rows(plan):
+        ws.append(row)
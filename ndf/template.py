@@ -0,0 +1,425 @@
+# Feuille modèle "compilée" : analysée une seule fois, puis réémise pour chaque semaine
+import os
+import pickle
+import typing
+import hashlib
+import weakref
+import threading
+import collections
+import openpyxl
+from openpyxl.cell.cell import Cell
+from openpyxl.comments import Comment
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, Protection
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.styles.fills import Fill
+from openpyxl.styles.numbers import BUILTIN_FORMATS, BUILTIN_FORMATS_MAX_SIZE, BUILTIN_FORMATS_REVERSE
+from openpyxl.utils.cell import coordinate_to_tuple
+from openpyxl.worksheet.cell_range import MultiCellRange
+from openpyxl.worksheet.dimensions import ColumnDimension, RowDimension, SheetFormatProperties
+from openpyxl.worksheet.hyperlink import Hyperlink
+from openpyxl.worksheet.page import PageMargins, PrintOptions, PrintPageSetup
+from openpyxl.worksheet.properties import WorksheetProperties
+from openpyxl.worksheet.worksheet import Worksheet
+from openpyxl.worksheet._write_only import WriteOnlyWorksheet
+from openpyxl.workbook import Workbook
+from openpyxl.xml.functions import fromstring, tostring
+
+from ndf.styles import Registry_for
+from ndf.io import Atomic_write
+from ndf.trace import Span, Count
+
+CACHE_ENV = "NDF_CACHE_DIR"  # Dossier du cache des modèles compilés ; "0" désactive le cache
+CACHE_VERSION = 2            # À incrémenter si le contenu de Compiled_template / Compiled_workbook change
+
+# Style résolu : son contenu et non ses index dans les tables du classeur d'origine, en types simples (XML, texte, nombres)
+#   (police, remplissage, bordure, format de nombre, protection, alignement, pivotButton, quotePrefix, style nommé)
+Resolved_style = typing.Tuple[typing.Any, ...]
+
+_ROW_ATTRS = ("ht", "hidden", "outlineLevel", "collapsed", "thickBot", "thickTop")
+_COLUMN_ATTRS = ("width", "bestFit", "hidden", "outlineLevel", "collapsed", "min", "max")
+
+def _Xml(obj: typing.Any) -> typing.Optional[str]:
+    tree = obj.to_tree() if obj is not None else None
+    return None if tree is None else tostring(tree).decode("utf-8")
+
+def _From_xml(cls: typing.Any, xml: typing.Optional[str]) -> typing.Any:
+    return None if xml is None else cls.from_tree(fromstring(xml))
+
+class _Style_resolver:
+    """Traduit les StyleArray d'un classeur en styles résolus ; chaque style distinct n'est résolu qu'une fois
+    et partagé (le plan sérialisé ne le contient qu'une fois).
+    """
+
+    def __init__(self, wb: Workbook):
+        self.wb = wb
+        self.styles: typing.Dict[tuple, Resolved_style] = {}
+        self.named_styles: typing.Dict[str, tuple] = {}
+
+    def Resolve(self, style_array: typing.Optional[StyleArray]) -> typing.Optional[Resolved_style]:
+        if style_array is None:
+            return None
+        key = tuple(style_array)
+        resolved = self.styles.get(key)
+        if resolved is None:
+            wb = self.wb
+            font, fill, border, num_fmt, protection, alignment, pivot, quote, xf_id = key
+            if num_fmt >= BUILTIN_FORMATS_MAX_SIZE:
+                num_fmt = wb._number_formats[num_fmt - BUILTIN_FORMATS_MAX_SIZE]
+            else:
+                num_fmt = BUILTIN_FORMATS.get(num_fmt, num_fmt)  # Format intégré sans code connu : son numéro
+            named = wb._named_styles[xf_id]
+            if named.name not in self.named_styles:
+                self.named_styles[named.name] = (_Xml(named.font), _Xml(named.fill), _Xml(named.border), named.number_format,
+                                                 _Xml(named.protection), _Xml(named.alignment), named.builtinId, named.hidden)
+            resolved = self.styles[key] = (_Xml(wb._fonts[font]), _Xml(wb._fills[fill]), _Xml(wb._borders[border]), num_fmt,
+                                           _Xml(wb._protections[protection]), _Xml(wb._alignments[alignment]), pivot, quote, named.name)
+        return resolved
+
+class Compiled_template:
+    """Plan immuable (cellules, styles, fusions, dimensions, mise en page) d'une feuille modèle.
+
+    Remplace wb.copy_worksheet : le modèle n'est parcouru qu'une fois, chaque feuille
+    est ensuite émise directement à partir du plan et d'un petit dict de valeurs à modifier.
+    Le contenu produit est identique à copy_worksheet suivi des affectations de cellules.
+    Le plan ne garde aucune référence au classeur modèle : styles résolus en valeurs simples (Resolved_style),
+    mise en page en XML. Il est enregistré tel quel dans le cache disque, et les styles sont enregistrés
+    dans chaque classeur cible à la première feuille émise (une seule fois par style distinct).
+    """
+
+    def __init__(self, ws: Worksheet):
+        resolver = _Style_resolver(ws.parent)
+        resolve = resolver.Resolve
+
+        # (ligne, colonne, valeur, type, style) - les MergedCell deviennent des cellules vides comme dans copy_worksheet
+        cells = []
+        extras = []
+        for (row, col), cell in sorted(ws._cells.items()):
+            cells.append((row, col, cell._value, cell.data_type, resolve(cell._style) if cell.has_style else None))
+            if cell.hyperlink or cell.comment:
+                link, comment = cell.hyperlink, cell.comment
+                extras.append((row, col,
+                               (link.target, link.location, link.tooltip, link.display) if link else None,
+                               (comment.text, comment.author, comment.width, comment.height) if comment else None))
+        self.cells = tuple(cells)
+        self.extras = tuple(extras)
+
+        # (clé, attributs, style) : ligne -> _ROW_ATTRS, colonne -> _COLUMN_ATTRS
+        self.row_dimensions = tuple((key, tuple(getattr(dim, attr) for attr in _ROW_ATTRS), resolve(dim._style) if dim.has_style else None)
+                                    for key, dim in ws.row_dimensions.items())
+        self.column_dimensions = tuple((key, tuple(getattr(dim, attr) for attr in _COLUMN_ATTRS), resolve(dim._style) if dim.has_style else None)
+                                       for key, dim in ws.column_dimensions.items())
+        self.merged_cells = tuple(str(cr) for cr in ws.merged_cells.ranges)
+        self.sheet_format = _Xml(ws.sheet_format)
+        self.sheet_properties = _Xml(ws.sheet_properties)
+        self.page_margins = _Xml(ws.page_margins)
+        self.page_setup = _Xml(ws.page_setup)
+        self.print_options = _Xml(ws.print_options)
+        self.named_styles = resolver.named_styles
+        self._Init_runtime()
+
+    def _Init_runtime(self) -> None:
+        self._bindings = weakref.WeakKeyDictionary()  # {classeur cible: {style résolu: index StyleArray}}
+        self._layout_hash = None
+
+    def __getstate__(self) -> typing.Dict[str, typing.Any]:
+        state = self.__dict__.copy()
+        del state["_bindings"], state["_layout_hash"]  # Propres aux classeurs de ce processus
+        return state
+
+    def __setstate__(self, state: typing.Dict[str, typing.Any]) -> None:
+        self.__dict__.update(state)
+        self._Init_runtime()
+
+    def _Styles(self) -> typing.List[Resolved_style]:
+        """Styles distincts du plan, dans l'ordre d'apparition (index stables et petits dans le classeur cible)."""
+        styles = dict.fromkeys(style for *_, style in self.cells if style is not None)
+        for dims in (self.row_dimensions, self.column_dimensions):
+            styles.update(dict.fromkeys(style for *_, style in dims if style is not None))
+        return list(styles)
+
+    def Layout_hash(self) -> str:
+        """Empreinte du plan : valeurs, styles (par leur contenu), fusions, dimensions et mise en page.
+        Contrairement à Hash_file, un modèle réenregistré sans changement (propriétés du document,
+        tables de styles renumérotées) garde la même empreinte.
+        """
+        if self._layout_hash is None:
+            parts = [self.cells, self.row_dimensions, self.column_dimensions, self.merged_cells,
+                     self.sheet_format, self.page_margins, self.page_setup, self.print_options]
+            self._layout_hash = hashlib.sha256(repr(parts).encode()).hexdigest()
+        return self._layout_hash
+
+    def _Named_style_index(self, wb: Workbook, name: str) -> int:
+        if name not in wb.named_styles:
+            font, fill, border, number_format, protection, alignment, builtin_id, hidden = self.named_styles[name]
+            wb.add_named_style(NamedStyle(name, _From_xml(Font, font), _From_xml(Fill, fill), _From_xml(Border, border),
+                                          _From_xml(Alignment, alignment), number_format, _From_xml(Protection, protection),
+                                          builtin_id, hidden))
+        return wb.named_styles.index(name)
+
+    def _Style_map(self, wb: Workbook) -> typing.Dict[Resolved_style, tuple]:
+        """Correspondance des styles du plan vers les index du classeur cible, enregistrés à la première émission."""
+        mapping = self._bindings.get(wb)
+        if mapping is None:
+            mapping = {}
+            for style in self._Styles():
+                font, fill, border, num_fmt, protection, alignment, pivot, quote, named = style
+                if isinstance(num_fmt, str):
+                    builtin = BUILTIN_FORMATS_REVERSE.get(num_fmt)
+                    num_fmt = builtin if builtin is not None else wb._number_formats.add(num_fmt) + BUILTIN_FORMATS_MAX_SIZE
+                mapping[style] = (
+                    wb._fonts.add(_From_xml(Font, font)),
+                    wb._fills.add(_From_xml(Fill, fill)),
+                    wb._borders.add(_From_xml(Border, border)),
+                    num_fmt,
+                    wb._protections.add(_From_xml(Protection, protection)),
+                    wb._alignments.add(_From_xml(Alignment, alignment)),
+                    pivot,
+                    quote,
+                    self._Named_style_index(wb, named),
+                )
+                wb._cell_styles.add(StyleArray(mapping[style]))  # Index cellXfs dans l'ordre du modèle
+            self._bindings[wb] = mapping
+        return mapping
+
+    def _Apply_layout(self, ws: typing.Union[Worksheet, WriteOnlyWorksheet], mapping: typing.Dict[Resolved_style, tuple]) -> None:
+        """Dimensions, fusions et mise en page du modèle."""
+        for key, attrs, style in self.row_dimensions:
+            dim = RowDimension(ws, index=key, **dict(zip(_ROW_ATTRS, attrs)))
+            if style is not None:
+                dim._style = StyleArray(mapping[style])
+            ws.row_dimensions[key] = dim
+        for key, attrs, style in self.column_dimensions:
+            dim = ColumnDimension(ws, index=key, **dict(zip(_COLUMN_ATTRS, attrs)))
+            if style is not None:
+                dim._style = StyleArray(mapping[style])
+            ws.column_dimensions[key] = dim
+
+        ws.sheet_format = _From_xml(SheetFormatProperties, self.sheet_format)
+        ws.sheet_properties = _From_xml(WorksheetProperties, self.sheet_properties)
+        ws.merged_cells = MultiCellRange(self.merged_cells)
+        ws.page_margins = _From_xml(PageMargins, self.page_margins)
+        ws.page_setup = _From_xml(PrintPageSetup, self.page_setup)
+        ws.print_options = _From_xml(PrintOptions, self.print_options)
+
+    @staticmethod
+    def _Apply_extras(cell: Cell, hyperlink: typing.Optional[tuple], comment: typing.Optional[tuple]) -> None:
+        """Lien hypertexte (cible, emplacement, info-bulle, texte) et commentaire (texte, auteur, largeur, hauteur) du modèle."""
+        if hyperlink:
+            target, location, tooltip, display = hyperlink
+            cell._hyperlink = Hyperlink(ref=cell.coordinate, target=target, location=location, tooltip=tooltip, display=display)
+        if comment:
+            text, author, width, height = comment
+            cell.comment = Comment(text, author, height=height, width=width)
+
+    def Emit(self, wb: Workbook, title: str,
+             values: typing.Optional[typing.Dict[str, typing.Any]] = None,
+             fonts: typing.Optional[typing.Dict[str, typing.Any]] = None,
+             index: typing.Optional[int] = None) -> Worksheet:
+        """Crée la feuille `title` dans wb (à la position index, à la fin par défaut) à partir du plan,
+        puis applique values {"K1": 18, ...} et fonts {"O3": "month_label", ...} (polices de ndf.styles.NAMED_FONTS).
+        """
+        mapping = self._Style_map(wb)
+        ws = wb.create_sheet(title, index)
+        cells = ws._cells
+        new = Cell.__new__
+
+        # Construction directe des cellules (évite cell(), la validation et les StyleArray vides)
+        for row, col, value, data_type, style in self.cells:
+            cell = new(Cell)
+            cell.parent = ws
+            cell.row = row
+            cell.column = col
+            cell._value = value
+            cell.data_type = data_type
+            cell._style = None if style is None else StyleArray(mapping[style])
+            cell._hyperlink = None
+            cell._comment = None
+            cells[(row, col)] = cell
+        if self.cells:
+            # Comme ws._add_cell : iter_rows(), rows et append() partent de la dernière ligne écrite
+            ws._current_row = max(ws._current_row, self.cells[-1][0])
+
+        for row, col, hyperlink, comment in self.extras:
+            self._Apply_extras(cells[(row, col)], hyperlink, comment)
+
+        self._Apply_layout(ws, mapping)
+
+        if values:
+            for coord, value in values.items():
+                ws.cell(*coordinate_to_tuple(coord)).value = value
+        if fonts:
+            registry = Registry_for(wb)
+            for coord, name in fonts.items():
+                registry.Apply_font(ws.cell(*coordinate_to_tuple(coord)), name)
+
+        return ws
+
+    def Stream(self, wb: Workbook, title: str,
+               values: typing.Optional[typing.Dict[str, typing.Any]] = None,
+               fonts: typing.Optional[typing.Dict[str, typing.Any]] = None) -> WriteOnlyWorksheet:
+        """Équivalent de Emit pour un classeur Workbook(write_only=True) : la feuille est écrite ligne par ligne
+        dans le fichier temporaire d'openpyxl puis fermée aussitôt, seule la feuille en cours occupe la mémoire.
+        """
+        mapping = self._Style_map(wb)
+        ws = wb.create_sheet(title)
+        self._Apply_layout(ws, mapping)  # Avant la première ligne : colonnes et format sont écrits en tête de feuille
+
+        registry = Registry_for(wb)
+        overrides = {coordinate_to_tuple(coord): value for coord, value in (values or {}).items()}
+        font_overrides = {coordinate_to_tuple(coord): font for coord, font in (fonts or {}).items()}
+        extras = {(row, col): (hyperlink, comment) for row, col, hyperlink, comment in self.extras}
+        rows = collections.defaultdict(dict)
+        for row, col, value, data_type, style in self.cells:
+            rows[row][col] = (value, data_type, style)
+        for row, col in overrides.keys() | font_overrides.keys():
+            rows[row].setdefault(col, (None, "n", None))
+
+        new = Cell.__new__
+        last_row = max(list(rows) + [key for key, *_ in self.row_dimensions if isinstance(key, int)] + [0])
+        for r in range(1, last_row + 1):
+            line = []
+            for col, (value, data_type, style) in sorted(rows.get(r, {}).items()):
+                cell = new(Cell)
+                cell.parent = ws
+                cell.row = r
+                cell.column = col
+                cell._value = value
+                cell.data_type = data_type
+                cell._style = None if style is None else StyleArray(mapping[style])
+                cell._hyperlink = None
+                cell._comment = None
+                key = (r, col)
+                if key in overrides:
+                    cell.value = overrides[key]
+                if key in font_overrides:
+                    registry.Apply_font(cell, font_overrides[key])
+                if key in extras:
+                    self._Apply_extras(cell, *extras[key])
+                line.extend([None] * (col - len(line) - 1))
+                line.append(cell)
+            ws.append(line)  # Ligne vide : seulement sa hauteur / son style éventuels
+
+        ws.close()
+        return ws
+
+def Hash_file(path : str) -> str:
+    """Empreinte SHA-256 du contenu d'un fichier (modèle)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class Compiled_workbook:
+    """Classeur modèle compilé : une Compiled_template par feuille, plus le thème du classeur.
+    Permet de créer autant de classeurs neufs que nécessaire sans relire le fichier modèle.
+    Seuls les plans sont gardés (et mis en cache sur disque), pas le classeur openpyxl chargé.
+    """
+
+    def __init__(self, path: str, file_hash: typing.Optional[str] = None):
+        self.path = path
+        self.file_hash = file_hash or Hash_file(path)
+        wb = openpyxl.load_workbook(path)
+        self.sheets = [Compiled_template(ws) for ws in wb.worksheets]
+        self.titles = [ws.title for ws in wb.worksheets]
+        self.active = wb.worksheets.index(wb.active)
+        self.theme = wb.loaded_theme
+
+    @property
+    def active_sheet(self) -> Compiled_template:
+        return self.sheets[self.active]
+
+    def New_workbook(self, with_sheets: bool = True, write_only: bool = False) -> Workbook:
+        """Classeur neuf reprenant le thème du modèle, avec (ou sans) les feuilles du modèle.
+        write_only=True : classeur en écriture seule, toujours sans feuilles (voir Compiled_template.Stream).
+        """
+        wb = Workbook(write_only=write_only)
+        if not write_only:
+            wb.remove(wb.active)
+        wb.loaded_theme = self.theme
+        if with_sheets and not write_only:
+            for title, sheet in zip(self.titles, self.sheets):
+                sheet.Emit(wb, title)
+            wb.active = self.active
+        return wb
+
+def Cache_dir() -> typing.Optional[str]:
+    """Dossier du cache disque des modèles compilés (None : cache désactivé).
+    NDF_CACHE_DIR, sinon %LOCALAPPDATA%\\ndf (Windows) ou ~/.cache/ndf.
+    """
+    path = os.environ.get(CACHE_ENV, "").strip()
+    if path.lower() in ("0", "false", "non", "no"):
+        return None
+    if not path:
+        base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        path = os.path.join(base, "ndf")
+    return path
+
+def Load_compiled_workbook(path: str, cache_dir: typing.Optional[str] = "") -> Compiled_workbook:
+    """Modèle compilé de `path`, relu depuis le cache disque si ce contenu de fichier a déjà été compilé.
+
+    La clé est l'empreinte SHA-256 du fichier (un modèle modifié ou remplacé est recompilé), avec la version
+    d'openpyxl et CACHE_VERSION. Relire le plan sérialisé évite load_workbook et la compilation.
+    cache_dir="" : dossier par défaut (Cache_dir), None : pas de cache. Le cache est local à
+    l'utilisateur : ne pas le placer dans un dossier partagé modifiable par d'autres (fichiers pickle).
+    """
+    file_hash = Hash_file(path)
+    cache_dir = Cache_dir() if cache_dir == "" else cache_dir
+    cache_file = None
+    if cache_dir:
+        cache_file = os.path.join(cache_dir, f"template_{file_hash[:32]}_openpyxl{openpyxl.__version__}_v{CACHE_VERSION}.pickle")
+
+    with Span("load_template", file=os.path.basename(path)) as span:
+        if cache_file is not None and os.path.exists(cache_file):
+            try:
+                with open(cache_file, "rb") as f:
+                    template = pickle.load(f)
+                template.path = path
+                span.Set(cache="hit")
+                Count("template_cache_hits")
+                return template
+            except Exception as e:  # Fichier tronqué ou illisible : on recompile et on le remplace
+                print(f"⚠️  Cache du modèle ignoré ({type(e).__name__}: {e})")
+
+        template = Compiled_workbook(path, file_hash)
+        span.Set(cache="miss" if cache_file else "off")
+        if cache_file is not None:
+            try:
+                with Atomic_write(cache_file) as tmp_path, open(tmp_path, "wb") as f:
+                    pickle.dump(template, f, protocol=pickle.HIGHEST_PROTOCOL)
+            except OSError as e:
+                print(f"⚠️  Cache du modèle non écrit ({e})")
+    return template
+
+class Template_cache:
+    """Cache LRU des modèles compilés, clé (chemin, date de modification, taille) : un modèle modifié est recompilé."""
+
+    def __init__(self, max_entries: int = 8):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def Get(self, path: str) -> Compiled_workbook:
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            template = self.entries.get(key)
+            if template is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return template
+            self.misses += 1
+
+        template = Load_compiled_workbook(path)
+        with self._lock:
+            self.entries[key] = template
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return template
+
+    def Stats(self) -> typing.Dict[str, typing.Any]:
+        with self._lock:
+            return {"entries": [key[0] for key in self.entries], "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,160 @@
+# Mesure par phase (chargement, copie des feuilles, écriture des cellules, formules, sauvegarde) des programmes NDF
+#
+# Désactivé par défaut : Span() renvoie alors un objet vide partagé et Count() ne fait rien.
+# Activation : option --profile des programmes, ou variable d'environnement NDF_PROFILE
+#   NDF_PROFILE=1           -> trace JSON dans le dossier courant
+#   NDF_PROFILE=<dossier>   -> trace JSON dans ce dossier
+#   NDF_PROFILE_CPROFILE=1  -> en plus, profil cProfile (.prof, lisible par pstats / snakeviz)
+# La trace est au format "Trace Event" (chrome://tracing, https://ui.perfetto.dev, speedscope) :
+# les phases imbriquées s'y affichent en flamegraph.
+import os
+import sys
+import json
+import time
+import atexit
+import typing
+import threading
+import collections
+
+PROFILE_ENV = "NDF_PROFILE"
+CPROFILE_ENV = "NDF_PROFILE_CPROFILE"
+
+_ENABLED = False
+_T0 = time.perf_counter_ns()
+_EVENTS: typing.List[typing.Dict[str, typing.Any]] = []
+_COUNTERS: typing.Dict[str, int] = collections.Counter()
+_OUTPUT_DIR = "."
+_PROFILER = None
+
+class _Span:
+    """Phase chronométrée ; Set() ajoute des attributs (nombre de feuilles, octets...) visibles dans la trace."""
+    __slots__ = ("name", "attrs", "start")
+
+    def __init__(self, name: str, attrs: typing.Dict[str, typing.Any]):
+        self.name = name
+        self.attrs = attrs
+
+    def Set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        _EVENTS.append({
+            "name": self.name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+            "ts": (self.start - _T0) / 1000, "dur": (end - self.start) / 1000, "args": self.attrs,
+        })
+
+class _Null_span:
+    __slots__ = ()
+
+    def Set(self, **attrs) -> None:
+        pass
+
+    def __enter__(self) -> "_Null_span":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+_NULL_SPAN = _Null_span()
+
+def Span(name: str, **attrs) -> typing.Union[_Span, _Null_span]:
+    """with Span("load_workbook", file=...) as span: ... ; sans effet si la mesure est désactivée."""
+    return _Span(name, attrs) if _ENABLED else _NULL_SPAN
+
+def Count(name: str, n: int = 1) -> None:
+    """Ajoute n au compteur `name` (feuilles, cellules écrites, octets sauvegardés...)."""
+    if _ENABLED:
+        _COUNTERS[name] += n
+
+def Enable(output_dir: typing.Optional[str] = None, cprofile: bool = False) -> None:
+    """Active la mesure pour ce processus ; la trace est écrite à la sortie du programme (ou par Flush)."""
+    global _ENABLED, _OUTPUT_DIR, _PROFILER
+    if output_dir:
+        _OUTPUT_DIR = output_dir
+    if cprofile and _PROFILER is None:
+        import cProfile
+        _PROFILER = cProfile.Profile()
+        _PROFILER.enable()
+    if not _ENABLED:
+        _ENABLED = True
+        atexit.register(Flush)
+    # Les sous-processus (NDF_batch, NDF_server) héritent de l'activation
+    os.environ[PROFILE_ENV] = os.path.abspath(_OUTPUT_DIR)
+    if cprofile:
+        os.environ[CPROFILE_ENV] = "1"
+
+def Trace_file(suffix: str = ".json") -> str:
+    script = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0] or "python"
+    return os.path.join(_OUTPUT_DIR, f"NDF_trace_{script}_{os.getpid()}{suffix}")
+
+def Summary() -> typing.List[typing.Tuple[str, int, float]]:
+    """(phase, nombre d'appels, durée totale en ms) par durée décroissante."""
+    totals = collections.defaultdict(lambda: [0, 0.0])
+    for event in _EVENTS:
+        if event["ph"] == "X" and event["pid"] == os.getpid():
+            totals[event["name"]][0] += 1
+            totals[event["name"]][1] += event["dur"] / 1000
+    return sorted(((name, n, ms) for name, (n, ms) in totals.items()), key=lambda t: -t[2])
+
+def Flush(verbose: bool = True) -> typing.Optional[str]:
+    """Écrit (ou réécrit) la trace JSON de ce processus et le profil cProfile éventuel. Retourne le chemin de la trace.
+    À appeler explicitement dans les processus de travail, où les fonctions atexit ne sont pas exécutées.
+    verbose=False n'affiche pas le résumé des phases.
+    """
+    if not _ENABLED:
+        return None
+    os.makedirs(_OUTPUT_DIR, exist_ok=True)
+    now = (time.perf_counter_ns() - _T0) / 1000
+    events = [e for e in _EVENTS if e["pid"] == os.getpid()]
+    events += [{"name": name, "ph": "C", "pid": os.getpid(), "tid": 0, "ts": now, "args": {name: value}}
+               for name, value in _COUNTERS.items()]
+    path = Trace_file()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"argv": sys.argv, "pid": os.getpid(), "counters": dict(_COUNTERS)},
+        }, f, ensure_ascii=False)
+
+    if _PROFILER is not None:
+        _PROFILER.dump_stats(Trace_file(".prof"))  # Arrête le profileur : on le relance pour la suite
+        _PROFILER.enable()
+
+    if not verbose:
+        return path
+    print(f"\n⏱️  Trace écrite : {path}", file=sys.stderr)
+    for name, n, ms in Summary()[:10]:
+        print(f"   {name:<28} {n:>5} x {ms:10.1f} ms", file=sys.stderr)
+    if _COUNTERS:
+        print("   " + ", ".join(f"{name}={value}" for name, value in _COUNTERS.items()), file=sys.stderr)
+    return path
+
+def Setup_from_argv(argv: typing.Optional[typing.List[str]] = None) -> bool:
+    """Retire --profile[=dossier] et --profile-cprofile de argv (programmes à saisie interactive) et active la mesure."""
+    argv = sys.argv if argv is None else argv
+    enabled, cprofile, output_dir = False, False, None
+    for arg in list(argv[1:]):
+        if arg == "--profile" or arg.startswith("--profile="):
+            enabled = True
+            output_dir = arg.partition("=")[2] or None
+            argv.remove(arg)
+        elif arg == "--profile-cprofile":
+            enabled = cprofile = True
+            argv.remove(arg)
+    if enabled:
+        Enable(output_dir, cprofile)
+    return enabled
+
+def _Setup_from_env() -> None:
+    value = os.environ.get(PROFILE_ENV, "").strip()
+    if value and value.lower() not in ("0", "false", "non", "no"):
+        Enable(None if value.lower() in ("1", "true", "oui", "yes") else value, os.environ.get(CPROFILE_ENV) == "1")
+
+_Setup_from_env()
@@ -0,0 +1,296 @@
+# Accès direct au zip .xlsx : localisation des feuilles et modification ciblée de cellules sans openpyxl
+import os
+import re
+import zlib
+import struct
+import typing
+import zipfile
+import posixpath
+import threading
+import collections
+from xml.sax.saxutils import escape
+from ndf.layout import Split_coordinate, Column_index
+from ndf.io import Workbook_lock, Atomic_write
+from ndf.trace import Span, Count
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+_SHEET_RE = re.compile(r'<(?:\w+:)?sheet\b([^>]*?)/?>')
+_REL_RE = re.compile(r'<(?:\w+:)?Relationship\b([^>]*?)/?>')
+_ATTR_RE = re.compile(r'([\w:]+)\s*=\s*"([^"]*)"')
+_SHEET_DATA_RE = re.compile(r'<sheetData\s*/>|<sheetData>(.*?)</sheetData>', re.S)
+_ROW_RE = re.compile(r'<row\b([^>]*?)(?:/>|>(.*?)</row>)', re.S)
+_CELL_RE = re.compile(r'<c\b([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+_FORMULA_RE = re.compile(r'<f\b[^>]*?(?:/>|>.*?</f>)', re.S)
+_CALC_PR_RE = re.compile(r'<calcPr\b([^>]*?)/?>')
+_AFTER_CALC_PR_RE = re.compile(r'<(?:oleSize|customWorkbookViews|pivotCaches|smartTagPr|smartTagTypes|webPublishing|fileRecoveryPr|webPublishObjects|extLst)\b|</workbook>')
+
+def _Attributes(text: str) -> typing.Dict[str, str]:
+    return dict(_ATTR_RE.findall(text))
+
+def _Unescape(value: str) -> str:
+    return (value.replace("&lt;", "<").replace("&gt;", ">").replace("&quot;", '"')
+                 .replace("&apos;", "'").replace("&amp;", "&"))
+
+def Read_sheet_parts(archive: zipfile.ZipFile) -> typing.Dict[str, str]:
+    """Retourne {titre de feuille: chemin de la partie XML dans le zip}, dans l'ordre du classeur,
+    d'après xl/workbook.xml et xl/_rels/workbook.xml.rels.
+    """
+    workbook = archive.read("xl/workbook.xml").decode("utf-8")
+    rels = archive.read("xl/_rels/workbook.xml.rels").decode("utf-8")
+
+    targets = {}
+    for match in _REL_RE.finditer(rels):
+        attrs = _Attributes(match.group(1))
+        target = attrs.get("Target", "")
+        # Cible absolue (/xl/worksheets/sheet1.xml, openpyxl) ou relative à xl/ (worksheets/sheet1.xml, Excel)
+        targets[attrs.get("Id")] = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+
+    parts = {}
+    for match in _SHEET_RE.finditer(workbook):
+        attrs = _Attributes(match.group(1))
+        rid = next((v for k, v in attrs.items() if k.endswith(":id")), None)
+        if rid in targets:
+            parts[_Unescape(attrs["name"])] = targets[rid]
+    return parts
+
+# Métadonnées relues seulement si le fichier a changé : (chemin, mtime, taille, inode) -> résultat.
+# Les écritures NDF remplacent le fichier (os.replace) : l'inode change même si mtime et taille sont identiques.
+_METADATA_CACHE_SIZE = 64
+_METADATA_CACHE: "collections.OrderedDict[tuple, typing.Any]" = collections.OrderedDict()
+_METADATA_LOCK = threading.Lock()
+
+def _Cached(path: str, key: tuple, compute: typing.Callable[[], typing.Any]) -> typing.Any:
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, stat.st_ino) + key
+    with _METADATA_LOCK:
+        if key in _METADATA_CACHE:
+            _METADATA_CACHE.move_to_end(key)
+            Count("metadata_cache_hits")
+            return _METADATA_CACHE[key]
+    result = compute()
+    with _METADATA_LOCK:
+        _METADATA_CACHE[key] = result
+        while len(_METADATA_CACHE) > _METADATA_CACHE_SIZE:
+            _METADATA_CACHE.popitem(last=False)
+    return result
+
+def Sheet_names(file_path: str) -> typing.List[str]:
+    """Noms des feuilles dans l'ordre du classeur (xl/workbook.xml seul), mis en cache tant que le fichier ne change pas."""
+    def read() -> typing.Tuple[str, ...]:
+        with Span("read_sheet_names", file=os.path.basename(file_path)), zipfile.ZipFile(file_path) as archive:
+            return tuple(Read_sheet_parts(archive))
+    return list(_Cached(file_path, ("sheets",), read))
+
+def _Cell_xml(ref: str, attrs: typing.Dict[str, str], value: typing.Any, body: str = "", keep_formula: bool = False) -> str:
+    """Sérialise une cellule comme openpyxl (style conservé, formule et ancienne valeur supprimées).
+    keep_formula=True conserve la formule <f> existante et écrit value comme valeur en cache.
+    """
+    style = f' s="{attrs["s"]}"' if "s" in attrs else ""
+    formula = _FORMULA_RE.search(body or "") if keep_formula else None
+    if formula is not None:
+        if value is None:
+            return f'<c r="{ref}"{style}>{formula.group(0)}</c>'
+        if isinstance(value, bool):
+            return f'<c r="{ref}"{style} t="b">{formula.group(0)}<v>{int(value)}</v></c>'
+        if isinstance(value, (int, float)):
+            return f'<c r="{ref}"{style}>{formula.group(0)}<v>{value:.16g}</v></c>'
+        return f'<c r="{ref}"{style} t="str">{formula.group(0)}<v>{escape(str(value))}</v></c>'
+    if value is None:
+        return f'<c r="{ref}"{style}/>'
+    if isinstance(value, bool):
+        return f'<c r="{ref}"{style} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, int):
+        return f'<c r="{ref}"{style} t="n"><v>{value}</v></c>'
+    if isinstance(value, float):
+        return f'<c r="{ref}"{style} t="n"><v>{value:.16g}</v></c>'
+    return f'<c r="{ref}"{style} t="inlineStr"><is><t>{escape(str(value))}</t></is></c>'
+
+def _Patch_row(row_number: int, row_attrs: str, body: str, cells: typing.Dict[int, typing.Tuple[str, typing.Any]], keep_formulas: bool = False) -> str:
+    """Réécrit une ligne <row> en remplaçant / insérant les cellules {colonne: (ref, valeur)} dans l'ordre des colonnes."""
+    out = []
+    pending = sorted(cells.items())
+    for match in _CELL_RE.finditer(body or ""):
+        attrs = _Attributes(match.group(1))
+        if "r" not in attrs:
+            raise ValueError(f"Cellule sans référence dans la ligne {row_number}")
+        column = Column_index(Split_coordinate(attrs["r"])[0])
+        while pending and pending[0][0] < column:
+            _, (ref, value) = pending.pop(0)
+            out.append(_Cell_xml(ref, {}, value))
+        if pending and pending[0][0] == column:
+            _, (ref, value) = pending.pop(0)
+            out.append(_Cell_xml(ref, attrs, value, match.group(2), keep_formulas))
+        else:
+            out.append(match.group(0))
+    for _, (ref, value) in pending:
+        out.append(_Cell_xml(ref, {}, value))
+    return f'<row{row_attrs}>{"".join(out)}</row>'
+
+def Patch_sheet_xml(xml: str, values: typing.Dict[str, typing.Any], keep_formulas: bool = False) -> str:
+    """Modifie les cellules {"I12": 21.0, ...} d'une partie XML de feuille, le reste du texte est conservé tel quel.
+    keep_formulas=True : les cellules à formule gardent leur formule, la valeur devient leur valeur en cache.
+    """
+    rows = {}
+    for coord, value in values.items():
+        column, row = Split_coordinate(coord)
+        rows.setdefault(row, {})[Column_index(column)] = (f"{column}{row}", value)
+
+    data = _SHEET_DATA_RE.search(xml)
+    if data is None:
+        raise ValueError("Partie de feuille sans <sheetData>")
+
+    out = []
+    pending = sorted(rows.items())
+    for match in _ROW_RE.finditer(data.group(1) or ""):
+        attrs = _Attributes(match.group(1))
+        if "r" not in attrs:
+            raise ValueError("Ligne sans numéro dans <sheetData>")
+        row_number = int(attrs["r"])
+        while pending and pending[0][0] < row_number:
+            number, cells = pending.pop(0)
+            out.append(_Patch_row(number, f' r="{number}"', "", cells))
+        if pending and pending[0][0] == row_number:
+            _, cells = pending.pop(0)
+            out.append(_Patch_row(row_number, match.group(1).rstrip(), match.group(2), cells, keep_formulas))
+        else:
+            out.append(match.group(0))
+    for number, cells in pending:
+        out.append(_Patch_row(number, f' r="{number}"', "", cells))
+
+    return f'{xml[:data.start()]}<sheetData>{"".join(out)}</sheetData>{xml[data.end():]}'
+
+def _Set_full_calc(workbook_xml: str, enabled: bool = True) -> str:
+    """enabled=True : demande à Excel de recalculer au chargement (les valeurs en cache ne sont plus à jour).
+    enabled=False : Excel affiche directement les valeurs en cache à l'ouverture.
+    """
+    match = _CALC_PR_RE.search(workbook_xml)
+    if match is None:
+        if not enabled:
+            return workbook_xml
+        anchor = _AFTER_CALC_PR_RE.search(workbook_xml)
+        return f'{workbook_xml[:anchor.start()]}<calcPr fullCalcOnLoad="1"/>{workbook_xml[anchor.start():]}'
+    attrs = re.sub(r'\s*fullCalcOnLoad="[^"]*"', "", match.group(1).rstrip())
+    flag = ' fullCalcOnLoad="1"' if enabled else ""
+    return f'{workbook_xml[:match.start()]}<calcPr{attrs}{flag}/>{workbook_xml[match.end():]}'
+
+# Enregistrements du format zip (APPNOTE) : en-tête local, entrée du répertoire central, fin du répertoire central
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")   # signature, version, drapeaux, méthode, heure, date, crc, tailles, longueurs
+_CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")
+_END_RECORD = struct.Struct("<4s4H2LH")
+_DATA_DESCRIPTOR = b"PK\x07\x08"
+_ZIP32_LIMIT = 0xFFFFFFFF
+_COPY_CHUNK = 1024 * 1024
+
+class _Zip_entry(typing.NamedTuple):
+    """Membre écrit dans le zip de sortie : champs de son entrée du répertoire central."""
+    info: zipfile.ZipInfo
+    version: int
+    flags: int
+    method: int
+    time: int
+    date: int
+    crc: int
+    compress_size: int
+    file_size: int
+    name: bytes
+    extra: bytes            # Champ extra du répertoire central
+    offset: int
+
+def _Local_header(src: typing.BinaryIO, info: zipfile.ZipInfo) -> typing.Tuple[tuple, bytes, bytes]:
+    """En-tête local du membre dans le zip source : (champs, nom brut, champ extra)."""
+    if info.flag_bits & 0x1:
+        raise ValueError(f"Membre chiffré : {info.filename}")
+    if max(info.header_offset, info.compress_size, info.file_size) >= _ZIP32_LIMIT:
+        raise ValueError(f"Membre zip64 non pris en charge : {info.filename}")
+    src.seek(info.header_offset)
+    fields = _LOCAL_HEADER.unpack(src.read(_LOCAL_HEADER.size))
+    if fields[0] != b"PK\x03\x04":
+        raise ValueError(f"En-tête local invalide : {info.filename}")
+    name = src.read(fields[9])
+    return fields, name, src.read(fields[10])
+
+def _Copy_member(src: typing.BinaryIO, info: zipfile.ZipInfo, dst: typing.BinaryIO) -> _Zip_entry:
+    """Recopie le membre tel quel (en-tête, données compressées, descripteur) : ni décompression, ni recompression."""
+    fields, name, extra = _Local_header(src, info)
+    offset = dst.tell()
+    dst.write(_LOCAL_HEADER.pack(*fields) + name + extra)
+    remaining = info.compress_size
+    while remaining:
+        chunk = src.read(min(remaining, _COPY_CHUNK))
+        if not chunk:
+            raise ValueError(f"Membre tronqué : {info.filename}")
+        dst.write(chunk)
+        remaining -= len(chunk)
+    if fields[2] & 0x08:  # Descripteur après les données (crc et tailles), avec ou sans signature
+        descriptor = src.read(4)
+        dst.write(descriptor + src.read(12 if descriptor == _DATA_DESCRIPTOR else 8))
+    _, version, flags, method, time, date = fields[:6]
+    return _Zip_entry(info, version, flags, method, time, date, info.CRC, info.compress_size, info.file_size, name, info.extra, offset)
+
+def _Write_member(src: typing.BinaryIO, info: zipfile.ZipInfo, data: bytes, dst: typing.BinaryIO) -> _Zip_entry:
+    """Écrit le nouveau contenu du membre, compressé (deflate), avec le nom et la date de l'original."""
+    fields, name, _ = _Local_header(src, info)
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    entry = _Zip_entry(info, 20, fields[2] & 0x800, zipfile.ZIP_DEFLATED, fields[4], fields[5],
+                       zlib.crc32(data), len(compressed), len(data), name, b"", dst.tell())
+    dst.write(_LOCAL_HEADER.pack(b"PK\x03\x04", entry.version, entry.flags, entry.method, entry.time, entry.date,
+                                 entry.crc, entry.compress_size, entry.file_size, len(name), 0) + name)
+    dst.write(compressed)
+    Count("zip_members_recompressed")
+    return entry
+
+def _Write_central_directory(dst: typing.BinaryIO, entries: typing.List[_Zip_entry]) -> None:
+    start = dst.tell()
+    for entry in entries:
+        info = entry.info
+        comment = info.comment
+        dst.write(_CENTRAL_HEADER.pack(b"PK\x01\x02", info.create_system << 8 | max(info.create_version, entry.version),
+                                       entry.version, entry.flags, entry.method, entry.time, entry.date, entry.crc,
+                                       entry.compress_size, entry.file_size, len(entry.name), len(entry.extra), len(comment),
+                                       0, info.internal_attr, info.external_attr, entry.offset))
+        dst.write(entry.name + entry.extra + comment)
+    end = dst.tell()
+    if end >= _ZIP32_LIMIT or len(entries) > 0xFFFF:
+        raise ValueError("Classeur trop grand pour un zip sans zip64")
+    dst.write(_END_RECORD.pack(b"PK\x05\x06", 0, 0, len(entries), len(entries), end - start, start, 0))
+
+def Patch_workbook_cells(file_path: str, patches: typing.Dict[str, typing.Dict[str, typing.Any]],
+                         output_file: typing.Optional[str] = None, keep_formulas: bool = False) -> typing.List[str]:
+    """Modifie les cellules {titre de feuille: {coordonnée: valeur}} directement dans le zip.
+
+    Seules les parties XML des feuilles concernées (et xl/workbook.xml) sont décompressées, modifiées et
+    recompressées ; les autres membres du zip sont recopiés octet pour octet, données compressées comprises
+    (_Copy_member) : le calcul dépend du nombre de feuilles modifiées, pas de la taille du classeur. Le fichier est écrit à côté puis remplacé
+    atomiquement, sous le verrou du classeur (ndf.io).
+    keep_formulas=True écrit des valeurs en cache dans les cellules à formule (voir Patch_sheet_xml)
+    et Excel n'a plus besoin de recalculer à l'ouverture.
+    Retourne la liste des feuilles modifiées (les titres absents du classeur sont ignorés).
+    """
+    output_file = output_file or file_path
+
+    # Verrou tenu de la lecture au remplacement : un autre programme ne peut pas modifier le fichier entre les deux.
+    # Le zip source est fermé avant le remplacement (obligatoire sous Windows).
+    with Span("zip_patch", sheets=len(patches)) as span, Workbook_lock(output_file), Atomic_write(output_file) as tmp_path:
+        with zipfile.ZipFile(file_path) as zin, open(file_path, "rb") as src, open(tmp_path, "wb") as dst:
+            parts = Read_sheet_parts(zin)
+            targets = {parts[title]: cells for title, cells in patches.items() if title in parts}
+            entries = []
+            for info in zin.infolist():
+                if info.filename in targets:
+                    xml = zin.read(info).decode("utf-8")
+                    data = Patch_sheet_xml(xml, targets[info.filename], keep_formulas).encode("utf-8")
+                    entries.append(_Write_member(src, info, data, dst))
+                elif info.filename == "xl/workbook.xml":
+                    data = _Set_full_calc(zin.read(info).decode("utf-8"), not keep_formulas).encode("utf-8")
+                    entries.append(_Write_member(src, info, data, dst))
+                else:
+                    entries.append(_Copy_member(src, info, dst))
+            _Write_central_directory(dst, entries)
+        written = sum(len(cells) for cells in targets.values())
+        span.Set(cells=written)
+        Count("cells_written", written)
+
+    return [title for title in patches if title in parts]
@@ -0,0 +1,5 @@
+# Les programmes NDF_*.py sont à la racine du dépôt : importables depuis les tests quel que soit le dossier de lancement
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
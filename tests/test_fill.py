@@ -0,0 +1,71 @@
+from datetime import date
+
+import openpyxl
+import pytest
+
+import NDF_fill
+from NDF_fill import Fill_next_year_workbook, Missing_sheet_error, Rate_patches, Update_rates
+from ndf.calendar import Get_calendar_plan
+
+@pytest.fixture
+def weekly(tmp_path):
+    path = str(tmp_path / "Frais Sem_2025-2026.xlsx")
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    for week in Get_calendar_plan(2025).weeks:
+        wb.create_sheet(week.title)
+    wb.save(path)
+    return path
+
+def _Check_filled(path, filled):
+    plan = Get_calendar_plan(2025)
+    assert filled == [week.title for week in plan.weeks if week.next_year]
+    wb = openpyxl.load_workbook(path)
+    for week in plan.weeks:
+        ws = wb[week.title]
+        expected = (0.6, 21.0) if week.next_year else (None, None)
+        assert (ws["F26"].value, ws["I24"].value) == expected
+        if week.next_year and week.eom_pos:
+            assert ws[f"L{week.eom_pos}"].value == 500.0
+
+def test_fill_fast_path(weekly):
+    _Check_filled(weekly, Fill_next_year_workbook(weekly, 0.6, 21.0, 2025, 500.0))
+
+def test_fill_falls_back_to_openpyxl(weekly, monkeypatch):
+    def unsupported(*args, **kwargs):
+        raise ValueError("structure XML non reconnue")
+    monkeypatch.setattr(NDF_fill, "Patch_workbook_cells", unsupported)
+    _Check_filled(weekly, Fill_next_year_workbook(weekly, 0.6, 21.0, 2025, 500.0))
+
+def test_fill_without_next_year_sheet(weekly):
+    with pytest.raises(Missing_sheet_error):
+        Fill_next_year_workbook(weekly, 0.6, 21.0, 2026, 500.0)
+
+def _Meals(rows, price=14.0):
+    return {f"I{row}": price for row in rows}
+
+def test_rates_from_mid_week():
+    # Du vendredi 17/10 au mardi 28/10 : jeudis 16/10 et 30/10 hors période, fin de mois (31/10) aussi
+    patches = Rate_patches(2025, date(2025, 10, 17), date(2025, 10, 28), 0.7, 14.0, 400.0)
+    assert patches == {
+        "Sem 42_2025": _Meals([20, 22, 24]),
+        "Sem 43_2025": {**_Meals(range(12, 26, 2)), "F26": 0.7},
+        "Sem 44_2025": _Meals([12, 14]),
+    }
+
+def test_rates_end_of_month_week():
+    # Sem 44_2025 : 27/10 au 02/11, le 31/10 (vendredi) est en ligne 20
+    patches = Rate_patches(2025, date(2025, 10, 27), date(2025, 10, 31), loyer=400.0)
+    assert patches == {"Sem 44_2025": {"L20": 400.0}}
+    assert Rate_patches(2025, date(2025, 11, 1), date(2025, 11, 30), loyer=400.0) == {"Sem 48_2025": {"L24": 400.0}}  # Dimanche 30/11
+
+def test_update_rates_across_fiscal_year(weekly):
+    # La période dépasse la fin de l'exercice (30/04/2026) : seules les feuilles du classeur sont modifiées
+    updated = Update_rates(weekly, 2025, date(2026, 4, 23), date(2026, 5, 10), 0.7, 14.0, 400.0)
+    assert updated == ["Sem 17_2026", "Sem 18_2026"]
+    wb = openpyxl.load_workbook(weekly)
+    assert {coord: wb["Sem 17_2026"][coord].value for coord in ("I16", "I18", "I20", "F26")} == {"I16": None, "I18": 14.0, "I20": 14.0, "F26": 0.7}
+    ws = wb["Sem 18_2026"]
+    assert [ws[f"I{row}"].value for row in range(12, 26, 2)] == [14.0] * 7
+    assert (ws["F26"].value, ws["L18"].value) == (0.7, 400.0)
+    assert wb["Sem 16_2026"]["F26"].value is None
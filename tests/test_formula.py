@@ -0,0 +1,78 @@
+import openpyxl
+import pytest
+
+from NDF_Report_By2Months import Evaluate_report_values
+from ndf.calendar import Get_calendar_plan, Period_of
+from ndf.formula import Workbook_evaluator, Excel_error
+
+def _Save(path, sheets):
+    """sheets : {titre: {coordonnée: valeur ou formule}}."""
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    for title, cells in sheets.items():
+        ws = wb.create_sheet(title)
+        for coord, value in cells.items():
+            ws[coord] = value
+    wb.save(path)
+    return str(path)
+
+def test_evaluator(tmp_path):
+    path = _Save(tmp_path / "classeur.xlsx", {
+        "Sem 18_2025": {
+            "C12": 10, "F26": 0.5, "H12": 2, "I12": 12, "C14": "texte", "H14": 1, "I14": 13,
+            "M12": "=C12*F26+H12*I12", "M14": "=H14*I14",
+            "M25": "=ROUND(M30/9,2)",
+            "M27": "=SUMPRODUCT(H12:H14,I12:I14)",
+            "M28": "=PRODUCT(F26,4)-2^2",
+            "M30": "=SUM(M12:M24)",
+            "A1": "=IF(M30>40,\"oui\",\"non\")&\"!\"",
+            "A2": "=IFERROR(1/0,-1)",
+            "A3": "=1/0", "A4": "=VLOOKUP(C12,C12:D14,2)", "A5": "=A6+1", "A6": "=A5",
+        },
+        "Sem 19_2025": {"M30": "='Sem 18_2025'!M30*2+'Sem 18_2025'!C12", "M28": "='Sem 20_2025'!M30"},
+    })
+    evaluator = Workbook_evaluator(path)
+    assert evaluator.Evaluate("Sem 18_2025", "M30") == 42.0
+    assert evaluator.Evaluate("Sem 18_2025", "M25") == 4.67
+    assert evaluator.Evaluate("Sem 18_2025", "M27") == 37.0
+    assert evaluator.Evaluate("Sem 18_2025", "M28") == -2.0
+    assert evaluator.Evaluate("Sem 18_2025", "A1") == "oui!"
+    assert evaluator.Evaluate("Sem 18_2025", "A2") == -1
+    assert evaluator.Evaluate("Sem 19_2025", "M30") == 94.0
+    assert evaluator.Sum([("Sem 18_2025", "M30"), ("Sem 19_2025", "M30"), ("Sem 19_2025", "B1")]) == 136.0
+    with pytest.raises(Excel_error, match="#VALUE!"):
+        evaluator.Sum([("Sem 18_2025", "A1")])  # Texte dans une addition
+
+    for coord, code in (("A3", "#DIV/0!"), ("A4", "#NAME?"), ("A5", "#REF!")):
+        with pytest.raises(Excel_error) as error:
+            evaluator.Evaluate("Sem 18_2025", coord)
+        assert error.value.code == code
+    with pytest.raises(Excel_error, match="VLOOKUP"):
+        evaluator.Evaluate("Sem 18_2025", "A4")
+    with pytest.raises(Excel_error, match="Sem 20_2025"):
+        evaluator.Evaluate("Sem 19_2025", "M28")
+
+def test_evaluator_selected_sheets(tmp_path):
+    path = _Save(tmp_path / "classeur.xlsx", {"Sem 18_2025": {"M30": 1}, "Sem 19_2025": {"M30": 2}})
+    evaluator = Workbook_evaluator(path, sheets=["Sem 19_2025"])
+    assert list(evaluator.cells) == ["Sem 19_2025"]
+    with pytest.raises(Excel_error):
+        evaluator.Evaluate("Sem 18_2025", "M30")
+
+def test_report_values(tmp_path, capsys):
+    plan = Get_calendar_plan(2025)
+    sheets = {week.title: {"C12": week.week_num, "F26": 0.5, "M28": "=C12*F26", "M30": "=SUM(C12:C24)"} for week in plan.weeks}
+    sheets["Sem 19_2025"]["M27"] = "=VLOOKUP(C12,C12:D14,2)"  # Mai/Juin : total M27 non calculable
+    path = _Save(tmp_path / "Frais Sem_2025-2026.xlsx", sheets)
+
+    values = Evaluate_report_values(path, 2025)
+    for period in range(6):
+        weeks = [week for week in plan.weeks if Period_of(week.month, "bimonthly") == period]
+        row = 27 + 2 * period
+        assert values[f"B{row}"] == sum(week.week_num for week in weeks)
+        assert values[f"C{row}"] == sum(week.week_num for week in weeks) * 0.5
+        assert values[f"C{row + 1}"] == 0.0
+        assert (f"K{row}" in values) == (period != 0)
+    assert "K27 (" in capsys.readouterr().out
+
+    assert Evaluate_report_values(path, 2025, periods=[2]) == {coord: value for coord, value in values.items() if coord[1:] in ("31", "32")}
@@ -0,0 +1,21 @@
+from NDF_index import Find_workbooks, Update_index
+
+def test_unique_filename_copies_are_skipped(tmp_path):
+    folder = tmp_path / "Année 2025-2026" / "Peraud"
+    folder.mkdir(parents=True)
+    for name in ("Frais Sem_2025-2026.xlsx", "Frais Sem_2025-2026(1).xlsx", "Frais Sem_2025-2026 (2).xlsx", "~$Frais Sem_2025-2026.xlsx"):
+        (folder / name).write_bytes(b"")
+
+    found = list(Find_workbooks(str(tmp_path)))
+    assert [entry.path for entry in found] == [str(folder / "Frais Sem_2025-2026.xlsx")]
+    assert (found[0].employee, found[0].fiscal_year) == ("Peraud", 2025)
+
+def test_failed_files_are_parsed_again(tmp_path):
+    folder = tmp_path / "Année 2025-2026" / "Peraud"
+    folder.mkdir(parents=True)
+    (folder / "Frais Sem_2025-2026.xlsx").write_bytes(b"")  # Pas un zip : échec de lecture
+    db_path = str(tmp_path / "index.sqlite")
+
+    assert Update_index(str(tmp_path), db_path, workers=1, verbose=False)["errors"] == 1
+    stats = Update_index(str(tmp_path), db_path, workers=1, verbose=False)
+    assert (stats["unchanged"], stats["errors"]) == (0, 1)
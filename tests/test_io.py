@@ -0,0 +1,76 @@
+import os
+import threading
+
+from openpyxl import Workbook
+
+import ndf.io
+from ndf.io import Lock_path, Workbook_lock, Reserved_name, Save_workbook_safely
+
+def _Listing(folder):
+    return sorted(name for name in os.listdir(folder) if not name.startswith(".~ndf"))
+
+def test_save_leaves_no_empty_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "Frais Sem_2025-2026.xlsx")
+    seen = []
+    atomic_write = ndf.io.Atomic_write
+    def spy(target, *args, **kwargs):
+        # Pendant l'écriture : le nom est verrouillé mais le classeur n'existe pas encore
+        seen.append((os.path.exists(target), os.path.exists(Lock_path(target))))
+        return atomic_write(target, *args, **kwargs)
+    monkeypatch.setattr(ndf.io, "Atomic_write", spy)
+
+    assert Save_workbook_safely(Workbook(), path, overwrite=False) == path
+    assert Save_workbook_safely(Workbook(), path, overwrite=False) == str(tmp_path / "Frais Sem_2025-2026(1).xlsx")
+    assert seen == [(False, True), (False, True)]
+    assert _Listing(tmp_path) == ["Frais Sem_2025-2026(1).xlsx", "Frais Sem_2025-2026.xlsx"]
+    assert all(os.path.getsize(tmp_path / name) > 0 for name in _Listing(tmp_path))
+
+def test_save_failure_leaves_nothing(tmp_path):
+    class Broken(Workbook):
+        def save(self, filename):
+            raise OSError("partage déconnecté")
+    path = str(tmp_path / "Frais Sem_2025-2026.xlsx")
+    try:
+        Save_workbook_safely(Broken(), path, overwrite=False)
+    except OSError:
+        pass
+    assert _Listing(tmp_path) == []
+
+def test_reserved_name_is_exclusive(tmp_path):
+    path = str(tmp_path / "Frais Sem_2025-2026.xlsx")
+    names, inside = [], threading.Event()
+    with Reserved_name(path) as first:
+        names.append(first)
+        # Un autre appel attend le verrou du même nom, puis prend le suivant une fois le fichier écrit
+        other = threading.Thread(target=lambda: names.append(_Write_reserved(path)))
+        other.start()
+        other.join(0.3)
+        assert other.is_alive()
+        open(first, "wb").close()
+    other.join()
+    assert names == [path, str(tmp_path / "Frais Sem_2025-2026(1).xlsx")]
+
+def _Write_reserved(path):
+    with Reserved_name(path, timeout=5) as name:
+        open(name, "wb").close()
+        return name
+
+def test_stale_lock_removed(tmp_path):
+    path = str(tmp_path / "Frais Sem_2025-2026.xlsx")
+    with open(Lock_path(path), "w", encoding="utf-8") as f:
+        f.write(f"999999999 {ndf.io.socket.gethostname()} 0")  # Processus mort sur ce poste
+    with Workbook_lock(path, timeout=1):
+        assert ndf.io._Read_owner(Lock_path(path)).split()[0] == str(os.getpid())
+    assert _Listing(tmp_path) == []
+
+def test_stale_lock_taken_over_is_kept(tmp_path):
+    path = str(tmp_path / "Frais Sem_2025-2026.xlsx")
+    lock_file = Lock_path(path)
+    fresh = f"{os.getpid()} {ndf.io.socket.gethostname()} 1"
+    with open(lock_file, "w", encoding="utf-8") as f:
+        f.write(fresh)
+    # Le verrou examiné (abandonné) a été remplacé par un autre entre la lecture et la suppression
+    assert not ndf.io._Remove_stale(lock_file, "999999999 poste 0")
+    assert ndf.io._Read_owner(lock_file) == fresh
+    assert ndf.io._Remove_stale(lock_file, fresh)
+    assert _Listing(tmp_path) == []
@@ -0,0 +1,76 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import openpyxl
+import pytest
+
+from NDF_server import NDF_server
+from ndf.calendar import Get_calendar_plan
+
+@pytest.fixture
+def server():
+    server = NDF_server(("127.0.0.1", 0), workers=1, max_pending=1)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def _Request(server, path, params=None, data=None):
+    """(statut, réponse JSON) ; POST si params ou data sont donnés."""
+    if params is not None:
+        data = json.dumps(params).encode("utf-8")
+    url = f"http://127.0.0.1:{server.server_address[1]}{path}"
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data), timeout=60) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+def _Weekly(tmp_path):
+    path = str(tmp_path / "Frais Sem_2025-2026.xlsx")
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    for week in Get_calendar_plan(2025).weeks:
+        wb.create_sheet(week.title)
+    wb.save(path)
+    return path
+
+def test_fill_and_status(server, tmp_path):
+    params = {"file_path": _Weekly(tmp_path), "year": 2025, "km_rate": 0.6, "meal_price": 21.0, "loyer": 500.0}
+    status, body = _Request(server, "/fill", params)
+    assert status == 200
+    assert body["sheets"] == [week.title for week in Get_calendar_plan(2025).weeks if week.next_year]
+
+    status, body = _Request(server, "/status")
+    assert status == 200
+    assert len(body["workers"]) == 1 and (body["hits"], body["misses"]) == (0, 0)
+
+def test_error_status(server, tmp_path):
+    params = {"file_path": _Weekly(tmp_path), "year": 2026, "km_rate": 0.6, "meal_price": 21.0, "loyer": 500.0}
+    assert _Request(server, "/fill", params)[0] == 422  # Pas de "Sem 1_2027"
+    assert _Request(server, "/fill", {**params, "file_path": str(tmp_path / "absent.xlsx")})[0] == 404
+
+def test_bad_requests(server):
+    assert _Request(server, "/inconnue")[0] == 404
+    assert _Request(server, "/inconnue", {})[0] == 404
+    assert _Request(server, "/fill", data=b"{")[0] == 400
+    assert _Request(server, "/fill", [])[0] == 400
+    status, body = _Request(server, "/fill", {"file_path": "x.xlsx", "year": 2025})
+    assert status == 400 and "km_rate" in body["error"]
+
+    params = {"example_file": "a.xlsx", "input_file": "b.xlsx", "output_file": "c.xlsx", "year": 2025}
+    for value in ("false", 0, None):
+        status, body = _Request(server, "/report", {**params, "overwrite": value})
+        assert status == 400 and "overwrite" in body["error"]
+
+def test_busy(server, tmp_path):
+    params = {"file_path": _Weekly(tmp_path), "year": 2025, "km_rate": 0.6, "meal_price": 21.0, "loyer": 500.0}
+    server.slots.acquire()  # Seule place occupée par une autre requête
+    try:
+        assert _Request(server, "/fill", params)[0] == 503
+    finally:
+        server.slots.release()
+    assert _Request(server, "/fill", params)[0] == 200
@@ -0,0 +1,99 @@
+import re
+
+import openpyxl
+import pytest
+
+from NDF import Create_weekly_sheets, Update_weekly_file
+from NDF_Report_By2Months import Create_report_sheet, Evaluate_report_values
+from ndf.calendar import GRANULARITIES
+from ndf.formula import Workbook_evaluator
+from ndf.io import Save_workbook_atomic
+from ndf.layout import REPORT_METRICS
+from ndf.summary import SUMMARY_SHEET
+from ndf.template import CACHE_ENV
+
+_REF_RE = re.compile(r"'\[[^\]]*\]([^']+)'!([A-Z]+\d+)")
+
+@pytest.fixture
+def templates(tmp_path, monkeypatch):
+    monkeypatch.setenv(CACHE_ENV, "0")
+    monkeypatch.setenv("NDF_STAGING_DIR", str(tmp_path / "staging"))
+    weekly = tmp_path / "Frais Sem_Modele.xlsx"
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for row in range(12, 26, 2):
+        ws[f"M{row}"] = f"=C{row}*F26+H{row}*I{row}"
+    ws["M25"] = "=SUM(L12:L24)"
+    ws["M27"] = "=SUM(C12:C24)"
+    ws["M28"] = "=M27*F26"
+    ws["I29"] = "=SUMPRODUCT(H12:H24,I12:I24)"
+    ws["I30"] = "=SUM(H12:H24)"
+    ws["M30"] = "=SUM(M12:M24)+M25"
+    wb.save(weekly)
+
+    report = tmp_path / "Note de Frais Report_Modele.xlsx"
+    openpyxl.Workbook().save(report)
+    return str(weekly), str(report)
+
+def _Enter_expenses(path):
+    """Kilomètres et repas différents chaque semaine, pour que chaque période ait ses propres totaux."""
+    wb = openpyxl.load_workbook(path)
+    for k, ws in enumerate(wb.worksheets):
+        if ws.title != SUMMARY_SHEET:
+            ws["C12"] = 10 + k
+            ws["H14"] = 1 + k % 3
+    wb.save(path)
+
+def _Report_totals(report, weekly):
+    """{cellule du rapport: valeur} en calculant ses formules sur le classeur semaine."""
+    evaluator = Workbook_evaluator(weekly)
+    totals = {}
+    for row in report.worksheets[0].iter_rows():
+        for cell in row:
+            if isinstance(cell.value, str) and cell.value.startswith("="):
+                totals[cell.coordinate] = evaluator.Sum(_REF_RE.findall(cell.value))
+    return totals
+
+def _Check_totals(report_template, weekly, tmp_path):
+    without = str(tmp_path / "sans_synthese.xlsx")
+    wb = openpyxl.load_workbook(weekly)
+    assert wb[SUMMARY_SHEET].sheet_state == "hidden"
+    wb.remove(wb[SUMMARY_SHEET])
+    wb.save(without)
+
+    for granularity in GRANULARITIES:
+        report = Create_report_sheet(report_template, weekly, 2025, granularity=granularity)
+        assert all(SUMMARY_SHEET in formula for formula in _Formulas(report))
+        old_report = Create_report_sheet(report_template, without, 2025, granularity=granularity)
+        assert not any(SUMMARY_SHEET in formula for formula in _Formulas(old_report))
+
+        expected = Evaluate_report_values(without, 2025, granularity)
+        assert len(expected) == 12 // GRANULARITIES[granularity] * len(REPORT_METRICS) and any(expected.values())
+        assert _Report_totals(report, weekly) == pytest.approx(expected)
+        assert _Report_totals(old_report, without) == pytest.approx(expected)
+
+def _Formulas(report):
+    return [cell.value for row in report.worksheets[0].iter_rows() for cell in row
+            if isinstance(cell.value, str) and cell.value.startswith("=")]
+
+@pytest.mark.parametrize("write_only", [False, True])
+def test_summary_totals(templates, tmp_path, write_only):
+    weekly_template, report_template = templates
+    weekly = str(tmp_path / "Frais Sem_2025-2026.xlsx")
+    Save_workbook_atomic(Create_weekly_sheets(weekly_template, 2025, 0.5, 12, 300, verbose=False, write_only=write_only), weekly)
+    _Enter_expenses(weekly)
+    _Check_totals(report_template, weekly, tmp_path)
+
+def test_summary_totals_after_update(templates, tmp_path):
+    weekly_template, report_template = templates
+    weekly = str(tmp_path / "Frais Sem_2025-2026.xlsx")
+    Save_workbook_atomic(Create_weekly_sheets(weekly_template, 2025, 0.5, 12, 300, verbose=False), weekly)
+    _Enter_expenses(weekly)
+    # Taux changés puis modèle changé : synthèse reconstruite par la mise à jour incrémentale
+    assert Update_weekly_file(weekly_template, weekly, 2025, 0.6, 13, 310, verbose=False)
+    wb = openpyxl.load_workbook(weekly_template)
+    wb.active["A40"] = "Nouvelle ligne"
+    wb.save(weekly_template)
+    assert Update_weekly_file(weekly_template, weekly, 2025, 0.6, 13, 310, verbose=False)
+    assert openpyxl.load_workbook(weekly).sheetnames[-1] == SUMMARY_SHEET
+    _Check_totals(report_template, weekly, tmp_path)
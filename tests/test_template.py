@@ -0,0 +1,69 @@
+import pickletools
+
+from openpyxl import Workbook
+from openpyxl.comments import Comment
+from openpyxl.styles import Font, PatternFill
+
+from ndf.template import Compiled_template, Load_compiled_workbook
+
+def _Template() -> Workbook:
+    wb = Workbook()
+    ws = wb.active
+    ws["A1"] = "Semaine"
+    ws["B12"] = 1
+    ws["M30"] = "=SUM(M12:M24)"
+    ws["A1"].font = Font(bold=True)
+    ws.merge_cells("A1:C1")
+    return wb
+
+def test_emitted_sheet_is_iterable():
+    source = _Template()
+    target = Workbook()
+    ws = Compiled_template(source.active).Emit(target, "Sem 18_2025", {"K1": 18})
+
+    rows = list(ws.iter_rows(values_only=True))
+    assert len(rows) == 30
+    assert rows[0][0] == "Semaine" and rows[29][12] == "=SUM(M12:M24)"
+    assert ws.max_row == 30
+    assert list(ws.values)
+
+def test_append_after_last_row():
+    source = _Template()
+    ws = Compiled_template(source.active).Emit(Workbook(), "Sem 18_2025")
+
+    ws.append(["fin"])
+    assert ws["A31"].value == "fin"
+    assert ws["A1"].value == "Semaine"
+
+def test_emit_in_same_workbook():
+    wb = _Template()
+    ws = Compiled_template(wb.active).Emit(wb, "Sem 18_2025")
+    assert ws["A1"].font.bold
+    assert [str(r) for r in ws.merged_cells.ranges] == ["A1:C1"]
+    assert ws._current_row == 30
+
+def test_cached_plan_holds_no_openpyxl_objects(tmp_path):
+    source = _Template()
+    ws = source.active
+    ws["B12"].number_format = "0.00 €"
+    ws["B12"].fill = PatternFill("solid", fgColor="FFFF00")
+    ws["C3"].comment = Comment("Note", "NDF")
+    ws["D3"].hyperlink = "https://example.com"
+    ws.column_dimensions["B"].width = 21
+    ws.row_dimensions[12].height = 30
+    path = str(tmp_path / "Frais Sem_Modele.xlsx")
+    source.save(path)
+
+    template = Load_compiled_workbook(path, str(tmp_path / "cache"))
+    cached = Load_compiled_workbook(path, str(tmp_path / "cache"))  # Relu depuis le cache disque
+    assert cached is not template and not hasattr(cached, "workbook")
+    with open(next((tmp_path / "cache").iterdir()), "rb") as f:
+        classes = {arg for op, arg, _ in pickletools.genops(f.read()) if op.name in ("SHORT_BINUNICODE", "BINUNICODE")}
+    assert not any(name.startswith("openpyxl") for name in classes)
+    assert cached.active_sheet.Layout_hash() == template.active_sheet.Layout_hash()
+
+    ws = cached.active_sheet.Emit(cached.New_workbook(with_sheets=False), "Sem 18_2025")
+    assert ws["A1"].font.bold and ws["B12"].number_format == "0.00 €" and ws["B12"].fill.fgColor.rgb == "00FFFF00"
+    assert (ws["C3"].comment.text, ws["D3"].hyperlink.target) == ("Note", "https://example.com")
+    assert (ws.column_dimensions["B"].width, ws.row_dimensions[12].height) == (21, 30)
+    assert [str(r) for r in ws.merged_cells.ranges] == ["A1:C1"]
@@ -0,0 +1,59 @@
+import openpyxl
+import pytest
+
+from NDF import Create_weekly_sheets, Update_weekly_file
+from ndf.io import Save_workbook_atomic
+from ndf.template import CACHE_ENV
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+    monkeypatch.setenv(CACHE_ENV, "0")
+    monkeypatch.setenv("NDF_STAGING_DIR", str(tmp_path / "staging"))
+    template = tmp_path / "Frais Sem_Modele.xlsx"
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws["A1"] = "Note de frais"
+    ws["C12"] = 10  # Valeur d'exemple du modèle
+    ws["M30"] = "=SUM(M12:M24)"
+    wb.save(template)
+
+    output = tmp_path / "Frais Sem_2025-2026.xlsx"
+    Save_workbook_atomic(Create_weekly_sheets(str(template), 2025, 0.5, 12, 300, verbose=False), str(output))
+    wb = openpyxl.load_workbook(output)
+    wb["Sem 18_2025"]["C12"] = 123
+    wb["Sem 18_2025"]["H14"] = 2
+    wb.save(output)
+    return str(template), str(output)
+
+def test_resaved_template_keeps_sheets(files):
+    template, output = files
+    wb = openpyxl.load_workbook(template)
+    wb.properties.creator = "Excel"  # Réenregistrement sans changement du contenu
+    wb.save(template)
+
+    assert Update_weekly_file(template, output, 2025, 0.5, 12, 300, verbose=False) == []
+    assert openpyxl.load_workbook(output)["Sem 18_2025"]["C12"].value == 123
+
+def test_rebuilt_sheet_keeps_entered_values(files):
+    template, output = files
+    wb = openpyxl.load_workbook(template)
+    wb.active["A40"] = "Nouvelle ligne"
+    wb.save(template)
+
+    changed = Update_weekly_file(template, output, 2025, 0.5, 12, 300, verbose=False)
+    assert "Sem 18_2025" in changed
+    ws = openpyxl.load_workbook(output)["Sem 18_2025"]
+    assert (ws["C12"].value, ws["H14"].value, ws["A40"].value) == (123, 2, "Nouvelle ligne")
+
+def test_sheets_without_fingerprint_are_updated(files):
+    template, output = files
+    wb = openpyxl.load_workbook(output)
+    wb.custom_doc_props.props = []  # Classeur créé avant les empreintes
+    wb.save(output)
+
+    changed = Update_weekly_file(template, output, 2025, 0.6, 13, 310, verbose=False)
+    assert len(changed) == len(openpyxl.load_workbook(output).sheetnames) - 1  # Toutes sauf la synthèse
+    ws = openpyxl.load_workbook(output)["Sem 18_2025"]
+    assert (ws["F26"].value, ws["I12"].value, ws["C12"].value, ws["H14"].value) == (0.6, 13, 123, 2)
+
+    assert Update_weekly_file(template, output, 2025, 0.6, 13, 310, verbose=False) == []
@@ -0,0 +1,91 @@
+import os
+import threading
+import time
+
+import openpyxl
+import pytest
+
+from NDF import Create_weekly_sheets
+from NDF_Report_By2Months import Evaluate_report_values
+from NDF_watch import Rebuild_queue, Poll_watcher, Excel_owner_file, Report_target_for, Snapshot_path
+from ndf.io import Save_workbook_atomic
+from ndf.template import CACHE_ENV
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+    monkeypatch.setenv(CACHE_ENV, "0")
+    monkeypatch.setenv("NDF_STAGING_DIR", str(tmp_path / "staging"))
+    template = tmp_path / "Frais Sem_Modele.xlsx"
+    wb = openpyxl.Workbook()
+    wb.active["M30"] = "=SUM(C12:C24)"
+    wb.save(template)
+    report_template = tmp_path / "Note de Frais Report_Modele.xlsx"
+    openpyxl.Workbook().save(report_template)
+
+    folder = tmp_path / "Dupont"
+    weekly = str(folder / "Frais Sem_2025-2026.xlsx")
+    Save_workbook_atomic(Create_weekly_sheets(str(template), 2025, 0.5, 12, 300, verbose=False), weekly)
+    return weekly, str(report_template)
+
+def _Save_week(weekly, value):
+    """Enregistrement comme depuis Excel : le classeur est réécrit sur place."""
+    wb = openpyxl.load_workbook(weekly)
+    wb["Sem 19_2025"]["C12"] = value
+    wb.save(weekly)
+
+def _Wait_for(queue, condition, timeout=60.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if condition() and queue.Idle():
+            return
+        time.sleep(0.05)
+    raise AssertionError("Reconstruction non terminée")
+
+def test_one_rebuild_per_burst(files, capsys):
+    weekly, report_template = files
+    report = Report_target_for(weekly).report_file
+    queue = Rebuild_queue(report_template, workers=1, debounce=0.5, busy_retry=0.2)
+    watcher = Poll_watcher([os.path.dirname(weekly)], queue.Notify, interval=0.05)
+    runner = threading.Thread(target=queue.Run, daemon=True)
+    watcher.start()
+    runner.start()
+    output = []
+    try:
+        # Rafale d'enregistrements pendant que le classeur est ouvert dans Excel (~$ présent)
+        owner = Excel_owner_file(weekly)
+        open(owner, "w").close()
+        for value in (1, 2, 3):
+            _Save_week(weekly, value)
+            time.sleep(0.1)
+        time.sleep(1.0)
+        assert not os.path.exists(report)
+        os.remove(owner)
+        _Wait_for(queue, lambda: os.path.exists(report))
+        output.append(capsys.readouterr().out)
+        assert output[-1].count("⏳") == 1 and output[-1].count("🔄") == 1
+        assert os.path.exists(Snapshot_path(weekly))
+
+        # Deuxième rafale : rapport repris depuis l'instantané, seules les valeurs recalculées
+        mtime = os.path.getmtime(report)
+        for value in (4, 5):
+            _Save_week(weekly, value)
+            time.sleep(0.1)
+        _Wait_for(queue, lambda: os.path.getmtime(report) != mtime)
+        output.append(capsys.readouterr().out)
+        assert output[-1].count("🔄") == 1
+
+        # Date changée sans changement du contenu : pas de reconstruction
+        os.utime(weekly)
+        time.sleep(1.0)
+        _Wait_for(queue, lambda: True)
+        output.append(capsys.readouterr().out)
+        assert "🔄" not in output[-1]
+    finally:
+        watcher.stop()
+        queue.Close()
+    assert queue.failures == {}
+
+    ws = openpyxl.load_workbook(report, data_only=True).worksheets[0]
+    expected = Evaluate_report_values(weekly, 2025)
+    assert expected["B27"] == 5
+    assert {coord: ws[coord].value for coord in expected} == expected
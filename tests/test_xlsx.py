@@ -0,0 +1,84 @@
+import io
+import os
+import struct
+import zipfile
+
+import openpyxl
+from openpyxl import Workbook
+
+import ndf.xlsx
+from ndf.xlsx import Sheet_names, Patch_workbook_cells
+
+def _Save(path, titles):
+    wb = Workbook()
+    wb.active.title = titles[0]
+    for title in titles[1:]:
+        wb.create_sheet(title)
+    wb.save(path)
+
+def test_sheet_names_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / "Frais Sem_2025-2026.xlsx")
+    _Save(path, ["Sem 18_2025", "Sem 19_2025"])
+    reads = []
+    read_sheet_parts = ndf.xlsx.Read_sheet_parts
+    monkeypatch.setattr(ndf.xlsx, "Read_sheet_parts", lambda archive: reads.append(1) or read_sheet_parts(archive))
+
+    assert Sheet_names(path) == ["Sem 18_2025", "Sem 19_2025"]
+    assert Sheet_names(path) == ["Sem 18_2025", "Sem 19_2025"]
+    assert len(reads) == 1
+
+    # Fichier remplacé (os.replace comme les écritures NDF) avec la même date : taille et inode changent
+    stat = os.stat(path)
+    other = str(tmp_path / "other.xlsx")
+    _Save(other, ["Sem 18_2025", "Sem 19_2025", "Sem 20_2025"])
+    os.replace(other, path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert Sheet_names(path) == ["Sem 18_2025", "Sem 19_2025", "Sem 20_2025"]
+    assert len(reads) == 2
+
+def _Raw_members(path):
+    """{membre: octets compressés tels qu'écrits dans le zip}."""
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+        raw = {}
+        for info in archive.infolist():
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = struct.unpack("<HH", f.read(4))
+            f.seek(name_len + extra_len, 1)
+            raw[info.filename] = f.read(info.compress_size)
+        return raw
+
+def test_patch_copies_untouched_members(tmp_path):
+    path = str(tmp_path / "Frais Sem_2025-2026.xlsx")
+    _Save(path, ["Sem 18_2025", "Sem 19_2025", "Sem 20_2025"])
+    before = _Raw_members(path)
+
+    assert Patch_workbook_cells(path, {"Sem 19_2025": {"I12": 21.5, "F26": 0.6}, "Absente": {"A1": 1}}) == ["Sem 19_2025"]
+    after = _Raw_members(path)
+    rewritten = [name for name in before if before[name] != after[name]]
+    assert sorted(rewritten) == ["xl/workbook.xml", "xl/worksheets/sheet2.xml"]
+
+    ws = openpyxl.load_workbook(path)["Sem 19_2025"]
+    assert (ws["I12"].value, ws["F26"].value) == (21.5, 0.6)
+
+class _Stream(io.RawIOBase):
+    """Sortie non positionnable : zipfile écrit alors un descripteur après les données de chaque membre."""
+    def __init__(self, f):
+        self.f = f
+    def writable(self):
+        return True
+    def write(self, data):
+        return self.f.write(data)
+
+def test_patch_with_data_descriptors(tmp_path):
+    source = str(tmp_path / "source.xlsx")
+    _Save(source, ["Sem 18_2025", "Sem 19_2025"])
+    path = str(tmp_path / "Frais Sem_2025-2026.xlsx")
+    with zipfile.ZipFile(source) as zin, open(path, "wb") as f, zipfile.ZipFile(_Stream(f), "w", zipfile.ZIP_DEFLATED) as zout:
+        for info in zin.infolist():
+            zout.writestr(info.filename, zin.read(info))
+    assert zipfile.ZipFile(path).getinfo("xl/workbook.xml").flag_bits & 0x08
+
+    Patch_workbook_cells(path, {"Sem 18_2025": {"I12": 21.5}})
+    assert zipfile.ZipFile(path).testzip() is None
+    wb = openpyxl.load_workbook(path)
+    assert (wb["Sem 18_2025"]["I12"].value, wb.sheetnames) == (21.5, ["Sem 18_2025", "Sem 19_2025"])